@@ -13,7 +13,8 @@ with open(os.path.join(here, "keops_version"), encoding="utf-8") as v:
 
 from keopscore.config import *
 from keopscore.utils.code_gen_utils import clean_keops, check_health
-from keopscore.utils.misc_utils import CHECK_MARK, CROSS_MARK
+from keopscore.utils.misc_utils import CHECK_MARK, CROSS_MARK, file_is_valid
+from keopscore.utils.Cache import cache_stats, evict_cache
 
 set_build_folder = config.set_different_build_folder
 
@@ -27,6 +28,48 @@ debug_ops_at_exec = False
 # flag for automatic factorization : apply automatic factorization for all formulas before reduction.
 auto_factorize = False
 
+# flag for the simplification of formulas by rewrite rules driven by a cost model, e.g.
+# Exp(a)*Exp(b) -> Exp(a+b) or Pow(x,3) -> x*Square(x) ; constant factors are also pulled
+# out of sum reductions. See keopscore.formulas.factorization.Simplify.
+simplify_formulas = True
+
+# flag for simd evaluation of formulas in Cpu map-reduce schemes : the formula is evaluated
+# for several consecutive "j" indices in a "#pragma omp simd" loop. Use e.g. CXXFLAGS="-march=native"
+# to allow the compiler to use the widest vector instructions of the host.
+use_cpu_simd = True
+
+# flag for the hoisting of loop invariants in Cpu map-reduce schemes : the subformulas which only
+# depend on "i" variables and parameters are evaluated once per index i, before the loop over j,
+# and the subformulas which only depend on "j" variables are evaluated once per index j, in a linear
+# pass before the quadratic loops (except for the scheme with ranges).
+hoist_invariants = True
+
+# flag for the elimination of common subformulas : in the formulas evaluated by the map-reduce
+# schemes, the subformulas used several times (e.g. after differentiation) are evaluated once.
+# See keopscore.formulas.factorization.CSE.cse_stats for the number of evaluations removed.
+eliminate_common_subformulas = True
+
+# flag for the expansion of inner products in the Cpu tiled map-reduce scheme : the squared distances
+# SqDist(x,y) = |x|^2 + |y|^2 - 2<x,y> and inner products <x,y> of "i" and "j" variables of large
+# dimension are computed for a block of indices i and a tile of indices j at once, by a cache-blocked
+# kernel. N.B. this is less accurate than the direct computation when x and y are close.
+expand_inner_products = True
+
+# limits for the cache of compiled kernels in the build folder : after each compilation,
+# kernels not used for more than cache_max_age seconds are removed, and then the least
+# recently used kernels until the folder is smaller than cache_max_size bytes.
+# None means no limit. See also keopscore.cache_stats and keopscore.evict_cache.
+cache_max_size = (
+    int(os.getenv("KEOPS_CACHE_MAX_SIZE"))
+    if os.getenv("KEOPS_CACHE_MAX_SIZE")
+    else None
+)
+cache_max_age = (
+    float(os.getenv("KEOPS_CACHE_MAX_AGE"))
+    if os.getenv("KEOPS_CACHE_MAX_AGE")
+    else None
+)
+
 # Initialize CUDA libraries if CUDA is used
 if cuda_config.get_use_cuda():
     # Initialize CUDA libraries if necessary
@@ -34,7 +77,7 @@ if cuda_config.get_use_cuda():
     from keopscore.binders.nvrtc.Gpu_link_compile import Gpu_link_compile
     from keopscore.binders.nvrtc.Gpu_link_compile import jit_compile_dll
 
-    if not os.path.exists(jit_compile_dll()):
+    if not file_is_valid(jit_compile_dll()):
         Gpu_link_compile.compile_jit_compile_dll()
 
 
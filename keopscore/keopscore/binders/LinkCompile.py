@@ -1,7 +1,13 @@
 import os
+import keopscore
 from keopscore.config import config
 from keopscore.utils.code_gen_utils import get_hash_name
-from keopscore.utils.misc_utils import KeOps_Error, KeOps_Message
+from keopscore.utils.misc_utils import (
+    KeOps_Error,
+    KeOps_Message,
+    file_is_valid,
+    string_to_file,
+)
 
 cpp_flags = config.get_cpp_flags()
 get_build_folder = config.get_build_folder
@@ -32,6 +38,10 @@ class LinkCompile:
             self.use_fast_math,
             self.device_id,
             cpp_flags,
+            keopscore.use_cpu_simd,
+            keopscore.hoist_invariants,
+            keopscore.eliminate_common_subformulas,
+            keopscore.expand_inner_products,
         )
 
         # info_file is the name of the file that will contain some meta-information required by the bindings, e.g. 7b9a611f7e.nfo
@@ -49,11 +59,11 @@ class LinkCompile:
         # create info_file to save some parameters : dim (dimension of output vectors),
         #                                            tagI (O or 1, reduction over i or j indices),
         #                                            dimy (sum of dimensions of j-indexed vectors)
-        f = open(self.info_file, "w")
-        f.write(
-            f"red_formula={self.red_formula_string}\ndim={self.dim}\ntagI={self.tagI}\ndimy={self.dimy}"
+        string_to_file(
+            f"red_formula={self.red_formula_string}\ndim={self.dim}\ntagI={self.tagI}\ndimy={self.dimy}",
+            self.info_file,
+            atomic=True,
         )
-        f.close()
 
     def read_info(self):
         # read info_file to retreive dim, tagI, dimy
@@ -83,9 +93,7 @@ class LinkCompile:
 
     def write_code(self):
         # write the generated code in the source file ; this is used as a subfunction of compile_code
-        f = open(self.gencode_file, "w")
-        f.write(self.code)
-        f.close()
+        string_to_file(self.code, self.gencode_file, atomic=True)
 
     def generate_code(self):
         pass
@@ -94,7 +102,8 @@ class LinkCompile:
         # main method of the class : it generates - if needed - the code and returns the name of the dll to be run for
         # performing the reduction, e.g. 7b9a611f7e.so, or in the case of JIT compilation, the name of the main KeOps dll,
         # and the name of the assembly code file.
-        if not os.path.exists(self.file_to_check):
+        # N.B. empty files, left by interrupted writes, are generated again
+        if not file_is_valid(self.file_to_check):
             KeOps_Message(
                 "Generating code for " + self.red_formula.__str__() + " ... ",
                 flush=True,
@@ -8,7 +8,7 @@ import keopscore
 from keopscore.binders.LinkCompile import LinkCompile
 from keopscore.config import *
 
-from keopscore.utils.misc_utils import KeOps_Error, KeOps_Message, KeOps_OS_Run
+from keopscore.utils.misc_utils import KeOps_Compile, KeOps_Error, KeOps_Message
 from keopscore.utils.gpu_utils import custom_cuda_include_fp16_path
 
 cuda_version = cuda_config.get_cuda_version()
@@ -116,8 +116,10 @@ class Gpu_link_compile(LinkCompile):
     @staticmethod
     def compile_jit_compile_dll():
         KeOps_Message("Compiling cuda jit compiler engine ... ", flush=True, end="")
-        command = Gpu_link_compile.get_compile_command(
-            sourcename=jit_compile_src, dllname=jit_compile_dll()
+        KeOps_Compile(
+            lambda dllname: Gpu_link_compile.get_compile_command(
+                sourcename=jit_compile_src, dllname=dllname
+            ),
+            jit_compile_dll(),
         )
-        KeOps_OS_Run(command)
         KeOps_Message("OK", use_tag=False, flush=True)
@@ -209,7 +209,9 @@ class Config:
 
     def set_compile_options(self):
         """Set the compile options."""
-        self.compile_options = " -shared -fPIC -O3 -std=c++11"
+        # N.B. -fno-trapping-math allows the compiler to vectorize the selects of the
+        # functions of include/cpu_math.h ; KeOps does not use floating point exceptions.
+        self.compile_options = " -shared -fPIC -O3 -std=c++11 -fno-trapping-math"
 
     def get_compile_options(self):
         """Get the compile options."""
@@ -374,6 +376,8 @@ class Config:
         print("\nRelevant Environment Variables:")
         env_vars = [
             "KEOPS_CACHE_FOLDER",
+            "KEOPS_CACHE_MAX_SIZE",
+            "KEOPS_CACHE_MAX_AGE",
             "CXX",
             "CXXFLAGS",
         ]
@@ -464,6 +468,8 @@ class Config:
         print("\nRelevant Environment Variables:")
         env_vars = [
             "KEOPS_CACHE_FOLDER",
+            "KEOPS_CACHE_MAX_SIZE",
+            "KEOPS_CACHE_MAX_AGE",
             "CXXFLAGS",
         ]
         for var in env_vars:
@@ -11,17 +11,34 @@ from keopscore.formulas.variables import *
 from keopscore.formulas.autodiff import *
 from keopscore.formulas.LinearOperators import *
 from keopscore.formulas.factorization import *
+from keopscore.formulas.factorization.Simplify import simplify_reduction
 
 
 class GetReduction:
     library = {}
+    # N.B. fast_library is keyed by the arguments themselves, so that warm lookups
+    # do not need to hash their string representations (see get_hash_name)
+    fast_library = {}
 
     def __new__(self, red_formula_string, aliases=[]):
+        key = (
+            red_formula_string,
+            tuple(aliases),
+            keopscore.auto_factorize,
+            keopscore.simplify_formulas,
+        )
+        if key in GetReduction.fast_library:
+            return GetReduction.fast_library[key]
         string_id_hash = get_hash_name(
-            red_formula_string, aliases, keopscore.auto_factorize
+            red_formula_string,
+            aliases,
+            keopscore.auto_factorize,
+            keopscore.simplify_formulas,
         )
         if string_id_hash in GetReduction.library:
-            return GetReduction.library[string_id_hash]
+            reduction = GetReduction.library[string_id_hash]
+            GetReduction.fast_library[key] = reduction
+            return reduction
         else:
             self.check_formula(red_formula_string)
             aliases_dict = {}
@@ -31,11 +48,15 @@ class GetReduction:
                     varname, var = alias.split("=")
                     aliases_dict[varname] = eval(var)
             reduction = eval(red_formula_string, globals(), aliases_dict)
+            if keopscore.simplify_formulas:
+                # N.B. this applies to the output of the autodiff operations of the formula
+                reduction = simplify_reduction(reduction)
             if keopscore.auto_factorize:
                 formula = reduction.children[0]
                 new_formula = AutoFactorize(formula)
                 reduction.children[0] = new_formula
             GetReduction.library[string_id_hash] = reduction
+            GetReduction.fast_library[key] = reduction
             return reduction
 
     @staticmethod
@@ -13,6 +13,13 @@ class Operation(Tree):
 
     linearity_type = None
 
+    # whether the C++ code of the operation can be evaluated for several "j" indices
+    # at once, in a "#pragma omp simd" loop (see CpuReduc.get_j_loop_code)
+    vectorizable = True
+
+    def is_vectorizable(self):
+        return self.vectorizable and all(f.is_vectorizable() for f in self.children)
+
     def is_linear(self, v):
         if self.linearity_type == "all":
             return all(f.is_linear(v) for f in self.children)
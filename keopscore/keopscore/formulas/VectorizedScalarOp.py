@@ -20,6 +20,12 @@ class VectorizedScalarOp(Operation):
         # here it is the same as the output dimension of the child operation
         return max(child.dim for child in self.children)
 
+    @property
+    def vectorizable(self):
+        # operations which call the C math library are not evaluated in simd mode
+        # on the Cpu (see math_function)
+        return getattr(getattr(type(self), "ScalarOpFun", None), "cpu_simd", True)
+
     def Op(self, out, table, *args):
         # Atomic evaluation of the operation : it consists in a simple
         # for loop around the call to the correponding scalar operation
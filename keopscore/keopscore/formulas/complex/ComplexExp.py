@@ -23,6 +23,9 @@ from keopscore.formulas.maths.Sin import Sin
 class ComplexExp(VectorizedComplexScalarOp):
     string_id = "ComplexExp"
 
+    # calls to the C math library, see math_function
+    vectorizable = False
+
     def ScalarOp(self, out, inF):
         r = c_variable(out.dtype, new_c_varname("r"))
         string = r.declare_assign(keops_exp(inF[0]))
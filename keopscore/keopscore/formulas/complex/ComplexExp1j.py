@@ -15,6 +15,9 @@ from keopscore.utils.misc_utils import KeOps_Error
 class ComplexExp1j(Operation):
     string_id = "ComplexExp1j"
 
+    # calls to the C math library, see math_function
+    vectorizable = False
+
     def __init__(self, f, params=()):
         # N.B. params keyword is used for compatibility with base class, but should always equal ()
         if params != ():
@@ -0,0 +1,132 @@
+import keopscore
+from keopscore.formulas.factorization.Factorize import Factorize_Impl
+from keopscore.formulas.variables import Var
+from keopscore.utils.code_gen_utils import GetInds
+
+
+def params_key(params):
+    # hashable version of the parameters of an operation, which may contain lists
+    try:
+        hash(params)
+        return params
+    except TypeError:
+        return repr(params)
+
+
+class FormulaDAG:
+    """
+    hash-consed representation of a formula : equal subformulas, in the sense of
+    Operation.__eq__, are represented by a single node. Nodes are keyed by
+    (type, indices of the children nodes, params), so that the DAG is built in linear time.
+     - nodes is the list of distinct subformulas, children before parents
+     - children[k] is the list of indices of the children of nodes[k]
+     - occurrences[k] is the number of occurrences of nodes[k] in the formula seen as a tree
+     - refs[k] is the number of references to nodes[k] from the other nodes of the DAG
+    """
+
+    def __init__(self, formula):
+        self.nodes, self.children = [], []
+        index, memo = {}, {}
+
+        def rec(f):
+            if id(f) in memo:
+                return memo[id(f)]
+            children = tuple(rec(child) for child in f.children)
+            key = (type(f), children, params_key(f.params))
+            if key not in index:
+                index[key] = len(self.nodes)
+                self.nodes.append(f)
+                self.children.append(children)
+            memo[id(f)] = index[key]
+            return index[key]
+
+        self.root = rec(formula)
+        n = len(self.nodes)
+        self.occurrences, self.refs = [0] * n, [0] * n
+        self.occurrences[self.root] = 1
+        for k in reversed(range(n)):
+            for c in self.children[k]:
+                self.occurrences[c] += self.occurrences[k]
+                self.refs[c] += 1
+
+    def is_leaf(self, k):
+        return len(self.children[k]) == 0
+
+    @property
+    def num_evaluations(self):
+        # number of operations evaluated by the C++ code of the formula seen as a tree
+        return sum(occ for k, occ in enumerate(self.occurrences) if not self.is_leaf(k))
+
+
+def common_subformulas(formula):
+    """
+    Replaces the subformulas of formula which are used several times (and are not leaves
+    such as variables or constants) by new variables, so that they are evaluated once.
+    The new variables have the category 3 of temporary variables and negative indices,
+    as in Factorize. Subformulas which depend on temporary variables of a Factorize
+    operation are left in place.
+
+    Returns:
+        the new formula, the list of pairs (variable, subformula), in the order in which
+        they must be evaluated, and the number of redundant evaluations of operations removed.
+    """
+    dag = FormulaDAG(formula)
+    nodes, children = dag.nodes, dag.children
+    inds = GetInds(formula.Vars_)
+    ind = min(min(inds) if len(inds) > 0 else 0, 0) - 1
+
+    shared = {}
+    for k, f in enumerate(nodes):
+        if (
+            k != dag.root
+            and dag.refs[k] > 1
+            and not dag.is_leaf(k)
+            and all(v.ind >= 0 for v in f.Vars_)
+        ):
+            shared[k] = Var(ind - len(shared), f.dim, 3)
+
+    new_nodes = []
+    for k, f in enumerate(nodes):
+        new_children = [shared[c] if c in shared else new_nodes[c] for c in children[k]]
+        if all(new is old for new, old in zip(new_children, f.children)):
+            new_nodes.append(f)
+        else:
+            new_nodes.append(type(f)(*new_children, *f.params))
+
+    new_formula = new_nodes[dag.root]
+    subformulas = [(v, new_nodes[k]) for k, v in shared.items()]
+    num_evaluations = FormulaDAG(new_formula).num_evaluations
+    num_evaluations += sum(FormulaDAG(f).num_evaluations for _, f in subformulas)
+    return new_formula, subformulas, dag.num_evaluations - num_evaluations
+
+
+def eliminate_common_subformulas(formula):
+    """
+    returns a formula equivalent to formula, in which the subformulas used several times
+    are evaluated once by nested Factorize operations (see common_subformulas). This is
+    applied by the map-reduce schemes to the formula evaluated in their loops, if the flag
+    keopscore.eliminate_common_subformulas is set.
+    """
+    if not keopscore.eliminate_common_subformulas:
+        return formula
+    formula, subformulas, _ = common_subformulas(formula)
+    for v, f in reversed(subformulas):
+        formula = Factorize_Impl(formula, f, v)
+    return formula
+
+
+def cse_stats(formula):
+    """
+    report on the elimination of common subformulas for formula (e.g. the formula of a
+    reduction returned by GetReduction) : returns a dict with the number of evaluations
+    of operations in the C++ code of the formula without and with the elimination, and the
+    number of shared subformulas which are evaluated once.
+    """
+    _, subformulas, removed = common_subformulas(formula)
+    evaluations = FormulaDAG(formula).num_evaluations
+    return dict(
+        evaluations=evaluations,
+        evaluations_cse=evaluations - removed,
+        removed=removed,
+        shared_subformulas=len(subformulas),
+    )
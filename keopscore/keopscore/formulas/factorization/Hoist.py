@@ -0,0 +1,119 @@
+import keopscore
+from keopscore.formulas.factorization.CSE import eliminate_common_subformulas
+from keopscore.formulas.variables import Var
+from keopscore.utils.code_gen_utils import new_c_varname, c_array
+
+
+def is_invariant(formula, cats):
+    # True if the formula only depends on variables of the categories cats, e.g.
+    # (0, 2) for "i" variables and parameters : its value does not change along the other axis
+    return all(v.cat in cats for v in formula.Vars_)
+
+
+def hoist_subformulas(formula, cats, ind):
+    """
+    Replaces the maximal subformulas of formula which only depend on variables of the
+    categories cats (and are not leaves such as variables or constants) by new variables,
+    so that they can be evaluated once, outside of the loop over the other axis.
+    The new variables have consecutive indices starting from ind, and the category 3
+    of temporary variables (see Factorize). Equal subformulas are replaced by the same variable.
+
+    Returns:
+        the new formula, and the list of pairs (variable, subformula).
+    """
+    hoisted = []
+
+    def rec(f):
+        if len(f.children) == 0:
+            return f
+        if is_invariant(f, cats):
+            for v, g in hoisted:
+                if g == f:
+                    return v
+            v = Var(ind + len(hoisted), f.dim, 3)
+            hoisted.append((v, f))
+            return v
+        new_children = [rec(child) for child in f.children]
+        if all(new is old for new, old in zip(new_children, f.children)):
+            return f
+        return type(f)(*new_children, *f.params)
+
+    return rec(formula), hoisted
+
+
+def hoisted_code(hoisted, table, dtype, row=None):
+    """
+    returns the C++ code which declares c_arrays for the subformulas returned by
+    hoist_subformulas and evaluates them, and the table extended with these c_arrays,
+    to be used for the evaluation of the new formula.
+    If row is given (a C++ pointer expression), the subformulas are written at consecutive
+    offsets from row instead of local c_arrays, e.g. into a buffer which persists across
+    several loops over j.
+    """
+    code = ""
+    new_table = list(table)
+    k = 0
+    for v, f in hoisted:
+        if row is None:
+            out = c_array(dtype, f.dim, new_c_varname("hoisted"))
+            code += f"{out.declare()}\n"
+        else:
+            out = c_array(dtype, f.dim, f"({row}+{k})")
+            k += f.dim
+        # N.B. Factorize operations append their temporary variables to the table
+        code += eliminate_common_subformulas(f)(out, list(new_table))
+        new_table.append(out)
+    return code, new_table
+
+
+def hoist_invariants(red_formula, table, dtype, formula=None):
+    """
+    for the Cpu map-reduce schemes : returns the C++ code which evaluates the subformulas
+    of formula (by default the formula of red_formula) which only depend on "i" variables
+    and parameters, to be inserted once per index i before the loop over j, together with
+    the formula to evaluate in the loop over j and its table.
+    """
+    if formula is None:
+        formula = red_formula.formula
+    if not keopscore.hoist_invariants:
+        return "", formula, table
+    formula, hoisted = hoist_subformulas(formula, (red_formula.tagI, 2), len(table))
+    code, table = hoisted_code(hoisted, table, dtype)
+    return code, formula, table
+
+
+def precompute_invariants(red_formula, formula, table, direct_table, dtype):
+    """
+    for the Cpu map-reduce schemes : the subformulas of formula (e.g. the formula returned by
+    hoist_invariants) which only depend on "j" variables and parameters are evaluated in a
+    linear pass over the indices j, into a temporary buffer of size ny * d, before the
+    quadratic loops ; the formula then reads them from this buffer as new "j" variables.
+    direct_table is a table which reads the variables from the input arrays, at row j.
+
+    Returns:
+        the C++ code of the linear pass, to be inserted before the loops, the formula to
+        evaluate in the loop over j and its table.
+    """
+    if not keopscore.hoist_invariants:
+        return "", formula, table
+    formula, precomputed = hoist_subformulas(formula, (red_formula.tagJ, 2), len(table))
+    if len(precomputed) == 0:
+        return "", formula, table
+    dim = sum(f.dim for _, f in precomputed)
+    buffer = new_c_varname("precomputed")
+    code_j = ""
+    new_table = list(table)
+    k = 0
+    for v, f in precomputed:
+        out = c_array(dtype, f.dim, f"({buffer}.data()+j*{dim}+{k})")
+        code_j += eliminate_common_subformulas(f)(out, list(direct_table))
+        new_table.append(out)
+        k += f.dim
+    code = f"""
+    std::vector< {dtype} > {buffer}(ny * {dim});
+    #pragma omp parallel for schedule(static)
+    for (signed long int j = 0; j < ny; j++) {{
+        {code_j}
+    }}
+    """
+    return code, formula, new_table
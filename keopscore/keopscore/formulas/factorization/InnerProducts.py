@@ -0,0 +1,71 @@
+import keopscore
+from keopscore.formulas.maths import ReLU, SqNorm2
+from keopscore.formulas.maths.Scalprod import Scalprod_Impl
+from keopscore.formulas.maths.Square import Square_Impl
+from keopscore.formulas.maths.Subtract import Subtract_Impl
+from keopscore.formulas.maths.Sum import Sum_Impl
+from keopscore.formulas.variables import Var
+from keopscore.formulas.variables.IntCst import IntCst
+
+
+def variables_pair(fa, fb, tagI, tagJ, min_dim):
+    # returns the pair (x, y) of an "i" variable and a "j" variable if fa and fb are such
+    # variables (in any order), with dimension at least min_dim ; None otherwise
+    if not (isinstance(fa, Var) and isinstance(fb, Var)) or fa.dim < min_dim:
+        return None
+    if fa.cat == tagI and fb.cat == tagJ:
+        return fa, fb
+    if fa.cat == tagJ and fb.cat == tagI:
+        return fb, fa
+    return None
+
+
+def expand_inner_products(formula, tagI, tagJ, ind, min_dim):
+    """
+    Replaces the subformulas Scalprod(x,y) and SqDist(x,y) of formula, where x is an "i"
+    variable and y a "j" variable of dimension at least min_dim, by expressions of the
+    inner product <x,y> : SqDist(x,y) = |x|^2 + |y|^2 - 2<x,y>. The inner products are
+    replaced by new variables, with consecutive indices starting from ind and the category 3
+    of temporary variables, so that they can be computed for blocks of indices i and j at once
+    (see CpuReduc_tiled). The norms |x|^2 and |y|^2 only depend on one of the indices, and are
+    hoisted out of the loops (see Hoist).
+    N.B. since this expansion is subject to cancellation when x and y are close, the squared
+    distances are clamped to zero.
+
+    Returns:
+        the new formula, and the list of triplets (variable, x, y).
+    """
+    dots = []
+
+    def dot(x, y):
+        for v, xv, yv in dots:
+            if xv == x and yv == y:
+                return v
+        v = Var(ind + len(dots), 1, 3)
+        dots.append((v, x, y))
+        return v
+
+    def rec(f):
+        if isinstance(f, Scalprod_Impl):
+            pair = variables_pair(*f.children, tagI, tagJ, min_dim)
+            if pair is not None:
+                return dot(*pair)
+        if (
+            isinstance(f, Sum_Impl)
+            and isinstance(f.children[0], Square_Impl)
+            and isinstance(f.children[0].children[0], Subtract_Impl)
+        ):
+            pair = variables_pair(
+                *f.children[0].children[0].children, tagI, tagJ, min_dim
+            )
+            if pair is not None:
+                x, y = pair
+                return ReLU(SqNorm2(x) + SqNorm2(y) - IntCst(2) * dot(x, y))
+        new_children = [rec(child) for child in f.children]
+        if all(new is old for new, old in zip(new_children, f.children)):
+            return f
+        return type(f)(*new_children, *f.params)
+
+    if not keopscore.expand_inner_products:
+        return formula, dots
+    return rec(formula), dots
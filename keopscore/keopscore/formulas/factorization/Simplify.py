@@ -0,0 +1,306 @@
+from fractions import Fraction
+from functools import reduce
+import math
+
+from keopscore.formulas.factorization.CSE import FormulaDAG
+from keopscore.formulas.maths import *
+from keopscore.formulas.maths.Add import Add_Impl
+from keopscore.formulas.maths.Divide import Divide_Impl
+from keopscore.formulas.maths.Minus import Minus_Impl
+from keopscore.formulas.maths.Mult import Mult_Impl
+from keopscore.formulas.maths.Pow import Pow_Impl
+from keopscore.formulas.maths.Scalprod import Scalprod_Impl
+from keopscore.formulas.maths.Square import Square_Impl
+from keopscore.formulas.maths.Subtract import Subtract_Impl
+from keopscore.formulas.maths.Sum import Sum_Impl
+from keopscore.formulas.maths.SumT import SumT_Impl
+from keopscore.formulas.reductions.Sum_Reduction import Sum_Reduction
+from keopscore.formulas.variables.IntCst import IntCst, IntCst_Impl
+from keopscore.formulas.variables.RatCst import RatCst, RatCst_Impl
+from keopscore.formulas.variables.Zero import Zero
+
+##########################################
+######    Cost model of operations   #####
+##########################################
+
+# approximate cost of operations, per scalar value of their output, relative to an
+# addition or a product. Operations which are not listed have cost 1.
+# N.B. keops_pow and keops_powf are not evaluated in simd mode (see CpuReduc.use_simd)
+op_costs = {
+    Divide_Impl: 4,
+    Inv: 4,
+    IntInv: 4,
+    Sqrt: 8,
+    Rsqrt: 8,
+    Exp: 16,
+    Log: 16,
+    XLogX: 16,
+    Sin: 16,
+    Cos: 16,
+    Asin: 16,
+    Acos: 16,
+    Atan: 16,
+    Atan2: 16,
+    SinXDivX: 16,
+    Pow_Impl: 32,
+    Powf: 48,
+}
+
+
+def formula_cost(formula):
+    # cost of the evaluation of a formula ; equal subformulas are counted once, since they
+    # are evaluated once (see keopscore.formulas.factorization.CSE)
+    dag = FormulaDAG(formula)
+    return sum(
+        op_costs.get(type(f), 1) * f.dim
+        for k, f in enumerate(dag.nodes)
+        if not dag.is_leaf(k)
+    )
+
+
+##########################################
+######    Rewrite rules              #####
+##########################################
+
+# functions which apply the simplification rules of the constructors of operations,
+# used to rebuild a formula from simplified children
+factories = {
+    Add_Impl: Add,
+    Subtract_Impl: Subtract,
+    Minus_Impl: Minus,
+    Mult_Impl: Mult,
+    Divide_Impl: Divide,
+    Square_Impl: Square,
+    Scalprod_Impl: Scalprod,
+    Sum_Impl: Sum,
+    SumT_Impl: SumT,
+    Pow_Impl: Pow,
+}
+
+
+def rebuild(f, children):
+    if all(new is old for new, old in zip(children, f.children)):
+        return f
+    return factories.get(type(f), type(f))(*children, *f.params)
+
+
+def constant_value(f):
+    # value of a scalar constant as a Fraction, or None
+    if isinstance(f, IntCst_Impl):
+        return Fraction(f.val)
+    elif isinstance(f, RatCst_Impl):
+        return Fraction(f.p, f.q)
+    elif isinstance(f, Zero) and f.dim == 1:
+        return Fraction(0)
+    return None
+
+
+def exact_in_float(value):
+    # True if the rational value is exactly represented by the (float) literals of IntCst
+    # and RatCst, i.e. an integer or dyadic rational with at most 24 significant bits
+    p, q = abs(value.numerator), value.denominator
+    return p <= 2**24 and q <= 2**24 and q & (q - 1) == 0
+
+
+def constant(value):
+    # formula of a rational constant, or None if it would be rounded in the C++ code.
+    # N.B. such constants are left unfolded, so that they are still evaluated at the
+    # precision of the kernel, e.g. Inv(IntCst(3)) or Pow(IntCst(10),30)
+    if not exact_in_float(value):
+        return None
+    return RatCst(value.numerator, value.denominator)
+
+
+def scale_formula(value):
+    # formula of the rational constant value, evaluated at the precision of the kernel ;
+    # used by the Gpu schemes which apply the scale of a Sum_Reduction to its formula
+    res = constant(value)
+    if res is None:
+        res = IntCst(value.numerator) * Inv(IntCst(value.denominator))
+    return res
+
+
+def exact_sqrt(x):
+    p, q = math.isqrt(x.numerator), math.isqrt(x.denominator)
+    return Fraction(p, q) if p * p == x.numerator and q * q == x.denominator else None
+
+
+# exact evaluation of operations on rational constants ; None when the result is not rational
+constant_ops = {
+    Add_Impl: lambda f, a, b: a + b,
+    Subtract_Impl: lambda f, a, b: a - b,
+    Mult_Impl: lambda f, a, b: a * b,
+    Divide_Impl: lambda f, a, b: a / b if b != 0 else None,
+    Minus_Impl: lambda f, a: -a,
+    Square_Impl: lambda f, a: a * a,
+    Inv: lambda f, a: 1 / a if a != 0 else None,
+    Abs: lambda f, a: abs(a),
+    Pow_Impl: lambda f, a: a ** f.params[0] if a != 0 or f.params[0] > 0 else None,
+    Sqrt: lambda f, a: exact_sqrt(a) if a >= 0 else None,
+    Exp: lambda f, a: Fraction(1) if a == 0 else None,
+    Log: lambda f, a: Fraction(0) if a == 1 else None,
+}
+
+
+def fold_constants(f):
+    # e.g. Sqrt(IntCst(4)) -> IntCst(2), Exp(Zero(1)) -> IntCst(1)
+    if type(f) not in constant_ops:
+        return None
+    values = [constant_value(child) for child in f.children]
+    if any(value is None for value in values):
+        return None
+    value = constant_ops[type(f)](f, *values)
+    return None if value is None else constant(value)
+
+
+def factors(f):
+    # factors of a product
+    if isinstance(f, Mult_Impl):
+        return factors(f.children[0]) + factors(f.children[1])
+    return [f]
+
+
+def merge_exponentials(f):
+    # Exp(a)*...*Exp(b) -> Exp(a+b)*..., Exp(a)/Exp(b) -> Exp(a-b), f/Exp(b) -> f*Exp(-b)
+    if isinstance(f, Divide_Impl) and isinstance(f.children[1], Exp):
+        (b,) = f.children[1].children
+        return Mult(f.children[0], Exp(-b))
+    if not isinstance(f, Mult_Impl):
+        return None
+    fs = factors(f)
+    exps = [g for g in fs if isinstance(g, Exp)]
+    if len(exps) < 2:
+        return None
+    others = [g for g in fs if not isinstance(g, Exp)]
+    exponential = Exp(reduce(Add, (g.children[0] for g in exps)))
+    return reduce(Mult, others + [exponential])
+
+
+def simplify_compositions(f):
+    # Sqrt(Square(x)) -> Abs(x), Log(Exp(x)) -> x, Inv(Inv(x)) -> x,
+    # Abs(Square(x)) -> Square(x), Square(Abs(x)) -> Square(x)
+    if len(f.children) != 1:
+        return None
+    (g,) = f.children
+    if isinstance(f, Sqrt) and isinstance(g, Square_Impl):
+        return Abs(g.children[0])
+    if isinstance(f, Log) and isinstance(g, Exp):
+        return g.children[0]
+    if isinstance(f, Inv) and isinstance(g, Inv):
+        return g.children[0]
+    if isinstance(f, Abs) and isinstance(g, Square_Impl):
+        return g
+    if isinstance(f, Square_Impl) and isinstance(g, Abs):
+        return Square(g.children[0])
+    return None
+
+
+def power_by_squaring(f, m):
+    # f**m with m >= 1, computed with products and squares
+    if m == 1:
+        return f
+    g = Square(power_by_squaring(f, m // 2))
+    return Mult(f, g) if m % 2 else g
+
+
+def reduce_powers(f):
+    # Pow(f,m) with integer m -> products and squares ; Powf(f,IntCst(m)) -> Pow(f,m),
+    # Powf(f,1/2) -> Sqrt(f)
+    if isinstance(f, Powf):
+        g, e = f.children
+        value = constant_value(e)
+        if value is None:
+            return None
+        if value.denominator == 1:
+            return Pow(g, value.numerator)
+        if value == Fraction(1, 2):
+            return Sqrt(g)
+        return None
+    if not isinstance(f, Pow_Impl):
+        return None
+    (g,), (m,) = f.children, f.params
+    if constant_value(g) is not None:
+        # N.B. powers of constants are left to fold_constants, since the products of
+        # integer constants are folded without bound by Mult
+        return None
+    if m == 0:
+        # N.B. we keep Pow(f,0) so that the variables of the formula are unchanged
+        return None
+    res = power_by_squaring(g, abs(m))
+    return res if m > 0 else Inv(res)
+
+
+# rewrite rules : functions which return a new formula equal to their input, or None.
+# A rewrite is applied if it lowers the cost of the formula (see formula_cost).
+rules = [fold_constants, merge_exponentials, simplify_compositions, reduce_powers]
+
+
+##########################################
+######    Rewrite engine             #####
+##########################################
+
+
+def simplify(formula):
+    """
+    returns a formula equal to formula, simplified by the rewrite rules : the children of
+    each subformula are simplified first, then the first rule which lowers the cost of
+    the subformula is applied, and so on until no rule applies.
+    """
+    memo = {}
+
+    def rec(f):
+        if id(f) in memo:
+            return memo[id(f)]
+        g = f
+        if len(f.children) > 0:
+            g = rebuild(f, [rec(child) for child in f.children])
+            cost = formula_cost(g)
+            for rule in rules:
+                new = rule(g)
+                if new is not None and new.dim == g.dim and formula_cost(new) < cost:
+                    g = rec(new)
+                    break
+        memo[id(f)] = g
+        return g
+
+    return rec(formula)
+
+
+def split_constant_factor(f):
+    # returns (c, g) such that f = c*g with c a rational number, g a formula or None for 1
+    value = constant_value(f)
+    if value is not None:
+        return value, None
+    if isinstance(f, Minus_Impl):
+        c, g = split_constant_factor(f.children[0])
+        return -c, g
+    if isinstance(f, Mult_Impl):
+        (ca, ga), (cb, gb) = (split_constant_factor(child) for child in f.children)
+        if ca == 1 and cb == 1:
+            return Fraction(1), f
+        if ga is None or gb is None:
+            return ca * cb, gb if ga is None else ga
+        return ca * cb, Mult(ga, gb)
+    if isinstance(f, Divide_Impl):
+        c, g = split_constant_factor(f.children[0])
+        if c == 1:
+            return c, f
+        return c, Inv(f.children[1]) if g is None else Divide(g, f.children[1])
+    return Fraction(1), f
+
+
+def simplify_reduction(reduction):
+    """
+    simplifies the formula of a reduction (see simplify). For sum reductions, constant
+    factors of the formula are pulled out of the reduction : they are applied once per
+    output value, in FinalizeOutput, instead of once per pair (i,j).
+    """
+    formula = simplify(reduction.formula)
+    if type(reduction) is Sum_Reduction and reduction.scale is None:
+        c, g = split_constant_factor(formula)
+        if c not in (0, 1) and g is not None and g.dim == formula.dim:
+            return Sum_Reduction(g, reduction.tagI, scale=c)
+    if formula is reduction.formula:
+        return reduction
+    reduction.children[0] = reduction.formula = formula
+    return reduction
@@ -19,6 +19,9 @@ from keopscore.formulas.maths.Extract import Extract
 class SoftDTW_SqDist(Operation):
     string_id = "SoftDTW_SqDist"
 
+    # dynamic programming with a local buffer of size n : not worth a simd evaluation
+    vectorizable = False
+
     def __init__(self, x, y, gamma, params=()):
         # x is vector of size n, y is vector of size m, gamma is scalar,
         # output is scalar
@@ -97,6 +100,7 @@ class SoftDTW_SqDist(Operation):
 
 class GradSoftDTW_SqDist(Operation):
     string_id = "GradSoftDTW_SqDist"
+    vectorizable = False
 
     def __init__(self, x, y, gamma, params=()):
         # x is vector of size n, y is vector of size m, gamma is scalar,
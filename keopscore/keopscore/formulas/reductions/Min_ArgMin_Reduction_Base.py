@@ -35,7 +35,7 @@ class Min_ArgMin_Reduction_Base(Reduction):
         dim = self.formula.dim
         acc_val, acc_ind = acc.split(dim, dim)
         xi_val, xi_ind = xi.split(dim, dim)
-        return VectApply(self.ReducePairScalar, acc_val, xi_val, xi_ind)
+        return VectApply(self.ReducePairScalar, acc_val, acc_ind, xi_val, xi_ind)
 
     def ReducePairShort(self, acc, xi, ind):
         if xi.dtype == "half2":
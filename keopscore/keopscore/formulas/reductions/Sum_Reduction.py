@@ -1,4 +1,5 @@
 from keopscore.utils.code_gen_utils import (
+    cast_to,
     c_zero_float,
     c_for_loop,
     c_variable,
@@ -12,11 +13,17 @@ class Sum_Reduction(Reduction):
 
     string_id = "Sum_Reduction"
 
-    def __init__(self, formula, tagIJ):
+    def __init__(self, formula, tagIJ, scale=None):
         super().__init__(formula, tagIJ)
         self.dim = formula.dim  # dimension of final output of reduction
         self.dimred = self.dim  # dimension of inner reduction variables
         self.dim_kahan = self.dim
+        # scale is an optional rational number (Fraction) by which the sum is multiplied
+        # in FinalizeOutput ; it is set when constant factors are pulled out of the formula
+        # (see keopscore.formulas.factorization.Simplify)
+        self.scale = scale
+        if scale is not None:
+            self.params = (tagIJ, scale)
 
     def InitializeReduction(self, tmp):
         # Returns C++ code to be used at initialization phase of the reduction.
@@ -39,12 +46,25 @@ class Sum_Reduction(Reduction):
             + acc[k].assign(b)
         )
 
+    def FinalizeOutput(self, acc, out, i):
+        if self.scale is None:
+            return super().FinalizeOutput(acc, out, i)
+        # N.B. the constant is written at the precision of the output, so that it is
+        # correctly rounded for double outputs
+        if out.dtype == "double":
+            scale = c_variable("double", f"({float(self.scale)!r})")
+        else:
+            float_val = c_variable("float", f"(float)({float(self.scale)!r})")
+            scale = c_variable(out.dtype, cast_to(out.dtype, float_val))
+        loop, k = c_for_loop(0, self.dim, 1, pragma_unroll=True)
+        return loop(out[k].assign(acc[k]) + out[k].assign(out[k] * scale))
+
     def DiffT(self, v, gradin, f0=None):
         from keopscore.formulas.autodiff import Grad
 
-        return Sum_Reduction(Grad(self.formula, v, gradin), v.cat % 2)
+        return Sum_Reduction(Grad(self.formula, v, gradin), v.cat % 2, self.scale)
 
     def Diff(self, v, diffin, f0=None):
         from keopscore.formulas.autodiff import Diff
 
-        return Sum_Reduction(Diff(self.formula, v, diffin), self.tagI)
+        return Sum_Reduction(Diff(self.formula, v, diffin), self.tagI, self.scale)
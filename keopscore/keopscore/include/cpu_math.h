@@ -0,0 +1,187 @@
+#pragma once
+
+// Exponential and logarithm for the Cpu map-reduce schemes (see keops_exp and keops_log in
+// keopscore/utils/math_functions.py). When the compiler targets vector units of at least
+// 256 bits (e.g. with CXXFLAGS="-march=native"), they are computed by inline and branch-free
+// functions, so that the compiler vectorizes them in the "#pragma omp simd" loops of CpuReduc.
+// Their error is about 1 ulp in double precision and 2 ulp in single precision.
+// N.B. with narrower vectors, the scalar functions of the C math library are faster, and are
+// used instead. The selects are only vectorized with -fno-trapping-math (see config/base_config.py).
+
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+
+#ifndef __AVX__
+
+static inline double keops_cpu_exp(double x) { return exp(x); }
+
+static inline double keops_cpu_log(double x) { return log(x); }
+
+static inline float keops_cpu_exp(float x) { return exp(x); }
+
+static inline float keops_cpu_log(float x) { return log(x); }
+
+#else
+
+static inline double keops_bits_to_double(uint64_t u) {
+  double x;
+  std::memcpy(&x, &u, sizeof(x));
+  return x;
+}
+
+static inline uint64_t keops_double_to_bits(double x) {
+  uint64_t u;
+  std::memcpy(&u, &x, sizeof(u));
+  return u;
+}
+
+// 2^n for an integer n (stored in a double) with -1022 <= n <= 1023 : n is rounded
+// by adding 1.5*2^52, so that its value is in the low bits of the result.
+static inline double keops_exp2_int(double n) {
+  const double round = 6755399441055744.0;
+  uint64_t k = keops_double_to_bits(n + round) - keops_double_to_bits(round);
+  return keops_bits_to_double((k + 1023) << 52);
+}
+
+#pragma omp declare simd
+static inline double keops_cpu_exp(double x) {
+  const double log2e = 1.4426950408889634;
+  const double ln2_hi = 6.93147180369123816490e-01;
+  const double ln2_lo = 1.90821492927058770002e-10;
+  const double round = 6755399441055744.0;
+  // N.B. results overflow to inf or underflow to 0 outside of this range, and NaN
+  // values are propagated by the comparisons
+  x = (x < -746.0) ? -746.0 : x;
+  x = (x > 710.0) ? 710.0 : x;
+  // x = n*log(2) + r with |r| <= log(2)/2
+  double n = (x * log2e + round) - round;
+  double r = (x - n * ln2_hi) - n * ln2_lo;
+  // Taylor expansion of exp(r), with error below 1e-17
+  double p = 1.0 / 6227020800.0;
+  p = p * r + 1.0 / 479001600.0;
+  p = p * r + 1.0 / 39916800.0;
+  p = p * r + 1.0 / 3628800.0;
+  p = p * r + 1.0 / 362880.0;
+  p = p * r + 1.0 / 40320.0;
+  p = p * r + 1.0 / 5040.0;
+  p = p * r + 1.0 / 720.0;
+  p = p * r + 1.0 / 120.0;
+  p = p * r + 1.0 / 24.0;
+  p = p * r + 1.0 / 6.0;
+  p = p * r + 0.5;
+  p = p * r + 1.0;
+  p = p * r + 1.0;
+  // 2^n is split in two factors, so that subnormal results are computed correctly
+  double n1 = (n * 0.5 + round) - round;
+  return p * keops_exp2_int(n1) * keops_exp2_int(n - n1);
+}
+
+#pragma omp declare simd
+static inline double keops_cpu_log(double x) {
+  const double ln2_hi = 6.93147180369123816490e-01;
+  const double ln2_lo = 1.90821492927058770002e-10;
+  // subnormal numbers are scaled by 2^54
+  bool subnormal = x < 2.2250738585072014e-308;
+  double y = subnormal ? x * 18014398509481984.0 : x;
+  // y = 2^e * m with sqrt(2)/2 <= m < sqrt(2)
+  uint64_t u = keops_double_to_bits(y);
+  int32_t hx = (int32_t)(u >> 32);
+  double e = (double)(((hx >> 20) & 0x7ff) - 1023) - (subnormal ? 54.0 : 0.0);
+  double m = keops_bits_to_double((u & 0x000fffffffffffffULL) | 0x3ff0000000000000ULL);
+  bool large = m > 1.4142135623730951;
+  m = large ? 0.5 * m : m;
+  e = large ? e + 1.0 : e;
+  // log(m) = 2*atanh(s) with s = (m-1)/(m+1), |s| <= 0.1716
+  double s = (m - 1.0) / (m + 1.0);
+  double s2 = s * s;
+  double p = 1.0 / 23.0;
+  p = p * s2 + 1.0 / 21.0;
+  p = p * s2 + 1.0 / 19.0;
+  p = p * s2 + 1.0 / 17.0;
+  p = p * s2 + 1.0 / 15.0;
+  p = p * s2 + 1.0 / 13.0;
+  p = p * s2 + 1.0 / 11.0;
+  p = p * s2 + 1.0 / 9.0;
+  p = p * s2 + 1.0 / 7.0;
+  p = p * s2 + 1.0 / 5.0;
+  p = p * s2 + 1.0 / 3.0;
+  double res = e * ln2_hi + ((2.0 * s + 2.0 * s * s2 * p) + e * ln2_lo);
+  // special values : log(0) = -inf, log(inf) = inf, log(x) = NaN for x < 0 or x = NaN
+  res = (x == 0.0) ? -HUGE_VAL : res;
+  res = (x > 1.7976931348623157e308) ? x : res;
+  bool nan = (x < 0.0) | (x != x);
+  return nan ? (x - x) / (x - x) : res;
+}
+
+static inline float keops_bits_to_float(uint32_t u) {
+  float x;
+  std::memcpy(&x, &u, sizeof(x));
+  return x;
+}
+
+static inline uint32_t keops_float_to_bits(float x) {
+  uint32_t u;
+  std::memcpy(&u, &x, sizeof(u));
+  return u;
+}
+
+// 2^n for an integer n (stored in a float) with -126 <= n <= 127
+static inline float keops_exp2_int(float n) {
+  const float round = 12582912.0f;
+  uint32_t k = keops_float_to_bits(n + round) - keops_float_to_bits(round);
+  return keops_bits_to_float((k + 127) << 23);
+}
+
+// N.B. the single precision versions use the same algorithms, with shorter expansions
+#pragma omp declare simd
+static inline float keops_cpu_exp(float x) {
+  const float log2e = 1.44269504f;
+  const float ln2_hi = 0.693359375f;
+  const float ln2_lo = -2.12194440e-4f;
+  const float round = 12582912.0f;
+  x = (x < -105.0f) ? -105.0f : x;
+  x = (x > 89.0f) ? 89.0f : x;
+  float n = (x * log2e + round) - round;
+  float r = (x - n * ln2_hi) - n * ln2_lo;
+  float p = 1.0f / 40320.0f;
+  p = p * r + 1.0f / 5040.0f;
+  p = p * r + 1.0f / 720.0f;
+  p = p * r + 1.0f / 120.0f;
+  p = p * r + 1.0f / 24.0f;
+  p = p * r + 1.0f / 6.0f;
+  p = p * r + 0.5f;
+  p = p * r + 1.0f;
+  p = p * r + 1.0f;
+  float n1 = (n * 0.5f + round) - round;
+  return p * keops_exp2_int(n1) * keops_exp2_int(n - n1);
+}
+
+#pragma omp declare simd
+static inline float keops_cpu_log(float x) {
+  const float ln2_hi = 0.693359375f;
+  const float ln2_lo = -2.12194440e-4f;
+  bool subnormal = x < 1.17549435e-38f;
+  float y = subnormal ? x * 33554432.0f : x;
+  uint32_t u = keops_float_to_bits(y);
+  float e = (float)((int32_t)((u >> 23) & 0xff) - 127) - (subnormal ? 25.0f : 0.0f);
+  float m = keops_bits_to_float((u & 0x007fffffU) | 0x3f800000U);
+  bool large = m > 1.41421356f;
+  m = large ? 0.5f * m : m;
+  e = large ? e + 1.0f : e;
+  float s = (m - 1.0f) / (m + 1.0f);
+  float s2 = s * s;
+  float p = 1.0f / 13.0f;
+  p = p * s2 + 1.0f / 11.0f;
+  p = p * s2 + 1.0f / 9.0f;
+  p = p * s2 + 1.0f / 7.0f;
+  p = p * s2 + 1.0f / 5.0f;
+  p = p * s2 + 1.0f / 3.0f;
+  float res = e * ln2_hi + ((2.0f * s + 2.0f * s * s2 * p) + e * ln2_lo);
+  res = (x == 0.0f) ? -HUGE_VALF : res;
+  res = (x > 3.40282347e38f) ? x : res;
+  bool nan = (x < 0.0f) | (x != x);
+  return nan ? (x - x) / (x - x) : res;
+}
+
+#endif
@@ -1,8 +1,15 @@
 import keopscore
 from keopscore.binders.cpp.Cpu_link_compile import Cpu_link_compile
 from keopscore.mapreduce.cpu.CpuAssignZero import CpuAssignZero
+from keopscore.formulas.factorization.CSE import eliminate_common_subformulas
+from keopscore.formulas.factorization.Hoist import (
+    hoist_invariants,
+    precompute_invariants,
+)
+from keopscore.formulas.reductions import sum_schemes
+from keopscore.formulas.reductions.sum_schemes import *
 from keopscore.mapreduce.MapReduce import MapReduce
-from keopscore.utils.code_gen_utils import c_include
+from keopscore.utils.code_gen_utils import c_array, c_include
 import keopscore
 from keopscore.config import *
 
@@ -14,6 +21,17 @@ class CpuReduc(MapReduce, Cpu_link_compile):
 
     AssignZero = CpuAssignZero
 
+    # number of consecutive "j" indices for which the formula is evaluated
+    # together in a "#pragma omp simd" loop, when keopscore.use_cpu_simd is True
+    simd_lanes = 8
+
+    # formulas with larger output dimension are evaluated one "j" index at a time
+    simd_max_dim = 64
+
+    # minimal number of "j" indices processed by a thread when the "j" range is split
+    # across threads, for reductions with fewer outputs than threads (see get_split_j_code)
+    split_j_min_size = 1024
+
     def __init__(self, *args):
         MapReduce.__init__(self, *args)
         Cpu_link_compile.__init__(self)
@@ -31,9 +49,14 @@ class CpuReduc(MapReduce, Cpu_link_compile):
         arg = self.arg
         args = self.args
         table = self.varloader.direct_table(args, i, j)
+        hoisted, formula_j, table_j = hoist_invariants(red_formula, table, self.dtype)
+        precomputed, formula_j, table_j = precompute_invariants(
+            red_formula, formula_j, table_j, table, self.dtype
+        )
+        formula_j = eliminate_common_subformulas(formula_j)
         sum_scheme = self.sum_scheme
 
-        headers = ["cmath", "stdlib.h"]
+        headers = ["cmath", "cpu_math.h", "stdlib.h", "vector"]
         if keopscore.openmp_config.get_use_OpenMP():
             headers.append("omp.h")
         if keopscore.debug_ops_at_exec:
@@ -44,18 +67,17 @@ class CpuReduc(MapReduce, Cpu_link_compile):
 {self.headers}
 template < typename TYPE > 
 int CpuConv_{self.gencode_filename}(signed long int nx, signed long int ny, TYPE* out, TYPE **{arg.id}) {{
-    #pragma omp parallel for
+    {precomputed}
+    // N.B. the schedule is set at call time by the bindings (see pykeops.set_schedule)
+    #pragma omp parallel for schedule(runtime)
     for (signed long int i = 0; i < nx; i++) {{
         {fout.declare()}
         {acc.declare()}
         {sum_scheme.declare_temporary_accumulator()}
         {red_formula.InitializeReduction(acc)}
         {sum_scheme.initialize_temporary_accumulator()}
-        for (signed long int j = 0; j < ny; j++) {{
-            {red_formula.formula(fout,table)}
-            {sum_scheme.accumulate_result(acc, fout, j)}
-            {sum_scheme.periodic_accumulate_temporary(acc, j)}
-        }}
+        {hoisted}
+        {self.get_j_loop_code("0", "ny", acc, table_j, formula=formula_j)}
         {sum_scheme.final_operation(acc)}
         {red_formula.FinalizeOutput(acc, outi, i)}
     }}
@@ -63,10 +85,150 @@ int CpuConv_{self.gencode_filename}(signed long int nx, signed long int ny, TYPE
 }}
                     """
 
-        self.code += f"""
+        self.code += self.get_launch_code()
+
+    def use_simd(self, formula=None):
+        # the lanes evaluation is used only if all operations of the formula support it
+        if formula is None:
+            formula = self.red_formula.formula
+        return (
+            keopscore.use_cpu_simd
+            and not keopscore.debug_ops_at_exec
+            and formula.dim <= self.simd_max_dim
+            and formula.is_vectorizable()
+        )
+
+    def get_j_loop_code(
+        self,
+        jstart,
+        jend,
+        acc,
+        table,
+        periodic_accumulate=True,
+        formula=None,
+        sum_scheme=None,
+    ):
+        # C++ code for the loop over j between jstart and jend (strings), which evaluates
+        # the formula (by default the formula of the reduction, or the formula returned by
+        # hoist_invariants) and accumulates the results in acc with the sum scheme (by
+        # default the sum scheme of the reduction). In simd mode, the formula is
+        # first evaluated for a batch of simd_lanes consecutive indices in a
+        # "#pragma omp simd" loop, writing into a local buffer ; results are then
+        # accumulated sequentially, so that the order of the reduction is unchanged.
+        # Remaining indices are processed one at a time.
+        if formula is None:
+            formula = self.red_formula.formula
+        if sum_scheme is None:
+            sum_scheme = self.sum_scheme
+        fout = self.fout
+        j = self.j
+
+        def accumulate(fout):
+            code = sum_scheme.accumulate_result(acc, fout, j)
+            if periodic_accumulate:
+                code += sum_scheme.periodic_accumulate_temporary(acc, j)
+            return code
+
+        if not self.use_simd(formula):
+            return f"""
+        for (signed long int j = {jstart}; j < {jend}; j++) {{
+            {formula(fout,table)}
+            {accumulate(fout)}
+        }}
+            """
+
+        L = self.simd_lanes
+        dimfout = fout.dim
+        fout_lanes = c_array(self.dtype, L * dimfout, "fout_lanes")
+        fout_lane = c_array(self.dtype, dimfout, f"(fout_lanes+lane*{dimfout})")
+        return f"""
+        signed long int jlanes = {jstart};
+        for (; jlanes + {L} <= {jend}; jlanes += {L}) {{
+            {fout_lanes.declare()}
+            #pragma omp simd
+            for (int lane = 0; lane < {L}; lane++) {{
+                signed long int j = jlanes + lane;
+                {formula(fout_lane,table)}
+            }}
+            for (int lane = 0; lane < {L}; lane++) {{
+                signed long int j = jlanes + lane;
+                {accumulate(fout_lane)}
+            }}
+        }}
+        for (signed long int j = jlanes; j < {jend}; j++) {{
+            {formula(fout,table)}
+            {accumulate(fout)}
+        }}
+            """
+
+    def get_split_j_code(self):
+        # C++ code for reductions with fewer outputs than threads (e.g. a sum over many
+        # points into a few centroids) : each output index i gets nblocks partial
+        # accumulators, computed in parallel over contiguous blocks of "j" indices, and then
+        # merged in the order of the blocks with the ReducePair method of the reduction.
+        i = self.i
+        red_formula = self.red_formula
+        fout = self.fout
+        outi = self.outi
+        arg = self.arg
+        args = self.args
+        dimred = red_formula.dimred
+        table = self.varloader.direct_table(args, i, self.j)
+        hoisted, formula_j, table_j = hoist_invariants(red_formula, table, self.dtype)
+        precomputed, formula_j, table_j = precompute_invariants(
+            red_formula, formula_j, table_j, table, self.dtype
+        )
+        formula_j = eliminate_common_subformulas(formula_j)
+        # N.B.: Cpu schemes may redirect the temporary accumulator of their sum scheme
+        # to their own buffers, so that we use a new one here.
+        sum_scheme = getattr(sum_schemes, self.sum_scheme_string)(
+            red_formula, self.dtype
+        )
+        partials = f"partials.data() + (i * nblocks + block) * {dimred}"
+        acc = c_array(self.dtypeacc, dimred, f"({partials})")
+        acc_first = c_array(
+            self.dtypeacc, dimred, f"(partials.data() + i * nblocks * {dimred})"
+        )
+        return f"""
+template < typename TYPE >
+int CpuConv_split_j_{self.gencode_filename}(signed long int nx, signed long int ny, signed long int nblocks, TYPE* out, TYPE **{arg.id}) {{
+    signed long int block_size = (ny + nblocks - 1) / nblocks;
+    std::vector< {self.dtypeacc} > partials(nx * nblocks * {dimred});
+    {precomputed}
+    #pragma omp parallel for schedule(static)
+    for (signed long int item = 0; item < nx * nblocks; item++) {{
+        signed long int i = item / nblocks, block = item % nblocks;
+        signed long int jstart = block * block_size;
+        signed long int jend = (jstart + block_size < ny) ? jstart + block_size : ny;
+        {fout.declare()}
+        {sum_scheme.declare_temporary_accumulator()}
+        {red_formula.InitializeReduction(acc)}
+        {sum_scheme.initialize_temporary_accumulator()}
+        {hoisted}
+        {self.get_j_loop_code("jstart", "jend", acc, table_j, formula=formula_j, sum_scheme=sum_scheme)}
+        {sum_scheme.final_operation(acc)}
+    }}
+    for (signed long int i = 0; i < nx; i++) {{
+        for (signed long int block = 1; block < nblocks; block++) {{
+            {red_formula.ReducePair(acc_first, acc)}
+        }}
+        {red_formula.FinalizeOutput(acc_first, outi, i)}
+    }}
+    return 0;
+}}
+"""
+
+    def get_launch_code(self):
+        # C++ entry points called by the bindings ; they are shared by all Cpu schemes
+        # without ranges, which only differ by the CpuConv_<tag> routine they define.
+        # When there are fewer outputs than threads, the "j" range is split across
+        # threads instead (see get_split_j_code).
+        return f"""
 #include "stdarg.h"
 #include <vector>
 
+{self.get_split_j_code()}
+
 template < typename TYPE > 
 int launch_keops_{self.gencode_filename}(signed long int nx, signed long int ny, int tagI, TYPE *out, TYPE **arg) {{
     
@@ -75,6 +237,16 @@ int launch_keops_{self.gencode_filename}(signed long int nx, signed long int ny,
         ny = nx;
         nx = tmp;
     }}
+
+#ifdef _OPENMP
+    signed long int nthreads = omp_get_max_threads();
+    if (nx < nthreads && ny >= 2 * {self.split_j_min_size}) {{
+        signed long int nblocks = (nthreads + nx - 1) / nx;
+        if (nblocks > ny / {self.split_j_min_size})
+            nblocks = ny / {self.split_j_min_size};
+        return CpuConv_split_j_{self.gencode_filename}< TYPE >(nx, ny, nblocks, out, arg);
+    }}
+#endif
     
     return CpuConv_{self.gencode_filename}< TYPE >(nx, ny, out, arg);
 
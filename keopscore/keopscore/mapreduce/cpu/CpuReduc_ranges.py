@@ -3,6 +3,8 @@ from keopscore.binders.cpp.Cpu_link_compile import Cpu_link_compile
 
 from keopscore.mapreduce.cpu.CpuAssignZero import CpuAssignZero
 from keopscore.mapreduce.MapReduce import MapReduce
+from keopscore.formulas.factorization.CSE import eliminate_common_subformulas
+from keopscore.formulas.factorization.Hoist import hoist_invariants
 from keopscore.utils.code_gen_utils import (
     c_variable,
     c_array,
@@ -17,6 +19,9 @@ class CpuReduc_ranges(MapReduce, Cpu_link_compile):
 
     AssignZero = CpuAssignZero
 
+    # number of chunks of work items per thread, for the load balancing of the ranges
+    chunks_per_thread = 16
+
     def __init__(self, *args):
         MapReduce.__init__(self, *args)
         Cpu_link_compile.__init__(self)
@@ -43,6 +48,8 @@ class CpuReduc_ranges(MapReduce, Cpu_link_compile):
 
         varloader = self.varloader
         table = varloader.table(xi, yj, param_loc)
+        hoisted, formula_j, table_j = hoist_invariants(red_formula, table, dtype)
+        formula_j = eliminate_common_subformulas(formula_j)
 
         nvarsi, nvarsj, nvarsp = (
             len(self.varloader.Varsi),
@@ -64,8 +71,8 @@ class CpuReduc_ranges(MapReduce, Cpu_link_compile):
         imstartx = c_variable("int", "i-start_x")
         jmstarty = c_variable("int", "j-start_y")
 
-        headers = ["cmath", "stdlib.h"]
-        if keopscore.openmp_config.get_use_OpenMP:
+        headers = ["cmath", "cpu_math.h", "stdlib.h"]
+        if keopscore.openmp_config.get_use_OpenMP():
             headers.append("omp.h")
         if keopscore.debug_ops_at_exec:
             headers.append("iostream")
@@ -134,9 +141,6 @@ int CpuConv_ranges_{self.gencode_filename}(signed long int nx, signed long int n
     
     // Actual for-for loop -----------------------------------------------------
 
-    {param_loc.declare()}
-    {varloader.load_vars("p", param_loc, args)}  // If nbatchdims == 0, the parameters are fixed once and for all
-    
     // Set the output to zero, as the ranges may not cover the full output -----
     {acctmp.declare()} // __TYPEACC__ acctmp[DIMRED];
 
@@ -164,29 +168,91 @@ int CpuConv_ranges_{self.gencode_filename}(signed long int nx, signed long int n
     signed long int* slices_x = {red_formula.tagJ} ? ranges[1] : ranges[4];
     signed long int* ranges_y = {red_formula.tagJ} ? ranges[2] : ranges[5];
 
+    // Load balancing ----------------------------------------------------------
+    //
+    // The rows of all the ranges are flattened into a single list of "work items",
+    // which is cut into contiguous chunks of (roughly) equal costs, processed by the threads
+    // with a dynamic schedule. The cost of a row is the number of "j" indices of its slices,
+    // so that large and small clusters are handled in the same parallel region, and
+    // a few expensive clusters do not leave the other threads idle.
+
+    std::vector< signed long int > range_costs(nranges);
+    signed long int total_cost = 0;
+    for (signed long int range_index = 0; range_index < nranges; range_index++) {{
+        signed long int start_slice = (range_index < 1) ? 0 : slices_x[range_index - 1];
+        signed long int end_slice = slices_x[range_index];
+        range_costs[range_index] = 1;  // N.B.: rows with empty slices still have to be written
+        for (signed long int slice = start_slice; slice < end_slice; slice++) {{
+            range_costs[range_index] += ranges_y[2 * slice + 1] - ranges_y[2 * slice];
+        }}
+        signed long int nrows = ranges_x[2 * range_index + 1] - ranges_x[2 * range_index];
+        total_cost += nrows * range_costs[range_index];
+    }}
+
+#ifdef _OPENMP
+    signed long int nchunks_max = {self.chunks_per_thread} * omp_get_max_threads();
+#else
+    signed long int nchunks_max = 1;
+#endif
+    signed long int chunk_cost = (total_cost + nchunks_max - 1) / nchunks_max;
+
+    // (chunk_ranges[c], chunk_rows[c]) = (range index, row) of the first work item of the chunk c,
+    // followed by a sentinel value
+    std::vector< signed long int > chunk_ranges, chunk_rows;
+    signed long int cost = chunk_cost;
+    for (signed long int range_index = 0; range_index < nranges; range_index++) {{
+        for (signed long int i = ranges_x[2 * range_index]; i < ranges_x[2 * range_index + 1]; i++) {{
+            if (cost >= chunk_cost) {{
+                chunk_ranges.push_back(range_index);
+                chunk_rows.push_back(i);
+                cost = 0;
+            }}
+            cost += range_costs[range_index];
+        }}
+    }}
+    signed long int nchunks = chunk_ranges.size();
+    chunk_ranges.push_back(nranges);
+    chunk_rows.push_back(0);
+
+    #pragma omp parallel
+    {{
     signed long int indices_i[sizei], indices_j[sizej], indices_p[sizep];  // Buffers for the "broadcasted indices"
     for (signed long int k = 0; k < sizei; k++) {{ indices_i[k] = 0; }}  // Fill the "offsets" with zeroes,
     for (signed long int k = 0; k < sizej; k++) {{ indices_j[k] = 0; }}  // the default value when nbatchdims == 0.
     for (signed long int k = 0; k < sizep; k++) {{ indices_p[k] = 0; }}
-    
-    
-    for (signed long int range_index = 0; range_index < nranges; range_index++) {{
+
+    {param_loc.declare()}
+    {varloader.load_vars("p", param_loc, args)}  // If nbatchdims == 0, the parameters are fixed once and for all
+
+    #pragma omp for schedule(dynamic, 1)
+    for (signed long int chunk = 0; chunk < nchunks; chunk++) {{
+        signed long int range_index = chunk_ranges[chunk], i = chunk_rows[chunk];
         signed long int start_x = ranges_x[2 * range_index];
-        signed long int end_x = ranges_x[2 * range_index + 1];
-        signed long int start_slice = (range_index < 1) ? 0 : slices_x[range_index - 1];
-        signed long int end_slice = slices_x[range_index];
+        bool new_range = true;
+        while (range_index < chunk_ranges[chunk + 1] || (range_index == chunk_ranges[chunk + 1] && i < chunk_rows[chunk + 1])) {{
+            if (i >= ranges_x[2 * range_index + 1]) {{
+                // end of the current range
+                range_index++;
+                if (range_index < nranges) {{
+                    start_x = ranges_x[2 * range_index];
+                    i = start_x;
+                    new_range = true;
+                }}
+                continue;
+            }}
+            signed long int start_slice = (range_index < 1) ? 0 : slices_x[range_index - 1];
+            signed long int end_slice = slices_x[range_index];
+
+            // If needed, compute the "true" start indices of the range, turning
+            // the "abstract" index start_x into an array of actual "pointers/offsets" stored in indices_i:
+            if (nbatchdims > 0 && new_range) {{
+                vect_broadcast_index(start_x, nbatchdims, sizei, shapes, shapes_i, indices_i);
+                // And for the parameters, too:
+                vect_broadcast_index(range_index, nbatchdims, sizep, shapes, shapes_p, indices_p);
+                {varloader.load_vars("p", param_loc, args, offsets=indices_p)}  // Load the paramaters, once per tile
+            }}
+            new_range = false;
 
-        // If needed, compute the "true" start indices of the range, turning
-        // the "abstract" index start_x into an array of actual "pointers/offsets" stored in indices_i:
-        if (nbatchdims > 0) {{
-            vect_broadcast_index(start_x, nbatchdims, sizei, shapes, shapes_i, indices_i);
-            // And for the parameters, too:
-            vect_broadcast_index(range_index, nbatchdims, sizep, shapes, shapes_p, indices_p);
-            {varloader.load_vars("p", param_loc, args, offsets=indices_p)}  // Load the paramaters, once per tile
-        }}
-    
-        #pragma omp parallel for   
-        for (signed long int i = start_x; i < end_x; i++) {{
             {xi.declare()}
             {yj.declare()}
             {fout.declare()}
@@ -197,6 +263,7 @@ int CpuConv_ranges_{self.gencode_filename}(signed long int nx, signed long int n
             }} else {{
                 {varloader.load_vars("i", xi, args, row_index=imstartx, offsets=indices_i)}
             }}
+            {hoisted}
             {red_formula.InitializeReduction(acc)}
             {sum_scheme.initialize_temporary_accumulator()}
             for (signed long int slice = start_slice; slice < end_slice; slice++) {{
@@ -211,21 +278,23 @@ int CpuConv_ranges_{self.gencode_filename}(signed long int nx, signed long int n
                 if (nbatchdims == 0) {{
                     for (signed long int j = start_y; j < end_y; j++) {{
                         {varloader.load_vars("j", yj, args, row_index=j)}
-                        {red_formula.formula(fout,table)}
+                        {formula_j(fout,table_j)}
                         {sum_scheme.accumulate_result(acc, fout, j)}
                     }}
                 }} else {{
                     for (signed long int j = start_y; j < end_y; j++) {{
                         {varloader.load_vars("j", yj, args, row_index=jmstarty, offsets=indices_j)}
-                        {red_formula.formula(fout,table)}
+                        {formula_j(fout,table_j)}
                         {sum_scheme.accumulate_result(acc, fout, jmstarty)}
                     }}
                 }}
             }}
             {sum_scheme.final_operation(acc)}
             {red_formula.FinalizeOutput(acc, outi, i)}
+            i++;
         }}
     }}
+    }}
     return 0;
 }}
                     """
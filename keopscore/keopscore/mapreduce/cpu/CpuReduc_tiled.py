@@ -0,0 +1,229 @@
+import keopscore
+from keopscore.mapreduce.cpu.CpuReduc import CpuReduc
+from keopscore.mapreduce.MapReduce import MapReduce
+from keopscore.formulas.factorization.CSE import eliminate_common_subformulas
+from keopscore.formulas.factorization.Hoist import (
+    hoist_subformulas,
+    hoisted_code,
+    precompute_invariants,
+)
+from keopscore.formulas.factorization.InnerProducts import expand_inner_products
+from keopscore.utils.code_gen_utils import c_array, c_include, new_c_varname, sizeof
+from keopscore.config import *
+
+
+class CpuReduc_tiled(CpuReduc):
+    """
+    class for generating the final C++ code, Cpu version with cache blocking :
+    each thread processes a block of consecutive "i" rows against successive tiles
+    of "j" columns. The "j" variables of a tile are copied once into a contiguous
+    local buffer, and then reused for every row of the block, instead of being
+    reloaded from memory for each (i,j) pair as in CpuReduc.
+    """
+
+    # number of "i" rows processed together against each tile of "j" columns
+    block_size_i = 32
+
+    # target size (in bytes) of the local buffer storing a tile of "j" variables ;
+    # it is chosen to fit comfortably in the L1 cache, together with the "i" variables.
+    tile_bytes = 16384
+
+    # upper bound for the number of "j" columns in a tile
+    max_tile_size_j = 1024
+
+    # minimal dimension of the variables of the inner products and squared distances
+    # computed for a whole block by the kernel of get_dots_code (see expand_inner_products)
+    inner_products_min_dim = 16
+
+    # number of "j" columns processed together by the kernel of get_dots_code
+    dots_block_size_j = 4
+
+    def tile_size_j(self):
+        # number of "j" columns in a tile, computed from the total dimension of "j" variables
+        if self.dimy == 0:
+            return self.max_tile_size_j
+        return max(
+            1,
+            min(
+                self.max_tile_size_j,
+                self.tile_bytes // (self.dimy * sizeof(self.dtype)),
+            ),
+        )
+
+    def get_dots_code(self, xi, offset, dots, tile_j):
+        # C++ code which computes the inner products of the "i" variable xi (a c_array read
+        # from the input array at row i) with the "j" variable stored at the given offset in
+        # the rows of the local tile, for all indices of the block and tile, into dots.
+        # Each row xi is loaded once for dots_block_size_j consecutive "j" columns.
+        dtype, dim, dimy, B = self.dtype, xi.dim, self.dimy, self.dots_block_size_j
+        sums = [f"s{b}" for b in range(B)]
+        return f"""
+            for (signed long int i = istart; i < iend; i++) {{
+                const {dtype} *xi = {xi.id};
+                {dtype} *dots_i = {dots.id} + (i - istart) * {tile_j};
+                signed long int j = jstart;
+                for (; j + {B} <= jend; j += {B}) {{
+                    const {dtype} *yj = yjtile + (j - jstart) * {dimy} + {offset};
+                    {dtype} {", ".join(f"{s} = 0" for s in sums)};
+                    #pragma omp simd reduction(+:{",".join(sums)})
+                    for (int k = 0; k < {dim}; k++) {{
+                        {"".join(f"{s} += xi[k] * yj[k + {b * dimy}];" for b, s in enumerate(sums))}
+                    }}
+                    {"".join(f"dots_i[j - jstart + {b}] = {s};" for b, s in enumerate(sums))}
+                }}
+                for (; j < jend; j++) {{
+                    const {dtype} *yj = yjtile + (j - jstart) * {dimy} + {offset};
+                    {dtype} s = 0;
+                    #pragma omp simd reduction(+:s)
+                    for (int k = 0; k < {dim}; k++) {{
+                        s += xi[k] * yj[k];
+                    }}
+                    dots_i[j - jstart] = s;
+                }}
+            }}
+        """
+
+    def get_code(self):
+        MapReduce.get_code(self)
+
+        i = self.i
+        j = self.j
+        dtype = self.dtype
+        dtypeacc = self.dtypeacc
+        red_formula = self.red_formula
+        fout = self.fout
+        outi = self.outi
+        arg = self.arg
+        args = self.args
+        varloader = self.varloader
+        sum_scheme = self.sum_scheme
+        dimy = self.dimy
+        dimred = red_formula.dimred
+
+        block_i = self.block_size_i
+        tile_j = self.tile_size_j()
+
+        # local buffer for a tile of "j" variables, and the row of this buffer
+        # corresponding to the current index j
+        yjtile = c_array(dtype, tile_j * dimy, "yjtile")
+        yj = c_array(dtype, dimy, f"(yjtile+(j-jstart)*{dimy})")
+
+        # accumulators for all rows of the current block, and the one of the current index i
+        acc_block = c_array(dtypeacc, block_i * dimred, "acc_block")
+        acc = c_array(dtypeacc, dimred, f"(acc_block+(i-istart)*{dimred})")
+
+        # the temporary accumulator of the Kahan scheme must persist across tiles,
+        # while the one of the block sum scheme is flushed at the end of each tile.
+        if self.sum_scheme_string == "kahan_scheme":
+            dim_kahan = red_formula.dim_kahan
+            tmp_block = c_array(dtype, block_i * dim_kahan, "tmp_block")
+            sum_scheme.tmp_acc = c_array(
+                dtype, dim_kahan, f"(tmp_block+(i-istart)*{dim_kahan})"
+            )
+        else:
+            tmp_block = c_array(dtype, 0, "tmp_block")
+
+        # "i" variables and parameters are read directly from the input arrays,
+        # "j" variables are read from the local tile.
+        direct_table = varloader.direct_table(args, i, j)
+        table = list(direct_table)
+        offsets = {}
+        k = 0
+        for dim, ind in zip(varloader.dimsy, varloader.indsj):
+            table[ind] = c_array(dtype, dim, f"({yj.id}+{k})")
+            offsets[ind] = k
+            k += dim
+        # N.B. the inner products of "i" and "j" variables of large dimension are computed
+        # for the whole block and tile, into local buffers read by the formula
+        formula, dots = (red_formula.formula, [])
+        if dtype in ("float", "double"):
+            formula, dots = expand_inner_products(
+                formula,
+                red_formula.tagI,
+                red_formula.tagJ,
+                len(table),
+                self.inner_products_min_dim,
+            )
+        dots_buffers = [
+            c_array(dtype, block_i * tile_j, new_c_varname("dots")) for _ in dots
+        ]
+        for buffer in dots_buffers:
+            table.append(
+                c_array(dtype, 1, f"({buffer.id}+(i-istart)*{tile_j}+j-jstart)")
+            )
+        dots_code = "".join(
+            self.get_dots_code(direct_table[x.ind], offsets[y.ind], buffer, tile_j)
+            for (_, x, y), buffer in zip(dots, dots_buffers)
+        )
+        # N.B. the subformulas which do not depend on "j" variables are evaluated once per
+        # index i, before the loop over tiles, into the rows of a buffer of the block
+        formula_j, hoisted = formula, []
+        if keopscore.hoist_invariants:
+            formula_j, hoisted = hoist_subformulas(
+                formula, (red_formula.tagI, 2), len(table)
+            )
+        dim_hoisted = sum(f.dim for _, f in hoisted)
+        hoisted_block = c_array(dtype, block_i * dim_hoisted, "hoisted_block")
+        hoisted, table_j = hoisted_code(
+            hoisted,
+            table,
+            dtype,
+            row=f"({hoisted_block.id}+(i-istart)*{dim_hoisted})",
+        )
+        # N.B. the subformulas which only depend on "j" variables are read from the buffer
+        # of the linear pass, and not from the local tile
+        precomputed, formula_j, table_j = precompute_invariants(
+            red_formula, formula_j, table_j, direct_table, dtype
+        )
+        formula_j = eliminate_common_subformulas(formula_j)
+
+        headers = ["cmath", "cpu_math.h", "stdlib.h", "vector"]
+        if keopscore.openmp_config.get_use_OpenMP():
+            headers.append("omp.h")
+        if keopscore.debug_ops_at_exec:
+            headers.append("iostream")
+        self.headers += c_include(*headers)
+
+        self.code = f"""
+{self.headers}
+template < typename TYPE >
+int CpuConv_{self.gencode_filename}(signed long int nx, signed long int ny, TYPE* out, TYPE **{arg.id}) {{
+    {precomputed}
+    // N.B. the schedule is set at call time by the bindings (see pykeops.set_schedule)
+    #pragma omp parallel for schedule(runtime)
+    for (signed long int istart = 0; istart < nx; istart += {block_i}) {{
+        signed long int iend = (istart + {block_i} < nx) ? istart + {block_i} : nx;
+        {yjtile.declare()}
+        {acc_block.declare()}
+        {tmp_block.declare()}
+        {hoisted_block.declare()}
+        {"".join(buffer.declare() for buffer in dots_buffers)}
+        for (signed long int i = istart; i < iend; i++) {{
+            {red_formula.InitializeReduction(acc)}
+            {sum_scheme.initialize_temporary_accumulator_first_init()}
+            {hoisted}
+        }}
+        for (signed long int jstart = 0; jstart < ny; jstart += {tile_j}) {{
+            signed long int jend = (jstart + {tile_j} < ny) ? jstart + {tile_j} : ny;
+            // load the current tile of "j" variables into the local buffer
+            for (signed long int j = jstart; j < jend; j++) {{
+                {varloader.load_vars("j", yj, args, row_index=j)}
+            }}
+            {dots_code}
+            for (signed long int i = istart; i < iend; i++) {{
+                {fout.declare()}
+                {sum_scheme.declare_temporary_accumulator() if self.sum_scheme_string == "block_sum" else ""}
+                {sum_scheme.initialize_temporary_accumulator_block_init()}
+                {self.get_j_loop_code("jstart", "jend", acc, table_j, periodic_accumulate=False, formula=formula_j)}
+                {sum_scheme.final_operation(acc)}
+            }}
+        }}
+        for (signed long int i = istart; i < iend; i++) {{
+            {red_formula.FinalizeOutput(acc, outi, i)}
+        }}
+    }}
+    return 0;
+}}
+                    """
+
+        self.code += self.get_launch_code()
@@ -1,4 +1,5 @@
 from keopscore.binders.nvrtc.Gpu_link_compile import Gpu_link_compile
+from keopscore.formulas.factorization.CSE import eliminate_common_subformulas
 from keopscore.mapreduce.gpu.GpuAssignZero import GpuAssignZero
 from keopscore.mapreduce.MapReduce import MapReduce
 from keopscore.utils.code_gen_utils import (
@@ -21,6 +22,7 @@ class GpuReduc1D(MapReduce, Gpu_link_compile):
         super().get_code()
 
         red_formula = self.red_formula
+        formula = eliminate_common_subformulas(red_formula.formula)
         dtype = self.dtype
         varloader = self.varloader
 
@@ -81,7 +83,7 @@ class GpuReduc1D(MapReduce, Gpu_link_compile):
                               {dtype} * yjrel = yj;
                               {sum_scheme.initialize_temporary_accumulator_block_init()}
                               for (signed long int jrel = 0; (jrel < blockDim.x) && (jrel < ny - jstart); jrel++, yjrel += {varloader.dimy}) {{
-                                {red_formula.formula(fout, table)} // Call the function, which outputs results in fout
+                                {formula(fout, table)} // Call the function, which outputs results in fout
                                 {sum_scheme.accumulate_result(acc, fout, jreltile)}
                               }}
                               {sum_scheme.final_operation(acc)}
@@ -1,4 +1,5 @@
 from keopscore.binders.nvrtc.Gpu_link_compile import Gpu_link_compile
+from keopscore.formulas.factorization.CSE import eliminate_common_subformulas
 from keopscore.mapreduce.gpu.GpuAssignZero import GpuAssignZero
 from keopscore.mapreduce.MapReduce import MapReduce
 from keopscore.utils.code_gen_utils import (
@@ -22,6 +23,7 @@ class GpuReduc1D_ranges(MapReduce, Gpu_link_compile):
         super().get_code()
 
         red_formula = self.red_formula
+        formula = eliminate_common_subformulas(red_formula.formula)
         dtype = self.dtype
         varloader = self.varloader
 
@@ -149,12 +151,12 @@ class GpuReduc1D_ranges(MapReduce, Gpu_link_compile):
                                           {sum_scheme.initialize_temporary_accumulator_block_init()}
                                           if (nbatchdims == 0) {{
                                               for(signed long int jrel = 0; (jrel < blockDim.x) && (jrel<end_y-jstart); jrel++, yjrel+={varloader.dimy}) {{
-                                                  {red_formula.formula(fout,table)} // Call the function, which outputs results in xi[0:DIMX1]
+                                                  {formula(fout,table)} // Call the function, which outputs results in xi[0:DIMX1]
                                                   {sum_scheme.accumulate_result(acc, fout, jreltile+starty)}
                                               }} 
                                           }} else {{
                                               for(signed long int jrel = 0; (jrel < blockDim.x) && (jrel<end_y-jstart); jrel++, yjrel+={varloader.dimy}) {{
-                                                  {red_formula.formula(fout,table)} // Call the function, which outputs results in fout
+                                                  {formula(fout,table)} // Call the function, which outputs results in fout
                                                   {sum_scheme.accumulate_result(acc, fout, jreltile)}
                                               }}
                                           }}
@@ -2,6 +2,7 @@ from keopscore import cuda_block_size
 from keopscore.config.chunks import dimfinalchunk
 from keopscore.binders.nvrtc.Gpu_link_compile import Gpu_link_compile
 from keopscore.formulas.reductions.Sum_Reduction import Sum_Reduction
+from keopscore.formulas.factorization.Simplify import scale_formula
 from keopscore.formulas.reductions.sum_schemes import *
 from keopscore.mapreduce.gpu.GpuAssignZero import GpuAssignZero
 from keopscore.mapreduce.MapReduce import MapReduce
@@ -116,9 +117,11 @@ class GpuReduc1D_ranges_finalchunks(MapReduce, Gpu_link_compile):
         yj = c_variable(pointer(dtype), "yj")
         out = c_variable(pointer(dtype), "out")
         ind_fun_internal = 0 if self.red_formula.formula.children[0].dim == 1 else 1
-        fun_internal = Sum_Reduction(
-            self.red_formula.formula.children[ind_fun_internal], self.red_formula.tagI
-        )
+        fun = self.red_formula.formula.children[ind_fun_internal]
+        if self.red_formula.scale is not None:
+            # N.B. the constant factor of the sum is applied to the scalar formula
+            fun = scale_formula(self.red_formula.scale) * fun
+        fun_internal = Sum_Reduction(fun, self.red_formula.tagI)
         formula = fun_internal.formula
         varfinal = self.red_formula.formula.children[1 - ind_fun_internal]
         nchunks = 1 + (varfinal.dim - 1) // dimfinalchunk
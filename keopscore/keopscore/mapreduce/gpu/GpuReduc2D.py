@@ -1,4 +1,5 @@
 from keopscore.binders.nvrtc.Gpu_link_compile import Gpu_link_compile
+from keopscore.formulas.factorization.CSE import eliminate_common_subformulas
 from keopscore.formulas.reductions.sum_schemes import (
     block_sum,
     kahan_scheme,
@@ -31,6 +32,7 @@ class GpuReduc2D(MapReduce, Gpu_link_compile):
         i = self.i
         j = self.j
         red_formula = self.red_formula
+        formula = eliminate_common_subformulas(red_formula.formula)
         dtype = self.dtype
         dimin = red_formula.dimred
         dimout = red_formula.dim
@@ -177,7 +179,7 @@ class GpuReduc2D(MapReduce, Gpu_link_compile):
                             if(i<nx) {{ // we compute x1i only if needed
                                 {dtype}* yjrel = yj; // Loop on the columns of the current block.
                                 for(signed long int jrel = 0; (jrel<blockDim.x) && ((blockDim.x*blockIdx.y+jrel)< ny); jrel++, yjrel+={dimy}) {{
-                                    {red_formula.formula(fout,table)} // Call the function, which outputs results in fout
+                                    {formula(fout,table)} // Call the function, which outputs results in fout
                                     {sum_scheme.accumulate_result(acc, fout, jrelloc, hack=True)}
                                 }}
                             }}
@@ -1,47 +1,233 @@
 import os
 import pickle
+import re
+import time
+import weakref
+from contextlib import contextmanager
+from operator import attrgetter
+
+try:
+    import fcntl
+except ImportError:
+    # e.g. on Windows : processes sharing the build folder are not synchronized
+    fcntl = None
+
 import keopscore
 from keopscore.config import *
+from keopscore.utils.code_gen_utils import get_hash_name
 
-# global configuration parameter to be added for the lookup :
-# N.B we turn this into a function because the parameters need to be read dynamically.
-env_param = (
-    lambda: keopscore.config.get_cpp_flags()
-    + " auto_factorize="
-    + str(keopscore.auto_factorize)
+# names of the global flags of keopscore which are added for the lookup
+env_flags = (
+    "auto_factorize",
+    "simplify_formulas",
+    "use_cpu_simd",
+    "hoist_invariants",
+    "eliminate_common_subformulas",
+    "expand_inner_products",
 )
 
 
+# global configuration parameters to be added for the lookup :
+# N.B we turn this into a function because the parameters need to be read dynamically.
+# The tuple is built from attribute reads only, so that warm lookups (see Cache.fast_library
+# and Cache_partial.call_from) do no string work ; a change of the flags changes the key.
+def env_key():
+    return (keopscore.config.get_cpp_flags(),) + get_env_flags(keopscore)
+
+
+get_env_flags = attrgetter(*env_flags)
+
+
+# strings of the configuration parameters, for the string keys of the caches and of the
+# index files, memoized for each env_key (see env_param)
+env_strings = {}
+
+
+def env_param(key=None):
+    if key is None:
+        key = env_key()
+    try:
+        return env_strings[key]
+    except KeyError:
+        pass
+    env = key[0] + "".join(
+        f" {name}={value}" for name, value in zip(env_flags, key[1:])
+    )
+    env_strings[key] = env
+    return env
+
+
+# suffix of the index files of the caches, e.g. LoadKeOps_cpp_class_cache.pkl
+index_suffix = "_cache.pkl"
+
+# kernels are identified in the build folder by hash codes of 10 hexadecimal digits (see get_hash_name)
+tag_regex = re.compile("[0-9a-f]{10}")
+
+# index of the shared objects holding several kernels (see compile_bundle in pykeops) : a dict
+# file name of the shared object -> tags of its kernels, whose modules are symbolic links to it
+bundle_index_name = "bundles"
+
+
+@contextmanager
+def file_lock(lock_file):
+    # exclusive lock on lock_file, shared between all processes using the build folder
+    with open(lock_file, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def entry_tag(params):
+    # hash code of the kernel corresponding to an entry of an index : entries are either
+    # the outputs of get_keops_dll (tuples starting with the tag) or the params of LoadKeOps objects
+    if isinstance(params, tuple):
+        return params[0]
+    return getattr(params, "tag", None)
+
+
+class CacheIndex:
+    """
+    on-disk index of a cache : a dict str_id -> params, pickled in file <name>_cache.pkl of the build folder.
+        - the file is read again only when it has been modified, e.g. by another process,
+        - each new entry is written immediately : under a lock, the current content of the file
+          is merged with the new entry and the file is atomically replaced, so that concurrent
+          processes never overwrite each other's entries,
+        - the computation of a new entry is protected by a lock depending on its str_id (see key_lock),
+          so that processes requesting the same entry at the same time compute it only once.
+    """
+
+    # number of lock files used for the computation of entries ; str_ids are hashed into these
+    n_lock_slots = 64
+
+    def __init__(self, name, save_folder):
+        self.name = name
+        self.set_folder(save_folder)
+
+    def set_folder(self, save_folder):
+        self.save_folder = save_folder
+        self.file = os.path.join(save_folder, self.name + index_suffix)
+        self.entries = {}
+        self.stamp = None
+
+    def read(self):
+        try:
+            st = os.stat(self.file)
+        except FileNotFoundError:
+            self.entries, self.stamp = {}, None
+            return self.entries
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self.stamp:
+            try:
+                with open(self.file, "rb") as f:
+                    self.entries = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                # corrupted index file : it will be replaced at the next write
+                self.entries = {}
+            self.stamp = stamp
+        return self.entries
+
+    def write(self, entries):
+        # N.B. the caller must hold self.lock()
+        tmp_file = f"{self.file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(entries, f)
+        os.replace(tmp_file, self.file)
+        self.entries, self.stamp = entries, None
+
+    def lock(self):
+        return file_lock(self.file + ".lock")
+
+    def key_lock(self, str_id):
+        slot = int(get_hash_name(str_id), 16) % self.n_lock_slots
+        return file_lock(
+            os.path.join(self.save_folder, f"{self.name}_cache_{slot}.lock")
+        )
+
+    def get(self, str_id):
+        return self.read().get(str_id, None)
+
+    def add(self, str_id, params):
+        with self.lock():
+            entries = dict(self.read())
+            entries[str_id] = params
+            self.write(entries)
+        auto_evict_cache(self.save_folder, keep=(entry_tag(params),))
+
+    def get_or_compute(self, str_id, compute):
+        # returns the params stored for str_id, calling compute() to get them if needed.
+        # compute must return a pair (obj, params) ; obj is None if the entry was found.
+        params = self.get(str_id)
+        if params is None:
+            with self.key_lock(str_id):
+                params = self.get(str_id)
+                if params is None:
+                    obj, params = compute()
+                    self.add(str_id, params)
+                    return obj, params
+        touch_kernel(self.save_folder, entry_tag(params))
+        return None, params
+
+
+def touch_kernel(build_folder, tag):
+    # records the use of a kernel, by updating the modification time of its info file ;
+    # this is the time stamp used for the LRU eviction of kernels (see evict_cache)
+    if tag is None:
+        return
+    try:
+        os.utime(os.path.join(build_folder, tag + ".nfo"))
+    except OSError:
+        pass
+
+
 class Cache:
+    """
+    two-level lookup of the outputs of fun :
+        - self.fast_library is keyed by the tuple (args, env_key()) itself, when all arguments are
+          hashable ; for a warm call, the lookup then costs a dictionary access, without any string
+          concatenation or hashing of string representations,
+        - self.library is keyed by the string str_id built from the string representations of the
+          arguments, which is also the key of the on-disk index (see CacheIndex).
+    """
+
     def __init__(self, fun, use_cache_file=False, save_folder="."):
         self.fun = fun
         self.library = {}
+        self.fast_library = {}
         self.use_cache_file = use_cache_file
         if use_cache_file:
-            self.cache_file = os.path.join(save_folder, fun.__name__ + "_cache.pkl")
-            if os.path.isfile(self.cache_file) and os.path.getsize(self.cache_file) > 0:
-                f = open(self.cache_file, "rb")
-                self.library = pickle.load(f)
-                f.close()
-            import atexit
-
-            atexit.register(self.save_cache)
+            self.index = CacheIndex(fun.__name__, save_folder)
 
     def __call__(self, *args):
-        str_id = "".join(list(str(arg) for arg in args)) + str(env_param())
+        env = env_key()
+        key = (args, env)
+        try:
+            return self.fast_library[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # some arguments are not hashable : only the string key is used
+            key = None
+        str_id = "".join(list(str(arg) for arg in args)) + env_param(env)
         if not str_id in self.library:
-            self.library[str_id] = self.fun(*args)
+            if self.use_cache_file:
+                _, self.library[str_id] = self.index.get_or_compute(
+                    str_id, lambda: (None, self.fun(*args))
+                )
+            else:
+                self.library[str_id] = self.fun(*args)
+        if key is not None:
+            self.fast_library[key] = self.library[str_id]
         return self.library[str_id]
 
     def reset(self, new_save_folder=None):
         self.library = {}
-        if new_save_folder:
-            self.save_folder = new_save_folder
-
-    def save_cache(self):
-        f = open(self.cache_file, "wb")
-        pickle.dump(self.library, f)
-        f.close()
+        self.fast_library = {}
+        if self.use_cache_file:
+            self.index.set_folder(new_save_folder or self.index.save_folder)
 
 
 class Cache_partial:
@@ -53,57 +239,241 @@ class Cache_partial:
         - next calls :
             - retrieve obj from self.library[str_id]
     with use_cache_file==True:
-        - very first call :
+        - very first call (among all processes sharing the build folder) :
             - call to get obj
-            - save obj.params in self.library_params[str_id], saved in file at exit
+            - save obj.params in the index file (see CacheIndex)
             - save obj in self.library[str_id]
         - first call of session :
-            - retrieve obj.params from file
+            - retrieve obj.params from the index file
             - call with fast_init==True, to get obj
             - save obj in self.library[str_id]
         - next calls :
             - retrieve obj from self.library[str_id]
+    The arguments of the binders contain lists and dicts (aliases, optional flags), so that they
+    cannot be used directly as dictionary keys. Callers whose arguments are determined by the state
+    of an object, e.g. a Genred object, can use call_from instead, which looks up obj by identity
+    of this owner object before falling back to the string key.
     """
 
     def __init__(self, cls, use_cache_file=False, save_folder="."):
         self.cls = cls
         self.library = {}
+        self.owner_library = weakref.WeakKeyDictionary()
         self.use_cache_file = use_cache_file
         if self.use_cache_file:
-            self.cache_file = os.path.join(save_folder, cls.__name__ + "_cache.pkl")
-            if os.path.isfile(self.cache_file):
-                f = open(self.cache_file, "rb")
-                self.library_params = pickle.load(f)
-                f.close()
-            else:
-                self.library_params = {}
-            import atexit
-
-            atexit.register(self.save_cache)
+            self.index = CacheIndex(cls.__name__, save_folder)
 
     def __call__(self, *args):
-        str_id = "".join(list(str(arg) for arg in args)) + str(env_param)
+        str_id = "".join(list(str(arg) for arg in args)) + env_param()
         if not str_id in self.library:
             if self.use_cache_file:
-                if str_id in self.library_params:
-                    params = self.library_params[str_id]
-                    self.library[str_id] = self.cls(params, fast_init=True)
-                else:
+
+                def compute():
                     obj = self.cls(*args)
-                    self.library_params[str_id] = obj.params
-                    self.library[str_id] = obj
+                    return obj, obj.params
+
+                obj, params = self.index.get_or_compute(str_id, compute)
+                if obj is None:
+                    obj = self.cls(params, fast_init=True)
+                self.library[str_id] = obj
             else:
                 self.library[str_id] = self.cls(*args)
         return self.library[str_id]
 
+    def call_from(self, owner, key, *args):
+        """
+        same as self(*args), with a first lookup by identity of owner : key must be a hashable
+        tuple which, together with the state of owner, determines args. Entries are dropped
+        when owner is garbage collected. If owner is None, this is the same as self(*args).
+        """
+        if owner is None:
+            return self(*args)
+        env = env_key()
+        try:
+            return self.owner_library[owner][key, env]
+        except KeyError:
+            pass
+        obj = self(*args)
+        self.owner_library.setdefault(owner, {})[key, env] = obj
+        return obj
+
     def reset(self, new_save_folder=None):
         self.library = {}
+        self.owner_library = weakref.WeakKeyDictionary()
         if self.use_cache_file:
-            self.library_params = {}
-        if new_save_folder:
-            self.save_folder = new_save_folder
-
-    def save_cache(self):
-        f = open(self.cache_file, "wb")
-        pickle.dump(self.library_params, f)
-        f.close()
+            self.index.set_folder(new_save_folder or self.index.save_folder)
+
+
+def record_bundle(build_folder, bundle_file, tags):
+    # records in the bundle index the shared object bundle_file of the build folder, which holds
+    # the kernels of tags : it is removed by evict_cache together with the last of its links
+    index = CacheIndex(bundle_index_name, build_folder)
+    with index.lock():
+        entries = dict(index.read())
+        entries[bundle_file] = tuple(tags)
+        index.write(entries)
+
+
+def scan_cache(build_folder):
+    # lists the kernels stored in the build folder, i.e. the tags referenced by the index files,
+    # with their files, total size in bytes, time of last use and bundles (paths of the shared
+    # objects which hold them, see record_bundle), and the bundles with their size, modification
+    # time and links
+    index_names = [
+        f.name[: -len(index_suffix)]
+        for f in os.scandir(build_folder)
+        if f.name.endswith(index_suffix) and f.name != bundle_index_name + index_suffix
+    ]
+    tags = set()
+    for name in index_names:
+        for params in CacheIndex(name, build_folder).read().values():
+            tags.add(entry_tag(params))
+    bundles = {
+        os.path.join(build_folder, bundle_file): dict(
+            tags=bundle_tags, size=None, mtime=None, links=[]
+        )
+        for bundle_file, bundle_tags in CacheIndex(bundle_index_name, build_folder)
+        .read()
+        .items()
+    }
+    kernels = {}
+    n_files, size = 0, 0
+    for f in os.scandir(build_folder):
+        if f.is_dir(follow_symlinks=False):
+            continue
+        # N.B. modules of kernels compiled together are symbolic links to a common shared object
+        st = f.stat(follow_symlinks=False)
+        n_files += 1
+        size += st.st_size
+        if f.path in bundles:
+            bundles[f.path].update(size=st.st_size, mtime=st.st_mtime)
+            continue
+        if f.is_symlink():
+            target = os.path.join(build_folder, os.readlink(f.path))
+            if target in bundles:
+                bundles[target]["links"].append(f.path)
+        tag = next((t for t in tag_regex.findall(f.name) if t in tags), None)
+        if tag is None:
+            continue
+        kernel = kernels.setdefault(tag, dict(files=[], size=0, last_use=0, bundles=[]))
+        kernel["files"].append(f.path)
+        kernel["size"] += st.st_size
+        kernel["last_use"] = max(kernel["last_use"], st.st_mtime)
+    for tag, kernel in kernels.items():
+        # the info file is touched at each use of the kernel (see touch_kernel)
+        nfo_file = os.path.join(build_folder, tag + ".nfo")
+        if nfo_file in kernel["files"]:
+            kernel["last_use"] = os.path.getmtime(nfo_file)
+    for path, bundle in bundles.items():
+        for tag in bundle["tags"]:
+            if tag in kernels:
+                kernels[tag]["bundles"].append(path)
+    return index_names, kernels, bundles, n_files, size
+
+
+def cache_stats(build_folder=None):
+    """
+    Returns a dict with statistics about the cache of compiled kernels : build folder,
+    number of kernels, number of bundles (shared objects holding several kernels),
+    number of files and total size (in bytes) of the build folder, time stamps of
+    the least and most recent uses of kernels.
+    """
+    build_folder = build_folder or keopscore.config.get_build_folder()
+    _, kernels, bundles, n_files, size = scan_cache(build_folder)
+    last_uses = [kernel["last_use"] for kernel in kernels.values()]
+    return dict(
+        build_folder=build_folder,
+        kernels=len(kernels),
+        bundles=sum(bundle["size"] is not None for bundle in bundles.values()),
+        files=n_files,
+        size=size,
+        oldest_use=min(last_uses, default=None),
+        newest_use=max(last_uses, default=None),
+    )
+
+
+def evict_cache(max_size=None, max_age=None, build_folder=None, keep=()):
+    """
+    Removes from the build folder the kernels which have not been used for more than
+    max_age seconds, and then the least recently used kernels until the total size of
+    the folder is below max_size bytes. Kernels whose tags are in keep are never removed.
+    Entries are first removed from the index files, then the files of the kernels are deleted.
+    The shared object of a bundle is deleted with the last of its links ; bundles without
+    any link are deleted when they are older than max_age seconds.
+    Returns the list of tags of removed kernels.
+    """
+    build_folder = build_folder or keopscore.config.get_build_folder()
+    with file_lock(os.path.join(build_folder, "evict_cache.lock")):
+        index_names, kernels, bundles, n_files, size = scan_cache(build_folder)
+        evicted = []
+        removed_files = set()
+        now = time.time()
+        # bundles which are deleted : bundles without any link (e.g. left by an interrupted
+        # compilation) are deleted with max_age only, since their links may be in creation
+        freed = set(
+            path
+            for path, bundle in bundles.items()
+            if bundle["size"] is None
+            or (
+                not bundle["links"]
+                and max_age is not None
+                and now - bundle["mtime"] > max_age
+            )
+        )
+        size -= sum(bundles[path]["size"] or 0 for path in freed)
+        for tag, kernel in sorted(
+            kernels.items(), key=lambda item: item[1]["last_use"]
+        ):
+            if tag in keep:
+                continue
+            too_old = max_age is not None and now - kernel["last_use"] > max_age
+            too_big = max_size is not None and size > max_size
+            if not (too_old or too_big):
+                continue
+            evicted.append(tag)
+            size -= kernel["size"]
+            removed_files.update(kernel["files"])
+            for path in kernel["bundles"]:
+                links = bundles[path]["links"]
+                if path not in freed and links and removed_files.issuperset(links):
+                    freed.add(path)
+                    size -= bundles[path]["size"]
+        if freed:
+            index = CacheIndex(bundle_index_name, build_folder)
+            with index.lock():
+                entries = index.read()
+                kept = {
+                    bundle_file: bundle_tags
+                    for bundle_file, bundle_tags in entries.items()
+                    if os.path.join(build_folder, bundle_file) not in freed
+                }
+                if len(kept) != len(entries):
+                    index.write(kept)
+        if not evicted and not freed:
+            return evicted
+        for name in index_names:
+            index = CacheIndex(name, build_folder)
+            with index.lock():
+                entries = index.read()
+                kept = {
+                    str_id: params
+                    for str_id, params in entries.items()
+                    if entry_tag(params) not in evicted
+                }
+                if len(kept) != len(entries):
+                    index.write(kept)
+        for file in list(removed_files) + list(freed):
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+    return evicted
+
+
+def auto_evict_cache(build_folder, keep=()):
+    # eviction performed after each new kernel, according to keopscore.cache_max_size and keopscore.cache_max_age
+    if keopscore.cache_max_size is None and keopscore.cache_max_age is None:
+        return
+    evict_cache(
+        keopscore.cache_max_size, keopscore.cache_max_age, build_folder, keep=keep
+    )
@@ -10,8 +10,17 @@ from keopscore.config import *
 
 
 def math_function(
-    cpu_code, gpu_code=None, gpu_half2_code=None, gpu_float_code=None, void=False
+    cpu_code,
+    gpu_code=None,
+    gpu_half2_code=None,
+    gpu_float_code=None,
+    void=False,
+    cpu_simd=True,
 ):
+    # N.B. cpu_simd=False is used for functions which call the C math library (cos, pow...) :
+    # these calls are not vectorized by the compiler, so operations using them are evaluated
+    # one "j" index at a time in Cpu map-reduce schemes (see CpuReduc.get_j_loop_code).
+    # exp and log are computed by the inline functions of include/cpu_math.h instead.
     if gpu_code is None:
         gpu_code = cpu_code
     if gpu_half2_code is None:
@@ -57,6 +66,7 @@ def math_function(
         else:
             return c_variable(dtype, string)
 
+    call.cpu_simd = cpu_simd
     return call
 
 
@@ -73,21 +83,27 @@ int2h2 = lambda x: f"__float2half2_rn((float){x})"
 keops_mul = math_function(cpu_code=lambda x, y: f"({x}*{y})", gpu_half2_code="__hmul2")
 
 keops_abs = math_function(cpu_code="abs", gpu_half2_code="__habs2")
-keops_cos = math_function(cpu_code="cos", gpu_half2_code="h2cos")
-keops_sin = math_function(cpu_code="sin", gpu_half2_code="h2sin")
+keops_cos = math_function(cpu_code="cos", gpu_half2_code="h2cos", cpu_simd=False)
+keops_sin = math_function(cpu_code="sin", gpu_half2_code="h2sin", cpu_simd=False)
 keops_sinxdivx = math_function(
     cpu_code=lambda x: f"({x} ? sin({x})/{x} : 1.0f)",
     gpu_half2_code=lambda x: f"({h2one}*{h2eq0(x)}+h2sin({x})/({x}+{h2eq0(x)}))",
+    cpu_simd=False,
+)
+keops_acos = math_function(cpu_code="acos", gpu_half2_code="NA", cpu_simd=False)
+keops_asin = math_function(cpu_code="asin", gpu_half2_code="NA", cpu_simd=False)
+keops_atan = math_function(cpu_code="atan", gpu_half2_code="NA", cpu_simd=False)
+keops_atan2 = math_function(cpu_code="atan2", gpu_half2_code="NA", cpu_simd=False)
+keops_exp = math_function(
+    cpu_code="keops_cpu_exp", gpu_code="exp", gpu_half2_code="h2exp"
+)
+keops_floor = math_function(cpu_code="floor", gpu_half2_code="h2floor", cpu_simd=False)
+keops_log = math_function(
+    cpu_code="keops_cpu_log", gpu_code="log", gpu_half2_code="h2log"
 )
-keops_acos = math_function(cpu_code="acos", gpu_half2_code="NA")
-keops_asin = math_function(cpu_code="asin", gpu_half2_code="NA")
-keops_atan = math_function(cpu_code="atan", gpu_half2_code="NA")
-keops_atan2 = math_function(cpu_code="atan2", gpu_half2_code="NA")
-keops_exp = math_function(cpu_code="exp", gpu_half2_code="h2exp")
-keops_floor = math_function(cpu_code="floor", gpu_half2_code="h2floor")
-keops_log = math_function(cpu_code="log", gpu_half2_code="h2log")
 keops_xlogx = math_function(
-    cpu_code=lambda x: f"({x} ? {x} * log({x}) : 0.0f)",
+    cpu_code=lambda x: f"({x} ? {x} * keops_cpu_log({x}) : 0.0f)",
+    gpu_code=lambda x: f"({x} ? {x} * log({x}) : 0.0f)",
     gpu_half2_code=lambda x: f"(h2log({x}+{h2eq0(x)})*({x}))",
 )
 keops_fma = math_function(cpu_code="fma", gpu_half2_code="__hfma2")
@@ -95,9 +111,12 @@ keops_pow = math_function(
     cpu_code="pow",
     gpu_code="powf",
     gpu_half2_code=lambda x, y: f"(h2exp({int2h2(y)}*h2log({x})))",
+    cpu_simd=False,
 )
 keops_powf = math_function(
-    cpu_code="powf", gpu_half2_code=lambda x, y: f"h2exp({y}*h2log({x}))"
+    cpu_code="powf",
+    gpu_half2_code=lambda x, y: f"h2exp({y}*h2log({x}))",
+    cpu_simd=False,
 )
 keops_rcp = math_function(cpu_code=lambda x: f"(1.0f/({x}))", gpu_half2_code="h2rcp")
 
@@ -157,12 +176,14 @@ keops_clampint = math_function(
 keops_mod = math_function(
     cpu_code=lambda x, n, d: f"({x} - {n} * floor(({x} - {d})/{n}))",
     gpu_half2_code="NA",
+    cpu_simd=False,
 )
 keops_round = math_function(
     cpu_code=lambda x, d: (
         f"round({x})" if eval(d) == 0 else f"(round({x}*{10**eval(d)})/{10**eval(d)})"
     ),
     gpu_half2_code="NA",
+    cpu_simd=False,
 )
 keops_diffclampint = math_function(
     cpu_code=lambda x, a, b: f"(({x}<{a})? 0.0f : ( ({x}>{b})? 0.0f : 1.0f ))",
@@ -175,4 +196,5 @@ keops_sincos = math_function(
     cpu_code=lambda x, s, c: f"*({s})=sin({x}); *({c})=cos({x});",
     gpu_half2_code="NA",
     void=True,
+    cpu_simd=False,
 )
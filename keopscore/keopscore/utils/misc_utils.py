@@ -3,6 +3,7 @@
 #######################################################################
 
 import keopscore
+import os
 from os.path import join
 import re
 
@@ -59,6 +60,43 @@ def KeOps_OS_Run(command):
         os.system(command)
 
 
+def temporary_file_name(file_path):
+    # name of a temporary file next to file_path, private to the current process : files of
+    # the build folder are written to such temporary files and then renamed with os.replace,
+    # so that other processes, or later ones if the writing is interrupted, never see a
+    # partial file
+    return f"{file_path}.{os.getpid()}.tmp"
+
+
+def file_is_valid(file_path):
+    """
+    returns True if file_path (or the target of the symbolic link file_path) exists and is
+    not empty ; empty files, e.g. left by compilations interrupted with older versions of
+    KeOps, are treated as missing
+    """
+    try:
+        return os.path.getsize(file_path) > 0
+    except OSError:
+        return False
+
+
+def KeOps_Compile(get_command, output_file):
+    """
+    runs the compile command get_command(name), which writes the file name : the command
+    writes a temporary file, which is renamed to output_file once the compilation succeeded,
+    so that interrupted or concurrent compilations never leave a partial output_file
+    """
+    tmp_file = temporary_file_name(output_file)
+    try:
+        KeOps_OS_Run(get_command(tmp_file))
+        if not file_is_valid(tmp_file):
+            KeOps_Error(f"Compilation of {os.path.basename(output_file)} failed.")
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.lexists(tmp_file):
+            os.remove(tmp_file)
+
+
 def find_library_abspath(lib):
     """
     wrapper around ctypes find_library that returns the full path
@@ -107,13 +145,17 @@ def file_to_string(file_path):
     return out
 
 
-def string_to_file(string, file_path):
+def string_to_file(string, file_path, atomic=False):
     """
-    writes string to file
+    writes string to file ; if atomic is True, the file is replaced at once, so that other
+    processes never read a partial file
     """
-    f = open(file_path, "w", encoding="utf-8")
+    target = temporary_file_name(file_path) if atomic else file_path
+    f = open(target, "w", encoding="utf-8")
     out = f.write(string)
     f.close()
+    if atomic:
+        os.replace(target, file_path)
 
 
 def pack_header(filename, origin_folder, target_folder):
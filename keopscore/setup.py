@@ -68,6 +68,7 @@ setup(
             "config/libiomp5.dylib",
             "binders/nvrtc/keops_nvrtc.cpp",
             "binders/nvrtc/nvrtc_jit.cpp",
+            "include/cpu_math.h",
             "include/CudaSizes.h",
             "include/ranges_utils.h",
             "include/Ranges.h",
@@ -11,6 +11,7 @@ if os.getenv("PYKEOPS_VERBOSE") == "0":
 
 from . import config as pykeopsconfig
 from keopscore import show_cuda_status
+from keopscore.utils.misc_utils import file_is_valid
 
 keops_get_build_folder = pykeopsconfig.pykeops_base.get_build_folder
 from .config import pykeops_nvrtc_name
@@ -37,13 +38,74 @@ with open(
 
 default_device_id = 0  # default Gpu device number
 
+# if True, the first call to a torch Genred on the Cpu compiles its kernel together with the
+# kernels of its gradients with respect to all inputs which require grad, in a single
+# shared object (see pykeops.common.keops_io.LoadKeOps_cpp.compile_bundle)
+bundle_grads = False
+
+# number of threads of Cpu reductions ; None means torch.get_num_threads() for torch
+# tensors, and the default of OpenMP otherwise (see set_num_threads)
+num_threads = None
+
+# OpenMP schedule of the loops of Cpu reductions over output indices (see set_schedule)
+schedule = ("static", 0)
+
 if pykeopsconfig.pykeops_cuda.get_use_cuda():
-    if not os.path.exists(pykeops_nvrtc_name(type="target")):
+    if not file_is_valid(pykeops_nvrtc_name(type="target")):
         from .common.keops_io.LoadKeOps_nvrtc import compile_jit_binary
 
         compile_jit_binary()
 
 
+def set_num_threads(n=None):
+    r"""
+    Sets the number of threads used by the reductions computed on the Cpu.
+    The setting is forwarded to the compiled kernels at call time, without any recompilation,
+    and may be overridden for a single call with the ``num_threads`` argument of
+    :class:`Genred <pykeops.torch.Genred>` calls or :class:`LazyTensor` reductions.
+
+    Parameters:
+        n (int): number of threads ; None (default) means ``torch.get_num_threads()`` for torch
+            tensors, so that KeOps shares the intra-op threads of PyTorch, and the default
+            of OpenMP (e.g. the environment variable ``OMP_NUM_THREADS``) for NumPy arrays.
+
+    Returns:
+        None
+    """
+    global num_threads
+    if n is not None and n < 1:
+        raise ValueError("The number of threads should be a positive integer.")
+    num_threads = n
+
+
+def get_num_threads():
+    r"""
+    Returns the number of threads set by :func:`set_num_threads`, or None.
+    """
+    return num_threads
+
+
+def set_schedule(kind="static", chunk=0):
+    r"""
+    Sets the OpenMP schedule of the loops of Cpu reductions over their output indices.
+    The setting is forwarded to the compiled kernels at call time, without any recompilation,
+    and may be overridden for a single call with the ``schedule`` argument of
+    :class:`Genred <pykeops.torch.Genred>` calls or :class:`LazyTensor` reductions.
+    N.B.: block-sparse reductions always balance their work with their own dynamic schedule.
+
+    Parameters:
+        kind (str): ``"static"`` (default), ``"dynamic"``, ``"guided"`` or ``"auto"``.
+        chunk (int): chunk size of the schedule ; 0 (default) means the default of OpenMP.
+
+    Returns:
+        None
+    """
+    from .common.utils import openmp_schedule
+
+    global schedule
+    schedule = openmp_schedule((kind, chunk))
+
+
 def clean_pykeops(recompile_jit_binaries=True):
     r"""
     This function cleans the KeOps cache and recompiles the JIT binaries if necessary.
@@ -87,7 +149,7 @@ def set_build_folder(path=None):
     keops_binder = pykeops.common.keops_io.keops_binder
     for key in keops_binder:
         keops_binder[key].reset(new_save_folder=get_build_folder())
-    if pykeopsconfig.pykeops_cuda.get_use_cuda() and not os.path.exists(
+    if pykeopsconfig.pykeops_cuda.get_use_cuda() and not file_is_valid(
         pykeops.config.pykeops_nvrtc_name(type="target")
     ):
         pykeops.common.keops_io.LoadKeOps_nvrtc.compile_jit_binary()
@@ -97,6 +159,34 @@ def get_build_folder():
     return keops_get_build_folder()
 
 
+def cache_stats():
+    r"""
+    Returns statistics about the cache of compiled kernels.
+
+    Returns:
+        dict with keys ``build_folder``, ``kernels`` (number of cached kernels),
+        ``files`` and ``size`` (number of files and total size in bytes of the build folder),
+        ``oldest_use`` and ``newest_use`` (time stamps of the least and most recent uses of kernels).
+    """
+    return keopscore.cache_stats()
+
+
+def evict_cache(max_size=None, max_age=None):
+    r"""
+    Removes least recently used kernels from the cache of compiled kernels.
+    Automatic eviction after each compilation is set with the environment
+    variables ``KEOPS_CACHE_MAX_SIZE`` and ``KEOPS_CACHE_MAX_AGE``.
+
+    Parameters:
+        max_size (int): kernels are removed until the build folder is smaller than max_size bytes.
+        max_age (float): kernels not used for more than max_age seconds are removed.
+
+    Returns:
+        list of the hash codes of removed kernels.
+    """
+    return keopscore.evict_cache(max_size=max_size, max_age=max_age)
+
+
 if numpy_found:
     from .numpy.test_install import test_numpy_bindings
 
@@ -105,3 +195,6 @@ if torch_found:
 
 # next line is to ensure that cache file for formulas is loaded at import
 from .common import keops_io
+
+from .common.partials import merge_partials, finalize
+from .common.incremental import IncrementalReduction
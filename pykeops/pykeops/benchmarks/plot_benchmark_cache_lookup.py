@@ -0,0 +1,97 @@
+"""
+Cost of the cache lookups of warm KeOps calls
+===========================================================
+
+Each call of a :class:`Genred <pykeops.numpy.Genred>` object looks up the
+compiled module of its kernel in the cache of the KeOps binders. This lookup
+used to build a string key from the representations of all the arguments of the
+binder (formula, aliases, optional flags...). Calls of a Genred object now
+first look up the module by identity of the object, with a small tuple of tags as
+key, and only fall back on the string key for new objects. Similarly, the
+parsing of reduction formulas is cached by the formula strings themselves,
+before the hash of their representations.
+
+Let's compare the costs of these lookups for a warm cache.
+
+"""
+
+##############################################
+# Setup
+# ---------------------
+
+import timeit
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+import keopscore
+from keopscore.formulas.GetReduction import GetReduction
+from keopscore.utils.code_gen_utils import get_hash_name
+from pykeops.numpy import Genred
+from pykeops.common.keops_io import keops_binder
+
+number = 10000  # Number of calls for each timing
+
+##############################################
+# A simple Gaussian convolution, compiled and loaded once:
+
+D = 3
+gaussian_conv = Genred(
+    "Exp(-SqDist(x,y))*b", [f"x=Vi({D})", f"y=Vj({D})", "b=Vj(1)"], axis=1
+)
+x = np.random.randn(10, D)
+y = np.random.randn(10, D)
+b = np.random.randn(10, 1)
+gaussian_conv(x, y, b, backend="CPU")
+
+##############################################
+# Arguments of the corresponding call to the binder, as in ``Genred.__call__``:
+
+key = (0, 0, 0, False, -1, 3, "float64")
+binder_args = (
+    *key[:5],
+    gaussian_conv.formula,
+    gaussian_conv.aliases,
+    3,
+    "float64",
+    "numpy",
+    gaussian_conv.optional_flags,
+)
+binder = keops_binder["cpp"]
+
+
+def time_us(fun):
+    return 1e6 * timeit.timeit(fun, number=number) / number
+
+
+##############################################
+# Time per lookup, in microseconds:
+
+red_formula_string = "Sum_Reduction(Exp(-Sum((Var(0,3,0)-Var(1,3,1))**2))*Var(2,1,1),0)"
+GetReduction(red_formula_string)
+
+times = {
+    "binder, string key": time_us(lambda: binder(*binder_args)),
+    "binder, identity key": time_us(
+        lambda: binder.call_from(gaussian_conv, key, *binder_args)
+    ),
+    "formula, hashed key": time_us(
+        lambda: GetReduction.library[
+            get_hash_name(red_formula_string, [], keopscore.auto_factorize)
+        ]
+    ),
+    "formula, tuple key": time_us(lambda: GetReduction(red_formula_string)),
+}
+for label, t in times.items():
+    print(f"{label:>22}: {t:.2f} µs")
+
+##############################################
+# Display:
+
+plt.figure()
+plt.barh(list(times.keys()), list(times.values()))
+plt.xlabel("Time per lookup (µs)")
+plt.title("Cache lookups of warm KeOps calls")
+plt.grid(True, axis="x")
+plt.tight_layout()
+plt.show()
@@ -0,0 +1,77 @@
+"""
+Overhead of small KeOps calls
+===========================================================
+
+For small problems, the time spent in Python to prepare a KeOps call
+may exceed the run time of the kernel itself. Calls without ranges nor
+batch dimensions use a fast entry point of the compiled module, which stores
+the call signature of the kernel at load time and only receives the sizes
+and pointers of the arrays. Let's compare it with the generic entry point,
+on the Cpu.
+
+"""
+
+##############################################
+# Setup
+# ---------------------
+
+import timeit
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+from pykeops.numpy import Genred
+from pykeops.common.keops_io.LoadKeOps_cpp import LoadKeOps_cpp_class
+
+##############################################
+# Benchmark specifications:
+#
+
+D = 3  # Dimension of the points
+Ns = [1, 10, 30, 100, 300, 1000]  # Numbers of points
+number = 1000  # Number of calls for each timing
+
+##############################################
+# A simple Gaussian convolution:
+
+gaussian_conv = Genred(
+    "Exp(-SqDist(x,y))*b", [f"x=Vi({D})", f"y=Vj({D})", "b=Vj(1)"], axis=1
+)
+
+
+def time_calls(N, fast_call):
+    x = np.random.randn(N, D)
+    y = np.random.randn(N, D)
+    b = np.random.randn(N, 1)
+    gaussian_conv(x, y, b, backend="CPU")  # compilation and loading of the module
+    LoadKeOps_cpp_class.fast_call = fast_call
+    try:
+        t = timeit.timeit(lambda: gaussian_conv(x, y, b, backend="CPU"), number=number)
+    finally:
+        LoadKeOps_cpp_class.fast_call = True
+    return t / number
+
+
+##############################################
+# Time per call, in microseconds:
+
+times = {}
+for fast_call in (False, True):
+    label = "fast entry point" if fast_call else "generic entry point"
+    times[label] = [1e6 * time_calls(N, fast_call) for N in Ns]
+    print(f"{label:>20}: " + ", ".join(f"{t:.1f}" for t in times[label]))
+
+##############################################
+# Display:
+
+plt.figure()
+for label, t in times.items():
+    plt.plot(Ns, t, "o-", label=label)
+plt.xscale("log")
+plt.xlabel("Number of points M = N")
+plt.ylabel("Time per call (µs)")
+plt.title("Overhead of small KeOps calls on the Cpu")
+plt.legend()
+plt.grid(True, which="both")
+plt.tight_layout()
+plt.show()
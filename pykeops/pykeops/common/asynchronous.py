@@ -0,0 +1,74 @@
+"""
+Asynchronous calls of Genred operations and LazyTensor reductions.
+
+The calls are submitted to a pool of worker threads, and return concurrent.futures.Future
+objects, so that the calling thread may prepare other inputs, read files or launch other
+reductions while the kernels run. The Cpu kernels release the GIL while they run (see the
+pybind11 launcher of LoadKeOps_cpp), so that several reductions and the Python code of the
+calling thread actually run in parallel.
+
+Usage :
+    >>> future = op.call_async(x, y, backend="CPU")  # returns immediately
+    >>> ...                                           # other work
+    >>> res = future.result()
+or, in an asyncio coroutine :
+    >>> res = await op.acall(x, y, backend="CPU")
+    >>> res = await asyncio.wrap_future(lazy_tensor.sum(1, asynchronous=True))
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# pool of worker threads shared by all the asynchronous calls, created at the first call
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    r"""
+    Returns the pool of worker threads used by default for the asynchronous calls.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count(), thread_name_prefix="pykeops"
+            )
+        return _executor
+
+
+def call_async(function, *args, executor=None, **kwargs):
+    r"""
+    Runs function(*args, **kwargs) in a worker thread.
+
+    Args:
+        function (callable): e.g. a Genred operation.
+        *args, **kwargs: the arguments of the call.
+
+    Keyword Args:
+        executor (concurrent.futures.Executor, default None): the executor of the call ; None
+            means the pool of worker threads of pykeops (see :func:`get_executor`).
+
+    Returns:
+        concurrent.futures.Future: the future output of the call.
+    """
+    if executor is None:
+        executor = get_executor()
+    return executor.submit(function, *args, **kwargs)
+
+
+def then(future, function):
+    r"""
+    Returns a future of function(future.result()), computed when the future is done.
+    """
+    new_future = Future()
+
+    def done(future):
+        try:
+            new_future.set_result(function(future.result()))
+        except BaseException as e:
+            new_future.set_exception(e)
+
+    future.add_done_callback(done)
+    return new_future
@@ -17,10 +17,17 @@ class SetBackend:
     dev = OrderedDict([("CPU", 0), ("GPU", 1)])
     grid = OrderedDict([("1D", 0), ("2D", 1)])
     memtype = OrderedDict([("host", 0), ("device", 1)])
+    # for Cpu computations, the "grid" tag selects the map-reduce scheme
+    cpu_scheme = OrderedDict([("direct", 0), ("tiled", 1)])
+
+    # in "auto" mode, the tiled Cpu scheme is used as soon as the number
+    # of (i,j) pairs to process is larger than this threshold
+    cpu_tiled_min_size = 2**20
 
     possible_options_list = [
         "auto",
         "CPU",
+        "CPU_tiled",
         "GPU",
         "GPU_1D",
         "GPU_1D_device",
@@ -30,16 +37,17 @@ class SetBackend:
         "GPU_2D_host",
     ]
 
-    def define_tag_backend(self, backend, variables):
+    def define_tag_backend(self, backend, variables, sizes=None):
         """
         Try to make a good guess for the backend...  available methods are: (host means Cpu, device means Gpu)
            CPU : computations performed with the host from host arrays
+           CPU_tiled : computations performed with the host from host arrays, using the cache-blocked scheme
            GPU_1D_device : computations performed on the device from device arrays, using the 1D scheme
            GPU_2D_device : computations performed on the device from device arrays, using the 2D scheme
            GPU_1D_host : computations performed on the device from host arrays, using the 1D scheme
            GPU_2D_host : computations performed on the device from host data, using the 2D scheme
 
-        :param backend (str), variables (tuple)
+        :param backend (str), variables (tuple), sizes (optional tuple (nx, ny), used to choose the Cpu scheme in auto mode)
 
         :return (tagCPUGPU, tag1D2D, tagHostDevice)
         """
@@ -52,9 +60,10 @@ class SetBackend:
 
         # auto : infer everything
         if backend == "auto":
+            tagCPUGPU = int(pykeops.config.gpu_available)
             return (
-                int(pykeops.config.gpu_available),
-                self._find_grid(),
+                tagCPUGPU,
+                self._find_grid() if tagCPUGPU else self._find_cpu_scheme(sizes),
                 self._find_mem(variables),
             )
 
@@ -65,7 +74,13 @@ class SetBackend:
                 self._find_grid(),
                 self._find_mem(variables),
             )
-        elif len(split_backend) == 2:  # GPU_1D or GPU_2D
+        elif len(split_backend) == 2:  # GPU_1D, GPU_2D or CPU_tiled
+            if split_backend[0] == "CPU":
+                return (
+                    self.dev[split_backend[0]],
+                    self.cpu_scheme[split_backend[1]],
+                    self._find_mem(variables),
+                )
             return (
                 self.dev[split_backend[0]],
                 self.grid[split_backend[1]],
@@ -128,13 +143,21 @@ class SetBackend:
     def _find_grid():
         return 0
 
+    @classmethod
+    def _find_cpu_scheme(cls, sizes):
+        if sizes is not None:
+            nx, ny = sizes
+            if nx * ny >= cls.cpu_tiled_min_size:
+                return cls.cpu_scheme["tiled"]
+        return cls.cpu_scheme["direct"]
+
 
-def get_tag_backend(backend, variables, str=False):
+def get_tag_backend(backend, variables, str=False, sizes=None):
     """
     entry point to get the correct backend
     """
     res = SetBackend()
     if not str:
-        return res.define_tag_backend(backend, variables)
+        return res.define_tag_backend(backend, variables, sizes)
     else:
         return res.define_backend(backend, variables)
@@ -0,0 +1,200 @@
+"""
+Reductions updated incrementally when points are appended to or removed from the reduction axis.
+
+The partial result of the reduction (see pykeops.common.partials) is kept, together with
+the variables indexed along the reduction axis. Appended points are reduced on their own,
+and merged with the current partial result. Removed points are reduced on their own as well :
+
+    - Sum : their partial sum is subtracted ;
+    - Max_SumShiftExp(Weight) (LogSumExp, SumSoftMaxWeight) : their sum, shifted by the current
+      maximum, is subtracted ; the rows for which the removed points carried most of the sum,
+      so that the subtraction loses precision, are recomputed ;
+    - Min, Max, and the variants of ArgMin, ArgMax and ArgKMin : the rows whose extremal values
+      were given by removed points are recomputed, and the indices of the other rows are shifted.
+
+Updates cost a reduction over the output points and the appended or removed points only,
+plus the recomputation of a few rows over all the points if needed.
+"""
+
+import numpy as np
+
+from pykeops.common.parse_type import indexed_positions
+from pykeops.common.partials import (
+    compute_partial,
+    finalize,
+    get_binding,
+    merge_partials,
+    partial_routine,
+)
+from pykeops.common.utils import get_tools
+
+
+class IncrementalReduction:
+    r"""
+    Reduction of a Genred operation over points which may be appended to or removed
+    from the reduction axis, without computing the whole reduction again.
+
+    Example:
+        >>> op = Genred("-SqDist(x,y)", ["x = Vi(3)", "y = Vj(3)"], reduction_op="LogSumExp", axis=1)
+        >>> lse = IncrementalReduction(op, x, y, backend="CPU")
+        >>> lse.append(y_new)   # reduces y_new only
+        >>> lse.remove([0, 5])  # removes y[0] and y[5]
+        >>> lse.result()        # same as op(x, y_updated)
+
+    Args:
+        routine (Genred): the NumPy or PyTorch Genred operation, whose reduction is
+            **Sum**, **Min**, **Max**, **LogSumExp**, **SumSoftMaxWeight** or a variant of
+            the **ArgMin**, **ArgMax** and **ArgKMin** reductions.
+        *args: the initial arguments of the operation, without batch dimensions.
+        **kwargs: keyword arguments of the calls to the operation, e.g. backend.
+    """
+
+    # rows of LogSumExp reductions for which the removed points carried more than
+    # 1 - cancellation_tol of the sum are recomputed
+    cancellation_tol = 1e-3
+
+    def __init__(self, routine, *args, **kwargs):
+        if len(args) != routine.nargs:
+            raise ValueError(
+                f"Invalid number of arguments in call to Genred (should be {routine.nargs} and got {len(args)})."
+            )
+        if kwargs.get("ranges") is not None or any(len(arg.shape) > 2 for arg in args):
+            raise ValueError(
+                "Incremental reductions do not support batch dimensions or ranges."
+            )
+        self.routine = routine
+        self.partial_routine = partial_routine(routine)
+        self.kwargs = kwargs
+        self.args = list(args)
+        self.positions = indexed_positions(routine.aliases, routine.axis)
+        self.out_positions = indexed_positions(routine.aliases, 1 - routine.axis)
+        if not self.positions:
+            raise ValueError(
+                "Incremental reduction : there is no variable indexed along the reduction axis."
+            )
+        self.tools = get_tools(get_binding(args[self.positions[0]]))
+        self.state = self.compute(self.points)
+
+    @property
+    def points(self):
+        r"""
+        Current values of the variables indexed along the reduction axis, in the order of the aliases.
+        """
+        return tuple(self.args[pos] for pos in self.positions)
+
+    @property
+    def size(self):
+        r"""
+        Current number of points of the reduction axis.
+        """
+        return self.args[self.positions[0]].shape[0]
+
+    def compute(self, points, start=0, rows=None):
+        # partial result of the reduction over the given points, for all the output
+        # points or for the given rows only
+        args = list(self.args)
+        for pos, arr in zip(self.positions, points):
+            args[pos] = arr
+        if rows is not None:
+            for pos in self.out_positions:
+                args[pos] = args[pos][rows]
+        return compute_partial(self.partial_routine, args, start, **self.kwargs)
+
+    def append(self, *points):
+        r"""
+        Appends points to the reduction axis, with a reduction over these points only.
+
+        Args:
+            *points: arrays of the new values of the variables indexed along the reduction axis,
+                in the order of the aliases (see :attr:`points`).
+
+        Returns:
+            self.
+        """
+        if len(points) != len(self.positions):
+            raise ValueError(
+                f"Incremental reduction : {len(self.positions)} arrays should be appended, got {len(points)}."
+            )
+        new = self.compute(points, start=self.size)
+        self.state = merge_partials(self.routine, self.state, new)
+        for pos, arr in zip(self.positions, points):
+            self.args[pos] = self.tools.cat((self.args[pos], arr), 0)
+        return self
+
+    def remove(self, indices):
+        r"""
+        Removes points from the reduction axis ; the indices of the next points are shifted.
+
+        Args:
+            indices: indices of the points to remove.
+
+        Returns:
+            self.
+        """
+        tools = self.tools
+        if tools.is_tensor(indices):
+            indices = tools.numpy(indices)
+        indices = np.unique(np.asarray(indices, dtype="int64"))
+        n = self.size
+        if len(indices) == 0:
+            return self
+        if indices[0] < 0 or indices[-1] >= n:
+            raise ValueError("Incremental reduction : indices out of range.")
+        if len(indices) == n:
+            raise ValueError(
+                "Incremental reduction : all the points cannot be removed."
+            )
+        keep = np.ones(n, dtype=bool)
+        keep[indices] = False
+        device = tools.device(self.args[self.positions[0]])
+        removed = [p[tools.array(indices, "int64", device)] for p in self.points]
+
+        op, state = self.partial_routine.reduction_op, self.state
+        rows = None
+        if op == "Sum":
+            state = state - self.compute(removed)
+        elif op in ("Max_SumShiftExp", "Max_SumShiftExpWeight"):
+            rem = self.compute(removed)
+            m, s = state[..., :1], state[..., 1:]
+            # N.B. the current maximum m is kept as the shift of the sums
+            s_rem = tools.where(
+                rem[..., :1] == -np.inf, 0, tools.exp(rem[..., :1] - m) * rem[..., 1:]
+            )
+            state = tools.cat((m, s - s_rem), -1)
+            rows = ~(s[..., 0] - s_rem[..., 0] > self.cancellation_tol * s[..., 0])
+        elif op in ("Min", "Max"):
+            rows = (self.compute(removed) == state).any(-1)
+        elif op in ("Min_ArgMin", "Max_ArgMax", "KMin_ArgKMin"):
+            is_removed = tools.array((~keep).astype("int64"), "int64", device)
+            new_index = tools.array(np.cumsum(keep) - 1, "int64", device)
+            # N.B. with fewer points than K, the last indices of KMin_ArgKMin may be
+            # invalid (-1) : they are not shifted
+            inds = state[1]
+            valid = inds >= 0
+            inds_valid = tools.where(valid, inds, 0)
+            rows = (is_removed[inds_valid] > 0) & valid
+            rows = rows.reshape(rows.shape[0], -1).any(-1)
+            state = (state[0], tools.where(valid, new_index[inds_valid], inds))
+
+        for pos in self.positions:
+            self.args[pos] = self.args[pos][
+                tools.array(np.flatnonzero(keep), "int64", device)
+            ]
+        if rows is not None:
+            rows = np.flatnonzero(tools.numpy(rows))
+            if len(rows):
+                rows = tools.array(rows, "int64", device)
+                new = self.compute(self.points, rows=rows)
+                if isinstance(state, tuple):
+                    state[0][rows], state[1][rows] = new
+                else:
+                    state[rows] = new
+        self.state = state
+        return self
+
+    def result(self):
+        r"""
+        Returns the output of the reduction over the current points, as returned by the
+        Genred operation.
+        """
+        return finalize(self.routine, self.state)
@@ -97,6 +97,9 @@ class LoadKeOps:
 
         if tagCPUGPU == 0:
             map_reduce_id = "CpuReduc"
+            if tag1D2D == 1 and not use_ranges:
+                # cache-blocked scheme ; not available with ranges
+                map_reduce_id += "_tiled"
         else:
             map_reduce_id = "GpuReduc"
             map_reduce_id += "1D" if tag1D2D == 0 else "2D"
@@ -160,6 +163,7 @@ class LoadKeOps:
         self.params.dimsp = dimsp
 
         self.params.tagCPUGPU = tagCPUGPU
+        self.params.use_ranges = use_ranges
         self.params.device_id_request = device_id_request
         self.params.nargs = nargs
 
@@ -191,20 +195,24 @@ class LoadKeOps:
                 args, self.params.aliases_old, self.params.axis, ranges, nx, ny
             )
 
+        # N.B. the pointers and shapes of the call are local variables, passed to call_keops,
+        # and not attributes : the instance is shared by all the calls of the kernel, which
+        # may run concurrently in several threads (the Cpu kernels release the GIL)
+
         # get ranges argument
         if not ranges:
-            self.ranges_ptr_new = self.empty_ranges_new
+            ranges_ptr = self.empty_ranges_new
         else:
             ranges_shapes = self.tools.array(
                 [r.shape[0] for r in ranges], dtype="int64", device="cpu"
             )
             ranges = [*ranges, ranges_shapes]
-            self.ranges_ptr_new = tuple([self.tools.get_pointer(r) for r in ranges])
+            ranges_ptr = tuple([self.tools.get_pointer(r) for r in ranges])
 
-        self.args_ptr_new = tuple([self.tools.get_pointer(arg) for arg in args])
+        args_ptr = tuple([self.tools.get_pointer(arg) for arg in args])
 
         # get all shapes of arguments
-        self.argshapes_new = tuple([arg.shape for arg in args])
+        argshapes = tuple([arg.shape for arg in args])
 
         # initialize output array
 
@@ -226,14 +234,18 @@ class LoadKeOps:
 
         if out is None:
             out = self.tools.empty(shapeout, dtype=args[0].dtype, device=device_args)
-        self.out_ptr = self.tools.get_pointer(out)
-
-        self.outshape = out.shape
-
         if self.params.tagZero:
             out[:] = 0
         else:
-            self.call_keops(nx, ny)
+            self.call_keops(
+                nx,
+                ny,
+                ranges_ptr,
+                out.shape,
+                self.tools.get_pointer(out),
+                args_ptr,
+                argshapes,
+            )
 
         if self.params.dtype == "float16":
             from pykeops.torch.half2_convert import postprocess_half2
@@ -245,7 +257,7 @@ class LoadKeOps:
     genred_pytorch = genred
     genred_numpy = genred
 
-    def call_keops(self):
+    def call_keops(self, nx, ny, ranges_ptr, outshape, out_ptr, args_ptr, argshapes):
         pass
 
     def import_module(self):
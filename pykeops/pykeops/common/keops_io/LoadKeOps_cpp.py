@@ -1,51 +1,146 @@
 import os
 import sysconfig
+from concurrent.futures import ThreadPoolExecutor
 
 import pykeops.config as pykeopsconfig
 
 get_build_folder = pykeopsconfig.pykeops_base.get_build_folder
 
-from keopscore.utils.Cache import Cache_partial
+from keopscore.utils.Cache import Cache_partial, record_bundle
 from pykeops.common.keops_io.LoadKeOps import LoadKeOps
-from pykeops.common.utils import pyKeOps_Message
-from keopscore.utils.misc_utils import KeOps_OS_Run
+from pykeops.common.utils import pyKeOps_Message, get_openmp_settings
+from keopscore.utils.code_gen_utils import get_hash_name
+from keopscore.utils.misc_utils import (
+    KeOps_Compile,
+    KeOps_OS_Run,
+    file_is_valid,
+    string_to_file,
+    temporary_file_name,
+)
 from pykeops.config import pykeops_cpp_name, python_includes
 
 
 class LoadKeOps_cpp_class(LoadKeOps):
+    # use the fast entry point of modules for calls without ranges (see genred)
+    fast_call = True
+
     def __init__(self, *args, fast_init=False):
         super().__init__(*args, fast_init=fast_init)
 
-    def init_phase1(self):
-        srcname = pykeops_cpp_name(tag=self.params.tag, extension=".cpp")
-
-        dllname = pykeops_cpp_name(
+    def get_dllname(self):
+        return pykeops_cpp_name(
             tag=self.params.tag, extension=sysconfig.get_config_var("EXT_SUFFIX")
         )
 
-        if not os.path.exists(dllname):
-            f = open(srcname, "w")
-            f.write(self.get_pybind11_code())
-            f.close()
-            compile_command = f"{pykeopsconfig.pykeops_base.get_cxx_compiler()} {pykeopsconfig.pykeops_base.get_cpp_flags()} {python_includes} {srcname} -o {dllname}"
+    def write_pybind11_code(self):
+        srcname = pykeops_cpp_name(tag=self.params.tag, extension=".cpp")
+        string_to_file(self.get_pybind11_code(), srcname, atomic=True)
+        return srcname
+
+    def init_phase1(self):
+        dllname = self.get_dllname()
+
+        # N.B. the module is compiled to a temporary file which is renamed once complete,
+        # so that interrupted or concurrent compilations never leave a partial module ;
+        # empty files, left by older versions, are compiled again.
+        if not file_is_valid(dllname):
+            srcname = self.write_pybind11_code()
             pyKeOps_Message(
                 "Compiling pykeops cpp " + self.params.tag + " module ... ",
                 flush=True,
                 end="",
             )
-            KeOps_OS_Run(compile_command)
+            KeOps_Compile(
+                lambda target: f"{pykeopsconfig.pykeops_base.get_cxx_compiler()} {pykeopsconfig.pykeops_base.get_cpp_flags()} {python_includes} {srcname} -o {target}",
+                dllname,
+            )
             pyKeOps_Message("OK", use_tag=False, flush=True)
 
     def init_phase2(self):
         import importlib
 
-        mylib = importlib.import_module(
-            os.path.basename(pykeops_cpp_name(tag=self.params.tag))
-        )
+        module_name = os.path.basename(pykeops_cpp_name(tag=self.params.tag))
+        try:
+            mylib = importlib.import_module(module_name)
+        except ImportError:
+            # the module is unloadable (e.g. truncated, or a dangling link to a removed
+            # bundle) : it is removed and compiled again
+            dllname = self.get_dllname()
+            if not os.path.lexists(dllname):
+                raise
+            pyKeOps_Message(
+                f"Module {os.path.basename(dllname)} cannot be loaded, it is compiled again."
+            )
+            os.remove(dllname)
+            self.init_phase1()
+            importlib.invalidate_caches()
+            mylib = importlib.import_module(module_name)
 
         self.launch_keops_cpu = mylib.launch_pykeops_cpu
 
-    def call_keops(self, nx, ny):
+        # modules compiled by older versions do not take the thread settings as arguments
+        self.openmp_settings = getattr(mylib, "openmp_settings", False)
+
+        # modules compiled by older versions have no fast entry point
+        self.launch_keops_cpu_fast = getattr(mylib, "launch_pykeops_cpu_fast", None)
+        if self.launch_keops_cpu_fast is not None:
+            mylib.set_signature(
+                self.params.dimy,
+                self.params.tagI,
+                self.params.tagZero,
+                self.params.use_half,
+                self.params.dimred,
+                self.params.use_chunk_mode,
+                self.params.indsi,
+                self.params.indsj,
+                self.params.indsp,
+                self.params.dim,
+                self.params.dimsx,
+                self.params.dimsy,
+                self.params.dimsp,
+            )
+
+    def genred(self, device_args, ranges, nx, ny, nbatchdims, out, *args):
+        # fast path for calls without ranges nor batch dimensions : the call signature
+        # is stored in the module, and only sizes and pointers are passed.
+        if (
+            not self.fast_call
+            or self.launch_keops_cpu_fast is None
+            or ranges
+            or nbatchdims
+            or self.params.use_half
+            or getattr(self.params, "use_ranges", True)
+        ):
+            return super().genred(device_args, ranges, nx, ny, nbatchdims, out, *args)
+
+        get_pointer = self.tools.get_pointer
+        if out is None:
+            M = nx if self.params.tagI == 0 else ny
+            out = self.tools.empty(
+                (M, self.params.dim), dtype=args[0].dtype, device=device_args
+            )
+        if self.params.tagZero:
+            out[:] = 0
+        else:
+            self.launch_keops_cpu_fast(
+                nx,
+                ny,
+                get_pointer(out),
+                tuple(get_pointer(arg) for arg in args),
+                *self.get_openmp_settings(),
+            )
+        return out
+
+    genred_pytorch = genred
+    genred_numpy = genred
+
+    def get_openmp_settings(self):
+        # number of threads and schedule of the call, forwarded to the kernel (see set_num_threads)
+        if not self.openmp_settings:
+            return ()
+        return get_openmp_settings(self.params.lang)
+
+    def call_keops(self, nx, ny, ranges_ptr, outshape, out_ptr, args_ptr, argshapes):
         self.launch_keops_cpu(
             self.params.dimy,
             nx,
@@ -62,11 +157,12 @@ class LoadKeOps_cpp_class(LoadKeOps):
             self.params.dimsx,
             self.params.dimsy,
             self.params.dimsp,
-            self.ranges_ptr_new,
-            self.outshape,
-            self.out_ptr,
-            self.args_ptr_new,
-            self.argshapes_new,
+            ranges_ptr,
+            outshape,
+            out_ptr,
+            args_ptr,
+            argshapes,
+            *self.get_openmp_settings(),
         )
 
     def get_pybind11_code(self):
@@ -74,8 +170,39 @@ class LoadKeOps_cpp_class(LoadKeOps):
 #include "{self.params.source_name}"
 
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
 namespace py = pybind11;
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+// Thread settings of a call (number of threads and schedule of the loops declared with
+// "schedule(runtime)"), applied to the calling thread for the duration of the call.
+// N.B. zero values keep the current settings of OpenMP.
+struct OpenMP_Settings_{self.params.tag} {{
+#ifdef _OPENMP
+    int num_threads, chunk;
+    omp_sched_t kind;
+
+    OpenMP_Settings_{self.params.tag}(int new_num_threads, int new_kind, int new_chunk) {{
+        num_threads = omp_get_max_threads();
+        omp_get_schedule(&kind, &chunk);
+        if (new_num_threads > 0)
+            omp_set_num_threads(new_num_threads);
+        if (new_kind > 0)
+            omp_set_schedule((omp_sched_t) new_kind, new_chunk);
+    }}
+
+    ~OpenMP_Settings_{self.params.tag}() {{
+        omp_set_num_threads(num_threads);
+        omp_set_schedule(kind, chunk);
+    }}
+#else
+    OpenMP_Settings_{self.params.tag}(int new_num_threads, int new_kind, int new_chunk) {{}}
+#endif
+}};
+
 template < typename TYPE >
 int launch_pykeops_{self.params.tag}_cpu(signed long int dimY, signed long int nx, signed long int ny,
                                          int tagI, int tagZero, int use_half,
@@ -88,7 +215,8 @@ int launch_pykeops_{self.params.tag}_cpu(signed long int dimY, signed long int n
                                          py::tuple py_shapeout,
                                          long out_void,
                                          py::tuple py_arg,
-                                         py::tuple py_argshape){{
+                                         py::tuple py_argshape,
+                                         int num_threads, int schedule_kind, int schedule_chunk){{
 
     /*------------------------------------*/
     /*         Cast input args            */
@@ -151,7 +279,11 @@ int launch_pykeops_{self.params.tag}_cpu(signed long int dimY, signed long int n
         argshape_v[i] = tmp_v;
     }}
 
+    OpenMP_Settings_{self.params.tag} settings(num_threads, schedule_kind, schedule_chunk);
 
+    // N.B. the arguments are copied above : the GIL is released while the kernel runs, so
+    // that concurrent calls from other Python threads run in the meantime
+    py::gil_scoped_release release;
     return launch_keops_cpu_{self.params.tag}< TYPE >(dimY,
                                                       nx,
                                                       ny,
@@ -175,13 +307,166 @@ int launch_pykeops_{self.params.tag}_cpu(signed long int dimY, signed long int n
 
 }}
 
+/*------------------------------------*/
+/*     Fast path for small calls      */
+/*------------------------------------*/
+
+// static call signature of the kernel, set once at load time by set_signature.
+static struct {{
+    bool is_set = false;
+    signed long int dimY, dimred, dimout;
+    int tagI, tagZero, use_half, use_chunk_mode;
+    std::vector< int > indsi, indsj, indsp;
+    std::vector< signed long int > dimsx, dimsy, dimsp;
+}} signature_{self.params.tag};
+
+void set_signature_{self.params.tag}(signed long int dimY, int tagI, int tagZero, int use_half,
+                                     signed long int dimred, int use_chunk_mode,
+                                     std::vector< int > indsi, std::vector< int > indsj, std::vector< int > indsp,
+                                     signed long int dimout,
+                                     std::vector< signed long int > dimsx, std::vector< signed long int > dimsy, std::vector< signed long int > dimsp) {{
+    // N.B. the signature only depends on the tag : it is not set again if the module is loaded
+    // by another instance, since calls of the fast entry point may be running without the GIL
+    auto &s = signature_{self.params.tag};
+    if (s.is_set)
+        return;
+    s.dimY = dimY; s.dimred = dimred; s.dimout = dimout;
+    s.tagI = tagI; s.tagZero = tagZero; s.use_half = use_half; s.use_chunk_mode = use_chunk_mode;
+    s.indsi = indsi; s.indsj = indsj; s.indsp = indsp;
+    s.dimsx = dimsx; s.dimsy = dimsy; s.dimsp = dimsp;
+    s.is_set = true;
+}}
+
+// entry point for calls without ranges nor batch dimensions : only sizes and pointers are passed.
+template < typename TYPE >
+int launch_pykeops_{self.params.tag}_cpu_fast(signed long int nx, signed long int ny, long out_void, py::tuple py_arg,
+                                              int num_threads, int schedule_kind, int schedule_chunk) {{
+
+    TYPE *out = (TYPE*) out_void;
+
+    std::vector< TYPE* > arg_v(py_arg.size());
+    for (int i = 0; i < py_arg.size(); i++)
+        arg_v[i] = (TYPE*) py::cast< long >(py_arg[i]);
+    TYPE **arg = (TYPE**) arg_v.data();
+
+    auto &s = signature_{self.params.tag};
+    OpenMP_Settings_{self.params.tag} settings(num_threads, schedule_kind, schedule_chunk);
+
+    // N.B. the arguments are copied above : the GIL is released while the kernel runs
+    py::gil_scoped_release release;
+    return launch_keops_cpu_{self.params.tag}< TYPE >(s.dimY, nx, ny, s.tagI, s.tagZero, s.use_half,
+                                                      s.dimred, s.use_chunk_mode,
+                                                      s.indsi, s.indsj, s.indsp,
+                                                      s.dimout,
+                                                      s.dimsx, s.dimsy, s.dimsp,
+                                                      nullptr, {{}}, out, arg, {{}});
+}}
+
 PYBIND11_MODULE(pykeops_cpp_{self.params.tag}, m) {{
     m.doc() = "pyKeOps: KeOps for pytorch through pybind11 (pytorch flavour).";
     m.def("launch_pykeops_cpu", &launch_pykeops_{self.params.tag}_cpu < {cpp_dtype[self.params.dtype]} >, "Entry point to keops.");
+    m.def("set_signature", &set_signature_{self.params.tag}, "Set the static call signature used by launch_pykeops_cpu_fast.");
+    m.def("launch_pykeops_cpu_fast", &launch_pykeops_{self.params.tag}_cpu_fast < {cpp_dtype[self.params.dtype]} >, "Entry point to keops for calls without ranges.");
+    m.attr("openmp_settings") = true;
 }}                     
             """
 
 
+class LoadKeOps_cpp_source(LoadKeOps_cpp_class):
+    """
+    generates the code of a kernel and of its pybind11 module, without compiling
+    nor loading them ; used by compile_bundle.
+    """
+
+    def init_phase1(self):
+        pass
+
+    def init_phase2(self):
+        pass
+
+
+def compile_bundle(calls, num_workers=None):
+    r"""
+    Compiles the kernels corresponding to a list of calls to the cpp binder (tuples of
+    binder arguments) into a single shared object : the pybind11 modules of the kernels
+    are compiled in parallel as separate translation units, and linked together.
+    The file of each module, e.g. pykeops_cpp_7b9a611f7e.so, is then a symbolic link to
+    the shared object, which is loaded only once by the runtime.
+    Kernels which are already compiled are skipped. The shared object is recorded in the
+    index of bundles of the build folder, and is deleted by evict_cache with its last link.
+
+    Returns:
+        list of the tags of the kernels.
+    """
+    kernels = {}
+    for args in calls:
+        kernel = LoadKeOps_cpp_source(*args, fast_init=False)
+        kernels.setdefault(kernel.params.tag, kernel)
+    todo = [
+        kernel for kernel in kernels.values() if not file_is_valid(kernel.get_dllname())
+    ]
+    if len(todo) == 0:
+        return list(kernels)
+
+    compiler = pykeopsconfig.pykeops_base.get_cxx_compiler()
+    flags = pykeopsconfig.pykeops_base.get_cpp_flags()
+    bundle_tag = "bundle_" + get_hash_name(
+        *sorted(kernel.params.tag for kernel in todo)
+    )
+    bundle_name = pykeops_cpp_name(
+        tag=bundle_tag, extension=sysconfig.get_config_var("EXT_SUFFIX")
+    )
+    srcnames = [kernel.write_pybind11_code() for kernel in todo]
+    # N.B. the object files are private to the current process, and the shared object is
+    # renamed once complete, in case another process compiles the same kernels
+    objnames = [
+        temporary_file_name(os.path.splitext(srcname)[0] + ".o") for srcname in srcnames
+    ]
+
+    pyKeOps_Message(
+        f"Compiling pykeops cpp {bundle_tag} module ({len(todo)} kernels) ... ",
+        flush=True,
+        end="",
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            list(
+                executor.map(
+                    KeOps_OS_Run,
+                    [
+                        f"{compiler} {flags} {python_includes} -c {srcname} -o {objname}"
+                        for srcname, objname in zip(srcnames, objnames)
+                    ],
+                )
+            )
+        KeOps_Compile(
+            lambda target: f"{compiler} {flags} {' '.join(objnames)} -o {target}",
+            bundle_name,
+        )
+    finally:
+        for objname in objnames:
+            if os.path.exists(objname):
+                os.remove(objname)
+
+    # the bundle is recorded with the tags of its kernels, so that it is removed from the
+    # build folder with the last of its links (see evict_cache)
+    record_bundle(
+        os.path.dirname(bundle_name),
+        os.path.basename(bundle_name),
+        [kernel.params.tag for kernel in todo],
+    )
+
+    # the link is created atomically, in case another process compiles the same kernel
+    for kernel in todo:
+        dllname = kernel.get_dllname()
+        tmp_name = temporary_file_name(dllname)
+        os.symlink(os.path.basename(bundle_name), tmp_name)
+        os.replace(tmp_name, dllname)
+    pyKeOps_Message("OK", use_tag=False, flush=True)
+
+    return list(kernels)
+
+
 LoadKeOps_cpp = Cache_partial(
     LoadKeOps_cpp_class, use_cache_file=True, save_folder=get_build_folder()
 )
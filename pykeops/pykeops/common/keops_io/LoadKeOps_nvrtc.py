@@ -6,7 +6,7 @@ from keopscore.binders.nvrtc.Gpu_link_compile import Gpu_link_compile
 from keopscore.utils.Cache import Cache_partial
 from pykeops.common.keops_io.LoadKeOps import LoadKeOps
 from pykeops.common.utils import pyKeOps_Message
-from keopscore.utils.misc_utils import KeOps_OS_Run
+from keopscore.utils.misc_utils import KeOps_Compile
 
 get_build_folder = pykeops.config.pykeops_base.get_build_folder
 
@@ -44,7 +44,7 @@ class LoadKeOps_nvrtc_class(LoadKeOps):
                 self.params.low_level_code_file,
             )
 
-    def call_keops(self, nx, ny):
+    def call_keops(self, nx, ny, ranges_ptr, outshape, out_ptr, args_ptr, argshapes):
         self.launch_keops(
             self.params.tagHostDevice,
             self.params.dimy,
@@ -64,11 +64,11 @@ class LoadKeOps_nvrtc_class(LoadKeOps):
             self.params.dimsx,
             self.params.dimsy,
             self.params.dimsp,
-            self.ranges_ptr_new,
-            self.outshape,
-            self.out_ptr,
-            self.args_ptr_new,
-            self.argshapes_new,
+            ranges_ptr,
+            outshape,
+            out_ptr,
+            args_ptr,
+            argshapes,
         )
 
     def import_module(self):
@@ -79,13 +79,15 @@ def compile_jit_binary():
     """
     This function compile the main .so entry point to keops_nvrt binder...
     """
-    compile_command = Gpu_link_compile.get_compile_command(
-        extra_flags=pykeops.config.python_includes,
-        sourcename=pykeops.config.pykeops_nvrtc_name(type="src"),
-        dllname=pykeops.config.pykeops_nvrtc_name(type="target"),
-    )
     pyKeOps_Message("Compiling nvrtc binder for python ... ", flush=True, end="")
-    KeOps_OS_Run(compile_command)
+    KeOps_Compile(
+        lambda dllname: Gpu_link_compile.get_compile_command(
+            extra_flags=pykeops.config.python_includes,
+            sourcename=pykeops.config.pykeops_nvrtc_name(type="src"),
+            dllname=dllname,
+        ),
+        pykeops.config.pykeops_nvrtc_name(type="target"),
+    )
     pyKeOps_Message("OK", use_tag=False, flush=True)
 
 
@@ -6,6 +6,8 @@ import math
 import numpy as np
 
 from keopscore.utils.misc_utils import KeOps_Error
+from pykeops.common.asynchronous import then
+from pykeops.common.incremental import IncrementalReduction
 from pykeops.common.utils import check_broadcasting
 
 
@@ -686,6 +688,10 @@ class GenericLazyTensor:
             If **None** (default), we simply use a **dense Kernel matrix**
             as we loop over all indices
             :math:`i\in[0,M)` and :math:`j\in[0,N)`.
+          num_threads (int, None by default): Number of threads of the computation on the Cpu
+            (see :func:`pykeops.set_num_threads`).
+          schedule (string or tuple, None by default): OpenMP schedule of the computation on the Cpu
+            (see :func:`pykeops.set_schedule`).
           dtype_acc (string, default ``"auto"``): type for accumulator of reduction, before casting to dtype.
             It improves the accuracy of results in case of large sized data, but is slower.
             Default value "auto" will set this option to the value of dtype. The supported values are:
@@ -711,8 +717,20 @@ class GenericLazyTensor:
           out (2d NumPy array or PyTorch Tensor, None by default): The output numerical array, for in-place computation.
             If provided, the output array should all have the same ``dtype``, be **contiguous** and be stored on
             the **same device** as the arguments. Moreover it should have the correct shape for the output.
+          incremental (bool, False by default): If **True**, returns an
+            :class:`IncrementalReduction <pykeops.common.incremental.IncrementalReduction>` object,
+            whose points along the reduction axis may be appended or removed without computing the whole
+            reduction again, and whose method ``result()`` returns the output of the reduction.
+            Block-sparse ranges are not supported.
+          asynchronous (bool, False by default): If **True**, the reduction runs in a worker thread
+            and a :class:`concurrent.futures.Future` of its output is returned immediately (see
+            :meth:`Genred.call_async <pykeops.torch.Genred.call_async>`) ; in an asyncio coroutine,
+            the output is awaited with ``await asyncio.wrap_future(future)``.
         """
 
+        incremental = kwargs.pop("incremental", False)
+        asynchronous = kwargs.pop("asynchronous", False)
+
         if is_complex is None:
             if other is None:
                 is_complex = self.is_complex
@@ -749,6 +767,15 @@ class GenericLazyTensor:
                 # the user requires a sum reduction over the opposite index (or any index if V is a parameter):
                 # for example sum_i V_j k(x_i,y_j) = V_j sum_i k(x_i,y_j), so we will use KeOps reduction for the kernel
                 # k(x_i,y_j) only, then multiply the result with V.
+                if incremental:
+                    raise ValueError(
+                        "Incremental reductions do not support the factorization of Sum(F*V) with a high dimensional variable V."
+                    )
+                if asynchronous:
+                    return then(
+                        self.rec_multVar_highdim[0].sum(axis=axis, asynchronous=True),
+                        lambda out: out * self.rec_multVar_highdim[1].variables[0],
+                    )
                 return (
                     self.rec_multVar_highdim[0].sum(axis=axis)
                     * self.rec_multVar_highdim[1].variables[0]
@@ -771,6 +798,20 @@ class GenericLazyTensor:
                 **kwargs_init,
                 rec_multVar_highdim=res.rec_multVar_highdim,
             )
+        if incremental or asynchronous:
+            if len(res.symbolic_variables) != 0 or res._dtype is None or is_complex:
+                raise ValueError(
+                    f"{'Incremental' if incremental else 'Asynchronous'} reductions require a real LazyTensor without symbolic variables."
+                )
+            kwargs_call = dict(res.kwargs)
+            if res.ranges is not None:
+                kwargs_call.setdefault("ranges", res.ranges)
+            if res.backend is not None:
+                kwargs_call.setdefault("backend", res.backend)
+            if incremental:
+                # N.B. IncrementalReduction raises an error if ranges are given
+                return IncrementalReduction(res.callfun, *res.variables, **kwargs_call)
+            return res.callfun.call_async(*res.variables, **kwargs_call)
         if call and len(res.symbolic_variables) == 0 and res._dtype is not None:
             return res()
         else:
@@ -793,6 +834,17 @@ class GenericLazyTensor:
             with respect to **var** and solve the equation ``self(var) = other``
             with respect to **var**.
           alpha (float, default=1e-10): Non-negative **ridge regularization** parameter.
+          x0 (array or tensor, default None): Initial guess of the solution (warm start).
+          maxiter (int, default None): Maximum number of iterations of the conjugate gradient solver.
+          rtol (float, default None): Relative tolerance of the solver, with respect to the norms of
+            the columns of **other** ; the columns of **other** are solved together.
+          eps (float, default=1e-6): Absolute tolerance of the solver, on the root mean square of the residuals.
+          return_info (bool, default False): If **True**, also returns a dict of convergence diagnostics
+            (see :class:`KernelSolve <pykeops.torch.KernelSolve>`).
+          precond (string or function, default None): Preconditioner of the solver, ``"nystrom"``
+            or ``"pivoted_cholesky"``, or the ``"precond"`` entry of the diagnostics of a previous solve.
+          precond_rank (int, default None): Maximal rank of the low-rank approximation of the preconditioner.
+          precond_tol (float, default None): Tolerance of the ``"pivoted_cholesky"`` preconditioner.
           call (bool): If **True** and if no other symbolic variable than
             **var** is contained in **self**, **solve** will return a tensor
             solution of our linear system. Otherwise **solve** will return
@@ -2504,7 +2556,29 @@ class GenericLazyTensor:
             >>> v = torch.rand(2000, 2)
             >>> print( (K @ v).shape )
             ... torch.Size([1000, 2])
-        """
+
+        ``v`` may also be a list or tuple of right-hand sides with the same batch and reduction
+        dimensions, e.g. the columns of a block of vectors in a block conjugate gradient.
+        They are stacked along their last dimension and processed by a single reduction,
+        so that the entries of ``K`` are computed once for all of them. The result is the list
+        of the products ``K @ v[k]``:
+
+        Example:
+            >>> v1, v2 = torch.rand(2000), torch.rand(2000, 3)
+            >>> Kv1, Kv2 = K @ [v1, v2]
+            >>> print( Kv1.shape, Kv2.shape )
+            ... torch.Size([1000]) torch.Size([1000, 3])
+        """
+
+        if isinstance(v, (list, tuple)):
+            vs = [self.tools.view(w, (-1, 1)) if len(w.shape) == 1 else w for w in v]
+            widths = [w.shape[-1] for w in vs]
+            Kv = self.__matmul__(self.tools.cat(vs, len(vs[0].shape) - 1), **kwargs)
+            Kvs = self.tools.split(Kv, widths, len(Kv.shape) - 1)
+            return [
+                self.tools.view(Kw, -1) if len(w.shape) == 1 else Kw
+                for Kw, w in zip(Kvs, v)
+            ]
 
         if self._shape[-1] != 1:
             raise ValueError(
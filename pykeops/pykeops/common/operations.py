@@ -1,5 +1,12 @@
 import numpy as np
 
+from keopscore.formulas.GetReduction import GetReduction
+from keopscore.formulas.maths.Add import Add_Impl
+from keopscore.formulas.maths.Minus import Minus_Impl
+from keopscore.formulas.maths.Mult import Mult_Impl
+from keopscore.formulas.maths.Subtract import Subtract_Impl
+from keopscore.formulas.variables.Var import Var
+from pykeops.common.parse_type import get_type
 from pykeops.common.utils import get_tools
 
 
@@ -87,30 +94,134 @@ def postprocess(out, binding, reduction_op, nout, opt_arg, dtype):
     return out
 
 
-def ConjugateGradientSolver(binding, linop, b, eps=1e-6):
-    # Conjugate gradient algorithm to solve linear system of the form
+def is_column_separable(formula, aliases, varinvpos):
+    # True if the reduced formula is of the form sum_k g_k * v, where v is the variable
+    # of index varinvpos and the g_k are scalar formulas which do not depend on v :
+    # the linear operator then acts separately, and in the same way, on all the columns of v.
+    # N.B. this is a sufficient condition only ; other formulas are assumed to mix columns.
+    def separable(f):
+        if isinstance(f, Var):
+            return f.ind == varinvpos
+        if isinstance(f, (Add_Impl, Subtract_Impl)):
+            return all(separable(g) for g in f.children)
+        if isinstance(f, Minus_Impl):
+            return separable(f.children[0])
+        if isinstance(f, Mult_Impl):
+            for g, h in (f.children, f.children[::-1]):
+                if g.dim == 1 and all(v.ind != varinvpos for v in g.Vars()):
+                    if separable(h):
+                        return True
+        return False
+
+    # aliases are given to keopscore in the Var(ind,dim,cat) form, as in LoadKeOps
+    aliases_var = []
+    for k, alias in enumerate(aliases):
+        name, cat, dim, pos = get_type(alias, position_in_list=k)
+        if name is not None:
+            aliases_var.append(f"{name}=Var({pos},{dim},{cat})")
+    return separable(GetReduction(formula, aliases_var).children[0])
+
+
+def ConjugateGradientSolver(
+    binding,
+    linop,
+    b,
+    eps=1e-6,
+    x0=None,
+    maxiter=None,
+    rtol=None,
+    return_info=False,
+    separable=False,
+    precond=None,
+):
+    # Conjugate gradient algorithm to solve linear systems of the form
     # Ma=b where linop is a linear operation corresponding
-    # to a symmetric and positive definite matrix
+    # to a symmetric and positive definite matrix.
+    # If separable is True, linop must act separately on the columns of b (last axis,
+    # for each batch index), which are then solved together : each iteration requires a
+    # single call to linop for all columns, while the step sizes and convergence tests are
+    # computed column by column. Converged columns are frozen. Otherwise, b is handled as
+    # a single vector (and a single "column" below).
+    # A column has converged when the mean of its squared residuals is below eps**2,
+    # or when the norm of its residual is below rtol times the norm of its right-hand side.
+    # The solver stops when all columns have converged or after maxiter iterations.
+    # x0 is an optional initial guess (warm start), with the same shape as b.
+    # If return_info is True, a dict of convergence diagnostics is also returned.
+    # precond is an optional function applying the inverse of a symmetric positive definite
+    # preconditioner to arrays with the shape of b (preconditioned conjugate gradient).
     tools = get_tools(binding)
-    delta = tools.size(b) * eps**2
-    a = 0
-    r = tools.copy(b)
-    nr2 = (r**2).sum()
-    if nr2 < delta:
-        return 0 * r
-    p = tools.copy(r)
+    if len(b.shape) == 1:
+        x0 = None if x0 is None else tools.view(x0, (-1, 1))
+        res = ConjugateGradientSolver(
+            binding,
+            linop,
+            tools.view(b, (-1, 1)),
+            eps,
+            x0,
+            maxiter,
+            rtol,
+            True,
+            separable,
+            (
+                None
+                if precond is None
+                else lambda r: tools.view(precond(tools.view(r, (-1,))), (-1, 1))
+            ),
+        )
+        a, info = tools.view(res[0], (-1,)), res[1]
+        return (a, info) if return_info else a
+
+    if separable:
+
+        def dot(x, y):
+            # scalar products of the columns of x and y, keeping the batch and column dimensions
+            return (x * y).sum(-2)[..., None, :]
+
+        tol2 = b.shape[-2] * eps**2
+    else:
+
+        def dot(x, y):
+            return (x * y).sum()
+
+        tol2 = tools.size(b) * eps**2
+    if rtol is not None:
+        # element-wise maximum of the absolute and relative tolerances
+        rtol2 = rtol**2 * dot(b, b)
+        tol2 = tol2 + (rtol2 > tol2) * (rtol2 - tol2)
+    if x0 is None:
+        a = 0 * b
+        r = tools.copy(b)
+    else:
+        a = tools.copy(x0)
+        r = b - linop(a)
+    if precond is None:
+        precond = lambda r: r
+    nr2 = dot(r, r)
+    active = nr2 >= tol2
+    z = precond(r)
+    rz = dot(r, z)
+    p = z * active
     k = 0
-    while True:
+    while active.any() and (maxiter is None or k < maxiter):
         Mp = linop(p)
-        alp = nr2 / (p * Mp).sum()
+        # N.B. inactive columns get null step sizes ; adding ~active avoids divisions by zero
+        alp = active * rz / (dot(p, Mp) + ~active)
         a += alp * p
         r -= alp * Mp
-        nr2new = (r**2).sum()
-        if nr2new < delta:
-            break
-        p = r + (nr2new / nr2) * p
-        nr2 = nr2new
+        nr2 = dot(r, r)
+        active = nr2 >= tol2
+        z = precond(r)
+        rznew = dot(r, z)
+        p = (z + (rznew / (rz + ~active)) * p) * active
+        rz = rznew
         k += 1
+    if return_info:
+        info = dict(
+            iterations=k,
+            converged=not bool(active.any()),
+            residuals=(nr2[..., 0, :] if separable else nr2) ** 0.5,
+        )
+        return a, info
     return a
 
 
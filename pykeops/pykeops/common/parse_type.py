@@ -238,3 +238,13 @@ def parse_dtype_acc(dtype_acc, dtype):
         )
 
     return dtype_acc
+
+
+def indexed_positions(aliases, cat):
+    # positions of the arguments of category cat, i.e. indexed by i (cat=0) or j (cat=1)
+    positions = []
+    for k, alias in enumerate(aliases):
+        _, cat_, _, pos = get_type(alias, position_in_list=k)
+        if cat_ == cat:
+            positions.append(pos)
+    return positions
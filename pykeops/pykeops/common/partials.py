@@ -0,0 +1,206 @@
+"""
+Partial results of reductions, which can be merged and finalized.
+
+A Genred operation called with return_partial=True returns the accumulator of its reduction
+before finalization, e.g. the pair (m, s) of the Max_SumShiftExp reduction used by LogSumExp,
+instead of m + log(s). Partial results of the same operation over disjoint sets of points of
+the reduction axis are merged as in the ReducePair methods of the keopscore reductions :
+
+    - Sum : partial sums are added ; Zero : partial results are zeros.
+    - Min, Max : elementwise extrema.
+    - Max_SumShiftExp(Weight) (LogSumExp, SumSoftMaxWeight) : pairs (m,s) are merged with
+      a shift by the maximum, (M, s exp(m-M) + s' exp(m'-M)) with M = max(m,m').
+    - Min_ArgMin, Max_ArgMax : the first extremal value is kept, with its index.
+    - KMin_ArgKMin : the K smallest values of the two lists are kept, with their indices.
+
+Reductions which do not return the values of the extrema (ArgMin, ArgMax, KMin, ArgKMin)
+are computed with the reduction which returns both values and indices, and the final
+output is extracted by finalize. Partial results are :
+
+    - arrays of shape (..., n, dim) with the raw outputs of the kernels, for the Sum, Zero, Min,
+      Max and Max_SumShiftExp(Weight) reductions ;
+    - pairs (values, indices) of arrays of shape (..., n, D) for Min_ArgMin and Max_ArgMax,
+      and (..., n, K, D) for KMin_ArgKMin, where the indices are int64 integers, so that they
+      remain exact even if the number of points exceeds the precision of the floats.
+"""
+
+import numpy as np
+
+from pykeops.common.operations import postprocess
+from pykeops.common.utils import get_tools
+
+# reduction computed for the partial results, if different from the internal reduction of Genred
+partial_reduction_ops = {
+    "ArgMin": "Min_ArgMin",
+    "MinArgMin": "Min_ArgMin",
+    "ArgMax": "Max_ArgMax",
+    "MaxArgMax": "Max_ArgMax",
+    "KMin": "KMin_ArgKMin",
+    "ArgKMin": "KMin_ArgKMin",
+    "KMinArgKMin": "KMin_ArgKMin",
+}
+
+# reductions whose partial results are pairs (values, indices)
+indexed_reduction_ops = ("Min_ArgMin", "Max_ArgMax", "KMin_ArgKMin")
+
+
+def get_binding(x):
+    # binding of the array x, or of the first array of the pair x
+    x = x[0] if isinstance(x, tuple) else x
+    return "numpy" if isinstance(x, np.ndarray) else "torch"
+
+
+def merge_sum(tools, acc, out):
+    return acc + out
+
+
+def merge_zero(tools, acc, out):
+    return acc
+
+
+def merge_min(tools, acc, out):
+    return tools.minimum(acc, out)
+
+
+def merge_max(tools, acc, out):
+    return tools.maximum(acc, out)
+
+
+def merge_logsumexp(tools, acc, out):
+    # out[...,0] is the maximum m, and out[...,1:] the sum s of the exponentials shifted by m
+    m_acc, m_out = acc[..., :1], out[..., :1]
+    m = tools.maximum(m_acc, m_out)
+    # N.B. if all the values of a partial result are -inf, m = -inf and s is not defined :
+    # the partial result does not contribute to the sum
+    m_ = tools.where(m == -np.inf, 0, m)
+    s_acc = tools.where(m_acc == -np.inf, 0, tools.exp(m_acc - m_) * acc[..., 1:])
+    s_out = tools.where(m_out == -np.inf, 0, tools.exp(m_out - m_) * out[..., 1:])
+    return tools.cat((m, s_acc + s_out), -1)
+
+
+def merge_argmin(tools, acc, out):
+    # strict comparison : in case of equality, the first index is kept
+    better = out[0] < acc[0]
+    return tools.where(better, out[0], acc[0]), tools.where(better, out[1], acc[1])
+
+
+def merge_argmax(tools, acc, out):
+    better = out[0] > acc[0]
+    return tools.where(better, out[0], acc[0]), tools.where(better, out[1], acc[1])
+
+
+def merge_kmin(tools, acc, out):
+    # values and indices of shape (..., K, D) ; the stable sort keeps the first indices
+    # in case of equality, since acc comes first
+    vals = tools.cat((acc[0], out[0]), -2)
+    inds = tools.cat((acc[1], out[1]), -2)
+    K = acc[0].shape[-2]
+    order = tools.argsort(vals, -2)[..., :K, :]
+    return (
+        tools.take_along_axis(vals, order, -2),
+        tools.take_along_axis(inds, order, -2),
+    )
+
+
+merge_ops = {
+    "Sum": merge_sum,
+    "Zero": merge_zero,
+    "Min": merge_min,
+    "Max": merge_max,
+    "Max_SumShiftExp": merge_logsumexp,
+    "Max_SumShiftExpWeight": merge_logsumexp,
+    "Min_ArgMin": merge_argmin,
+    "Max_ArgMax": merge_argmax,
+    "KMin_ArgKMin": merge_kmin,
+}
+
+
+def partial_reduction_op(routine):
+    # reduction computed for the partial results of the Genred routine
+    reduction_op_internal = routine.formula.split("_Reduction(", 1)[0]
+    op = partial_reduction_ops.get(routine.reduction_op, reduction_op_internal)
+    if op not in merge_ops:
+        raise ValueError(
+            f"Reduction {routine.reduction_op} does not support partial results."
+        )
+    return op
+
+
+def partial_routine(routine):
+    # copy of the Genred routine which computes its partial results
+    op = partial_reduction_op(routine)
+    new_routine = type(routine).__new__(type(routine))
+    new_routine.__dict__.update(vars(routine))
+    # N.B. postprocess does not modify the outputs of the internal reductions, except
+    # for Min_ArgMin, Max_ArgMax and KMin_ArgKMin which return pairs (values, indices)
+    new_routine.reduction_op = op
+    new_routine.formula = (
+        op + "_Reduction(" + routine.formula.split("_Reduction(", 1)[1]
+    )
+    return new_routine
+
+
+def compute_partial(routine, args, start=0, **kwargs):
+    # partial result of a routine built by partial_routine ; indices are shifted by start,
+    # the position of the first point of args along the reduction axis
+    out = routine(*args, **kwargs)
+    if routine.reduction_op in indexed_reduction_ops:
+        vals, inds = out
+        nbatchdims = max(len(arg.shape) for arg in args) - 2
+        if routine.reduction_op == "KMin_ArgKMin" and len(vals.shape) < nbatchdims + 3:
+            # N.B. postprocess squeezes the last dimension if the formula is scalar
+            vals, inds = vals[..., None], inds[..., None]
+        out = (vals, inds + start) if start else (vals, inds)
+    return out
+
+
+def merge_partials(routine, a, b, offset=0):
+    r"""
+    Merges two partial results of a Genred operation, computed with ``return_partial=True``
+    over disjoint sets of points of the reduction axis.
+
+    Args:
+        routine (Genred): the NumPy or PyTorch Genred operation.
+        a, b: the partial results, as returned by the operation called with ``return_partial=True``.
+        offset (int, default 0): shift added to the indices of b, e.g. the position along
+            the reduction axis of the first point of the arrays used to compute b, for
+            the ArgMin, ArgMax and ArgKMin reductions and their variants.
+
+    Returns:
+        The partial result of the operation over the union of the two sets of points.
+        In case of equal values, the indices of a are kept.
+    """
+    op = partial_reduction_op(routine)
+    if offset and op in indexed_reduction_ops:
+        b = (b[0], b[1] + offset)
+    return merge_ops[op](get_tools(get_binding(a)), a, b)
+
+
+def finalize(routine, state):
+    r"""
+    Finalizes a partial result of a Genred operation, computed with ``return_partial=True``
+    and possibly merged with :func:`merge_partials`.
+
+    Args:
+        routine (Genred): the NumPy or PyTorch Genred operation.
+        state: the partial result.
+
+    Returns:
+        The output of the reduction, as returned by the operation called without ``return_partial``.
+    """
+    reduction_op = routine.reduction_op
+    op = partial_reduction_op(routine)
+    if op in ("Min_ArgMin", "Max_ArgMax"):
+        return state[1] if reduction_op in ("ArgMin", "ArgMax") else state
+    if op == "KMin_ArgKMin":
+        if state[0].shape[-1] == 1:
+            state = (state[0].squeeze(-1), state[1].squeeze(-1))
+        return {"KMin": state[0], "ArgKMin": state[1]}.get(reduction_op, state)
+    return postprocess(
+        state,
+        get_binding(state),
+        reduction_op,
+        state.shape[-2],
+        routine.opt_arg,
+        state.dtype,
+    )
@@ -0,0 +1,199 @@
+"""
+Low-rank preconditioners for the conjugate gradient solver of KernelSolve.
+
+The kernel matrix K of a KernelSolve operation is approximated by a low-rank matrix
+L L^T, and the system (alpha Id + K) a = b is preconditioned by the inverse of
+(alpha Id + U Lambda U^T), where U Lambda U^T is the eigendecomposition of L L^T,
+as in the randomized Nystrom preconditioner of Frangella, Tropp and Udell (2021).
+The factor L is obtained either from the columns of K at randomly chosen landmark
+points ("nystrom"), or by a greedy pivoted Cholesky decomposition of K ("pivoted_cholesky").
+
+The entries of K are never formed as a whole : columns of K are computed by KeOps
+reductions restricted to a single point along the reduction axis, and the diagonal
+of K by a block-sparse reduction with one block per point. These reductions are
+provided by the caller as a function kernel_product(var, cols=None, diagonal=False),
+which returns K[:, cols] @ var, or diag(K) @ var if diagonal is True.
+
+If the linear operator acts separately on the columns of the unknown (see
+pykeops.common.operations.is_column_separable), the preconditioner is built for the
+scalar kernel and applied to each column ; otherwise, it is built for the whole matrix
+acting on the flattened unknown.
+"""
+
+import numpy as np
+
+from pykeops.common.parse_type import get_type
+from pykeops.common.utils import get_tools
+
+
+def reduction_args(args, aliases, axis, varinvpos, var, cols=None):
+    # arguments of the reduction K[:, cols] @ var of a KernelSolve operation : the variable
+    # of index varinvpos is replaced by var, and the other variables indexed along the
+    # reduction axis are restricted to the points cols
+    newargs = list(args)
+    for k, alias in enumerate(aliases):
+        _, cat, _, pos = get_type(alias, position_in_list=k)
+        if pos == varinvpos:
+            newargs[pos] = var
+        elif cols is not None and cat == axis:
+            newargs[pos] = args[pos][cols]
+    return tuple(newargs)
+
+
+def diagonal_ranges(tools, n, device):
+    # ranges of a block-sparse reduction with one block per point, reduced over this point only
+    # (see the documentation of Genred for the format of ranges)
+    blocks = np.stack((np.arange(n), np.arange(1, n + 1)), axis=1)
+    ranges = tools.array(blocks, "int64", device)
+    slices = tools.array(np.arange(1, n + 1), "int64", device)
+    return ranges, slices, ranges, ranges, slices, ranges
+
+
+def onehot(tools, ref, n, dimvar, c):
+    # array of shape (n, dimvar), equal to 1 in column c and 0 elsewhere
+    e = tools.zeros((n, dimvar), tools.dtype(ref), tools.device(ref))
+    e[:, c] = 1
+    return e
+
+
+def kernel_diagonal(tools, kernel_product, ref, n, dimvar, separable):
+    # diagonal of the kernel matrix, as a vector of size n (separable case) or n*dimvar
+    if separable:
+        return kernel_product(onehot(tools, ref, n, dimvar, 0), diagonal=True)[:, 0]
+    diag = tools.zeros((n, dimvar), tools.dtype(ref), tools.device(ref))
+    for c in range(dimvar):
+        diag[:, c] = kernel_product(onehot(tools, ref, n, dimvar, c), diagonal=True)[
+            :, c
+        ]
+    return tools.view(diag, (-1,))
+
+
+def kernel_column(tools, kernel_product, ref, dimvar, separable, ind):
+    # column ind of the kernel matrix ; in the non-separable case, ind = point * dimvar + coordinate
+    point, c = (ind, 0) if separable else divmod(ind, dimvar)
+    col = kernel_product(onehot(tools, ref, 1, dimvar, c), cols=[point])
+    return col[:, 0] if separable else tools.view(col, (-1,))
+
+
+def jitter(tools, ref):
+    # relative regularization of the Cholesky factorizations, depending on the precision
+    return 1e-6 if tools.dtypename(tools.dtype(ref)) == "float32" else 1e-12
+
+
+def nystrom_factor(tools, kernel_product, ref, n, dimvar, separable, rank):
+    # factor L such that K ~ K[:, S] K[S, S]^-1 K[S, :] = L L^T, for rank random landmarks S
+    size = n if separable else n * dimvar
+    inds = np.sort(np.random.choice(size, min(rank, size), replace=False))
+    C = tools.cat(
+        [
+            tools.view(
+                kernel_column(tools, kernel_product, ref, dimvar, separable, i), (-1, 1)
+            )
+            for i in inds
+        ],
+        1,
+    )
+    KSS = C[inds, :]
+    KSS = (KSS + tools.transpose(KSS)) / 2
+    diag = list(range(len(inds)))
+    KSS[diag, diag] += jitter(tools, ref) * float(KSS.trace()) / len(inds)
+    R = tools.cholesky(KSS)
+    return tools.transpose(tools.solve(R, tools.transpose(C)))
+
+
+def pivoted_cholesky_factor(
+    tools, kernel_product, ref, n, dimvar, separable, rank, tol
+):
+    # factor L of a greedy pivoted Cholesky decomposition K ~ L L^T : at each step, the column
+    # with the largest residual diagonal entry is added, until rank columns are selected or
+    # the trace of the residual K - L L^T is below tol
+    d = kernel_diagonal(tools, kernel_product, ref, n, dimvar, separable)
+    size = d.shape[0]
+    rank = min(rank, size)
+    L = tools.zeros((size, rank), tools.dtype(ref), tools.device(ref))
+    tol = max(tol, jitter(tools, ref) * float(d.sum()))
+    k = 0
+    while k < rank:
+        piv = int(d.argmax())
+        if float(d.sum()) <= tol or float(d[piv]) <= 0:
+            break
+        col = kernel_column(tools, kernel_product, ref, dimvar, separable, piv)
+        L[:, k] = (col - L[:, :k] @ L[piv, :k]) / float(d[piv]) ** 0.5
+        d = d - L[:, k] ** 2
+        d[piv] = 0
+        k += 1
+    return L[:, :k]
+
+
+def low_rank_preconditioner(tools, L, alpha, separable, ref):
+    # inverse of the preconditioner alpha Id + U Lambda U^T, where L L^T = U Lambda U^T :
+    #   P^-1 r = r + U ((lambda_min + alpha) / (Lambda + alpha) - 1) U^T r
+    # eigenvalues which are negligible with respect to the largest one are discarded.
+    if L.shape[1] == 0:
+        precond = lambda r: r
+        precond.rank = 0
+        return precond
+    U, S = tools.svd(L)
+    lambdas = S**2
+    keep = lambdas > jitter(tools, ref) * float(lambdas.max())
+    U, lambdas = U[:, keep], lambdas[keep]
+    scale = (float(lambdas.min()) + alpha) / (lambdas + alpha) - 1
+    U_t = tools.transpose(U)
+
+    def precond(r):
+        if separable:
+            return r + U @ (scale[:, None] * (U_t @ r))
+        r_ = tools.view(r, (-1, 1))
+        return tools.view(r_ + U @ (scale[:, None] * (U_t @ r_)), r.shape)
+
+    precond.rank = int(lambdas.shape[0])
+    return precond
+
+
+def get_preconditioner(
+    binding,
+    precond,
+    kernel_product,
+    ref,
+    alpha,
+    separable,
+    rank=None,
+    tol=None,
+):
+    r"""
+    Returns a function which applies the inverse of a preconditioner of alpha Id + K,
+    where K is the kernel matrix of a KernelSolve operation.
+
+    Args:
+        precond (string): ``"nystrom"`` or ``"pivoted_cholesky"``.
+        kernel_product (function): kernel_product(var, cols=None, diagonal=False) returns
+            K[:, cols] @ var, or diag(K) @ var if diagonal is True (see the module docstring).
+        ref (array): the right-hand side of the system, of shape (n, dimvar).
+        alpha (float): the ridge regularization of the system.
+        separable (bool): True if the operator acts separately on the columns of the unknown.
+        rank (int, default None): the maximal rank of the approximation ; None means the square
+            root of the size of the matrix.
+        tol (float, default None): for pivoted Cholesky, the decomposition stops when the
+            trace of the residual K - L L^T is below tol ; None means alpha.
+
+    Returns:
+        function precond(r), applying the inverse of the preconditioner to arrays with the shape
+        of ref. precond.rank is the rank of the approximation.
+    """
+    tools = get_tools(binding)
+    n, dimvar = ref.shape
+    size = n if separable else n * dimvar
+    if rank is None:
+        rank = int(np.ceil(np.sqrt(size)))
+    if precond == "nystrom":
+        L = nystrom_factor(tools, kernel_product, ref, n, dimvar, separable, rank)
+    elif precond == "pivoted_cholesky":
+        tol = alpha if tol is None else tol
+        L = pivoted_cholesky_factor(
+            tools, kernel_product, ref, n, dimvar, separable, rank, tol
+        )
+    else:
+        raise ValueError(
+            f"Invalid preconditioner {precond}. Should be 'nystrom' or 'pivoted_cholesky'."
+        )
+    return low_rank_preconditioner(tools, L, alpha, separable, ref)
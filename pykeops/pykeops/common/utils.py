@@ -1,7 +1,9 @@
+import contextlib
 import fcntl
 import functools
 import importlib.util
 import os
+import threading
 
 import pykeops.config
 
@@ -95,6 +97,79 @@ def check_broadcasting(dims_1, dims_2):
     return max_tuple(padded_dims_1, padded_dims_2)
 
 
+# OpenMP schedule kinds, with the values of the omp_sched_t enum of the OpenMP API
+openmp_schedule_kinds = dict(static=1, dynamic=2, guided=3, auto=4)
+
+# per-call thread settings of Cpu reductions in the current thread (see openmp_settings)
+_openmp_call_settings = threading.local()
+
+
+def openmp_schedule(schedule):
+    r"""
+    Converts an OpenMP schedule, given as a kind ``"static"``, ``"dynamic"``, ``"guided"``
+    or ``"auto"``, or as a tuple (kind, chunk size), into a tuple (kind, chunk size).
+    A chunk size of 0 means the default of OpenMP.
+    """
+    kind, chunk = (schedule, 0) if isinstance(schedule, str) else schedule
+    if kind not in openmp_schedule_kinds or int(chunk) < 0:
+        raise ValueError(
+            f"Invalid OpenMP schedule {schedule}. Should be one of {tuple(openmp_schedule_kinds)}, "
+            "or a tuple (kind, chunk size) with a nonnegative chunk size."
+        )
+    return kind, int(chunk)
+
+
+def openmp_settings(num_threads=None, schedule=None):
+    r"""
+    Returns a context manager which sets the number of threads and the OpenMP schedule of
+    the Cpu reductions called in the current thread, overriding the values set by
+    :func:`pykeops.set_num_threads` and :func:`pykeops.set_schedule`.
+    None keeps the current values.
+    """
+    if num_threads is None and schedule is None:
+        return contextlib.nullcontext()
+    if num_threads is not None and num_threads < 1:
+        raise ValueError("The number of threads should be a positive integer.")
+    return _openmp_settings(
+        num_threads, None if schedule is None else openmp_schedule(schedule)
+    )
+
+
+@contextlib.contextmanager
+def _openmp_settings(num_threads, schedule):
+    previous = getattr(_openmp_call_settings, "value", None)
+    num_threads_prev, schedule_prev = previous or (None, None)
+    _openmp_call_settings.value = (
+        num_threads_prev if num_threads is None else num_threads,
+        schedule_prev if schedule is None else schedule,
+    )
+    try:
+        yield
+    finally:
+        _openmp_call_settings.value = previous
+
+
+def get_openmp_settings(lang):
+    r"""
+    Returns the thread settings of a Cpu reduction called from the current thread, as a tuple
+    (number of threads, schedule kind, chunk size) of integers, forwarded to the compiled
+    kernel. The number of threads is 0 for the default of OpenMP.
+    """
+    num_threads, schedule = getattr(_openmp_call_settings, "value", None) or (
+        None,
+        None,
+    )
+    if num_threads is None:
+        num_threads = pykeops.num_threads
+    if num_threads is None and lang == "torch":
+        # N.B. by default, KeOps shares the intra-op threads of PyTorch
+        import torch
+
+        num_threads = torch.get_num_threads()
+    kind, chunk = pykeops.schedule if schedule is None else schedule
+    return num_threads or 0, openmp_schedule_kinds[kind], chunk
+
+
 def pyKeOps_Print(message, **kwargs):
     if pykeops.verbose:
         print(message, **kwargs)
@@ -0,0 +1,213 @@
+"""
+Reductions distributed across processes.
+
+The reduction axis of a NumPy or PyTorch Genred operation, and optionally its output axis,
+are split into shards of consecutive points, which are reduced by worker processes with the
+usual compiled kernels. The partial results of the shards of the reduction axis are merged
+as in the reduction itself (see pykeops.common.partials), e.g. with a shift by the maximum
+for LogSumExp and by keeping the K smallest values for ArgKMin, and the blocks of the
+output axis are concatenated.
+
+The shards are sent to the workers by a transport, whose method run(function, tasks)
+returns [function(task) for task in tasks] :
+
+  - LocalTransport runs the tasks in a pool of local processes ;
+  - TorchDistributedTransport runs the tasks across the processes of a torch.distributed
+    process group, e.g. with the gloo backend across nodes. All the processes of the group
+    call the reduction with the same arguments, each one reduces its share of the shards,
+    and the partial results are exchanged with all_gather_object, so that all the processes
+    get the output ;
+  - if the transport is None, the tasks are run sequentially in the current process.
+
+Usage :
+    >>> op = Genred("SqDist(x,y)", ["x = Vi(3)", "y = Vj(3)"], reduction_op="ArgKMin", opt_arg=5, axis=1)
+    >>> with LocalTransport(num_workers=4) as transport:
+    ...     ind = reduce(op, x, y, transport=transport, backend="CPU", num_threads=1)
+"""
+
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pykeops.common.partials import (
+    compute_partial,
+    finalize,
+    merge_partials,
+    partial_routine,
+)
+from pykeops.common.parse_type import indexed_positions
+from pykeops.common.utils import get_tools
+from pykeops.numpy.generic.streaming import indexed_size
+
+
+class LocalTransport:
+    r"""
+    Runs the shards of distributed reductions in a pool of local processes.
+
+    Args:
+        num_workers (int, default None): number of processes ; None means the number of Cpu cores.
+    """
+
+    def __init__(self, num_workers=None):
+        self.num_workers = num_workers or os.cpu_count()
+        self.executor = None
+
+    def run(self, function, tasks):
+        if self.executor is None:
+            # processes are spawned, since forking a process which uses Cuda is not safe
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return list(self.executor.map(function, tasks))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TorchDistributedTransport:
+    r"""
+    Runs the shards of distributed reductions across the processes of a torch.distributed
+    process group, which must be initialized. All the processes of the group must call the
+    reduction with the same arguments, and all of them get the output.
+
+    Args:
+        group (ProcessGroup, default None): the process group ; None means the default group.
+    """
+
+    def __init__(self, group=None):
+        import torch.distributed
+
+        self.dist = torch.distributed
+        self.group = group
+        self.num_workers = self.dist.get_world_size(group)
+        self.rank = self.dist.get_rank(group)
+
+    def run(self, function, tasks):
+        local = {
+            k: function(tasks[k])
+            for k in range(self.rank, len(tasks), self.num_workers)
+        }
+        gathered = [None] * self.num_workers
+        self.dist.all_gather_object(gathered, local, group=self.group)
+        results = {}
+        for part in gathered:
+            results.update(part)
+        return [results[k] for k in range(len(tasks))]
+
+
+def reduce_shard(task):
+    # partial result of a shard, computed by a worker
+    chunk_routine, args, start, kwargs = task
+    return compute_partial(chunk_routine, args, start, **kwargs)
+
+
+def shard_bounds(n, num_shards):
+    # bounds of num_shards slices of [0,n) of almost equal sizes ; empty slices are dropped
+    bounds = [n * k // num_shards for k in range(num_shards + 1)]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def get_routine_binding(routine):
+    # "torch" for the Genred operations of pykeops.torch, "numpy" for those of pykeops.numpy
+    return "torch" if type(routine).__module__.startswith("pykeops.torch") else "numpy"
+
+
+def concatenate_blocks(tools, blocks, axis):
+    # concatenates the outputs of the blocks of the output axis, which may be pairs of arrays
+    if isinstance(blocks[0], tuple):
+        return tuple(tools.cat(block, axis) for block in zip(*blocks))
+    return tools.cat(blocks, axis)
+
+
+def reduce(routine, *args, transport=None, shards=None, output_shards=1, **kwargs):
+    r"""
+    Computes the reduction of a Genred operation, distributed across processes.
+
+    Args:
+        routine (:class:`pykeops.numpy.Genred` or :class:`pykeops.torch.Genred`): the reduction,
+            which may be a **Sum**, **Min**, **Max**, **LogSumExp**, **SumSoftMaxWeight** or a
+            variant of the **ArgMin**, **ArgMax** and **ArgKMin** reductions.
+        *args (arrays or tensors): the input arrays, as in :meth:`Genred.__call__`. N.B.: with
+            a PyTorch routine, the output is computed without gradient, as the partial results
+            of the shards (see ``return_partial``).
+
+    Keyword Args:
+        transport (default None): :class:`LocalTransport`, :class:`TorchDistributedTransport`
+            or None to reduce the shards sequentially in the current process.
+        shards (int, default None): number of shards of the reduction axis ; None means the
+            number of workers of the transport.
+        output_shards (int, default 1): number of shards of the output axis.
+        **kwargs: other keyword arguments of :meth:`Genred.__call__`, used for each shard, such as
+            backend or num_threads. N.B.: local workers share the cores of the machine, so that
+            num_threads should typically be the number of cores divided by the number of workers.
+
+    Returns:
+        The output of the reduction, as returned by :meth:`Genred.__call__`.
+    """
+    if len(args) != routine.nargs:
+        raise ValueError(
+            f"Invalid number of arguments in call to Genred (should be {routine.nargs} and got {len(args)})."
+        )
+    red_positions = indexed_positions(routine.aliases, routine.axis)
+    out_positions = indexed_positions(routine.aliases, 1 - routine.axis)
+    if not red_positions or not out_positions:
+        raise ValueError(
+            "Distributed reduction : there should be variables indexed along both axes."
+        )
+    if shards is None:
+        shards = getattr(transport, "num_workers", 1)
+    chunk_routine = partial_routine(routine)
+
+    binding = get_routine_binding(routine)
+    if binding == "numpy":
+        # N.B. memory-mapped arrays are viewed as plain arrays, and only the slices of the
+        # shards are read when the tasks are sent to the workers
+        args = [np.asarray(arg) for arg in args]
+    else:
+        import torch
+
+        if not all(isinstance(arg, torch.Tensor) for arg in args):
+            raise TypeError(
+                "Distributed reduction : the arguments of a PyTorch Genred operation should be tensors."
+            )
+        args = [arg.detach() for arg in args]
+    out_bounds = shard_bounds(indexed_size(args, out_positions), output_shards)
+    red_bounds = shard_bounds(indexed_size(args, red_positions), shards)
+    tasks = []
+    for out_start, out_end in out_bounds:
+        for red_start, red_end in red_bounds:
+            shard_args = list(args)
+            for pos in out_positions:
+                shard_args[pos] = args[pos][..., out_start:out_end, :]
+            for pos in red_positions:
+                shard_args[pos] = args[pos][..., red_start:red_end, :]
+            tasks.append((chunk_routine, shard_args, red_start, kwargs))
+
+    if transport is None:
+        partials = [reduce_shard(task) for task in tasks]
+    else:
+        partials = transport.run(reduce_shard, tasks)
+
+    merge = functools.partial(merge_partials, routine)
+    n = len(red_bounds)
+    blocks = [
+        finalize(routine, functools.reduce(merge, partials[k : k + n]))
+        for k in range(0, len(partials), n)
+    ]
+    if len(blocks) == 1:
+        return blocks[0]
+    # N.B. the output axis follows the batch dimensions
+    nbatchdims = max(len(arg.shape) for arg in args) - 2
+    return concatenate_blocks(get_tools(binding), blocks, nbatchdims)
@@ -1,10 +1,15 @@
+import asyncio
+
 import numpy as np
 
 from pykeops.common.get_options import get_tag_backend
+from pykeops.common.asynchronous import call_async
 from pykeops.common.operations import preprocess, postprocess
+from pykeops.common.partials import compute_partial, partial_routine
 from pykeops.common.parse_type import get_sizes, complete_aliases, get_optional_flags
-from pykeops.common.utils import axis2cat
+from pykeops.common.utils import axis2cat, openmp_settings
 from pykeops import default_device_id
+from pykeops.numpy.generic.streaming import stream_reduction, iter_output_blocks
 from pykeops.common.utils import pyKeOps_Warning
 
 
@@ -185,7 +190,23 @@ class Genred:
         self.axis = axis
         self.opt_arg = opt_arg
 
-    def __call__(self, *args, backend="auto", device_id=-1, ranges=None, out=None):
+    def __getstate__(self):
+        # N.B. the compiled module is not picklable ; it is loaded again at the next call
+        state = self.__dict__.copy()
+        state.pop("myconv", None)
+        return state
+
+    def __call__(
+        self,
+        *args,
+        backend="auto",
+        device_id=-1,
+        ranges=None,
+        out=None,
+        num_threads=None,
+        schedule=None,
+        return_partial=False,
+    ):
         r"""
         Apply the routine on arbitrary NumPy arrays.
 
@@ -213,6 +234,7 @@ class Genred:
 
                     - ``"auto"`` (default): let KeOps decide which backend is best suited to your data, based on the tensors' shapes. ``"GPU_1D"`` will be chosen in most cases.
                     - ``"CPU"``: use a simple C++ ``for`` loop on a single CPU core.
+                    - ``"CPU_tiled"``: use a cache-blocked C++ loop on the CPU, which processes blocks of ``i`` indices against tiles of ``j`` indices. In ``"auto"`` mode, it is chosen on the CPU for large problems.
                     - ``"GPU_1D"``: use a `simple multithreading scheme <https://github.com/getkeops/keops/blob/main/keops/core/GpuConv1D.cu>`_ on the GPU - basically, one thread per value of the output index.
                     - ``"GPU_2D"``: use a more sophisticated `2D parallelization scheme <https://github.com/getkeops/keops/blob/main/keops/core/GpuConv2D.cu>`_ on the GPU.
                     - ``"GPU"``: let KeOps decide which one of the ``"GPU_1D"`` or the ``"GPU_2D"`` scheme will run faster on the given input.
@@ -280,6 +302,19 @@ class Genred:
                 If provided, the output array should all have the same ``dtype``, be **contiguous** and be stored on
                 the **same device** as the arguments. Moreover it should have the correct shape for the output.
 
+            num_threads (int, None by default): Number of threads of the computation on the Cpu,
+                for this call only ; None means the value set by :func:`pykeops.set_num_threads`.
+
+            schedule (string or tuple, None by default): OpenMP schedule of the computation on the Cpu,
+                for this call only, as a kind ``"static"``, ``"dynamic"``, ``"guided"`` or ``"auto"``,
+                or a tuple (kind, chunk size) ; None means the value set by :func:`pykeops.set_schedule`.
+
+            return_partial (bool, False by default): If True, returns the partial result of the
+                reduction before its finalization, e.g. the pair (m, s) instead of m + log(s) for the
+                **LogSumExp** reduction. Partial results over disjoint sets of points of the reduction
+                axis are merged by :func:`pykeops.merge_partials`, and finalized by :func:`pykeops.finalize`.
+                The **out** argument is not supported in this case.
+
         Returns:
             (M,D) or (N,D) array:
 
@@ -294,8 +329,36 @@ class Genred:
                 f"Invalid number of arguments in call to Genred (should be {self.nargs} and got {len(args)})."
             )
 
+        if return_partial:
+            if out is not None:
+                raise ValueError(
+                    "The out argument is not supported with return_partial=True."
+                )
+            # N.B. the partial result is computed by a copy of the routine, with the
+            # reduction of its accumulator (see pykeops.common.partials)
+            return compute_partial(
+                partial_routine(self),
+                args,
+                backend=backend,
+                device_id=device_id,
+                ranges=ranges,
+                num_threads=num_threads,
+                schedule=schedule,
+            )
+
+        if num_threads is not None or schedule is not None:
+            with openmp_settings(num_threads, schedule):
+                return self(
+                    *args, backend=backend, device_id=device_id, ranges=ranges, out=out
+                )
+
+        nx, ny = get_sizes(self.aliases, *args)
+        nout, nred = (nx, ny) if self.axis == 1 else (ny, nx)
+
         # Get tags
-        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(backend, args)
+        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(
+            backend, args, sizes=(nx, ny)
+        )
 
         # number of batch dimensions
         # N.B. we assume here that there is at least a cat=0 or cat=1 variable in the formula...
@@ -310,19 +373,38 @@ class Genred:
 
         from pykeops.common.keops_io import keops_binder
 
-        self.myconv = keops_binder["nvrtc" if tagCPUGPU else "cpp"](
-            tagCPUGPU,
-            tag1D2D,
-            tagHostDevice,
-            use_ranges,
-            device_id,
-            self.formula,
-            self.aliases,
-            len(args),
-            dtype,
-            "numpy",
-            self.optional_flags,
-        ).import_module()
+        # N.B. the other arguments of the binder only depend on self, which is used as
+        # key of a first lookup, without building the string key of the cache (see Cache_partial)
+        myconv = (
+            keops_binder["nvrtc" if tagCPUGPU else "cpp"]
+            .call_from(
+                self,
+                (
+                    tagCPUGPU,
+                    tag1D2D,
+                    tagHostDevice,
+                    use_ranges,
+                    device_id,
+                    len(args),
+                    dtype,
+                ),
+                tagCPUGPU,
+                tag1D2D,
+                tagHostDevice,
+                use_ranges,
+                device_id,
+                self.formula,
+                self.aliases,
+                len(args),
+                dtype,
+                "numpy",
+                self.optional_flags,
+            )
+            .import_module()
+        )
+        # N.B. the module of the call is a local variable, since calls with other dtypes or
+        # backends may run concurrently in other threads ; the attribute is kept for inspection
+        self.myconv = myconv
 
         # N.B.: KeOps C++ expects contiguous data arrays
         test_contig = all(arg.flags["C_CONTIGUOUS"] for arg in args)
@@ -337,9 +419,6 @@ class Genred:
         if ranges:
             ranges = tuple(r.astype("int64", order="C") for r in ranges)
 
-        nx, ny = get_sizes(self.aliases, *args)
-        nout, nred = (nx, ny) if self.axis == 1 else (ny, nx)
-
         if "Arg" in self.reduction_op:
             # when using Arg type reductions,
             # if nred is greater than 16 millions and dtype=float32, the result is not reliable
@@ -354,6 +433,176 @@ class Genred:
                     "size of input array is too large for Arg type reduction with float16 dtype.."
                 )
 
-        out = self.myconv.genred_numpy(-1, ranges, nx, ny, nbatchdims, out, *args)
+        out = myconv.genred_numpy(-1, ranges, nx, ny, nbatchdims, out, *args)
 
         return postprocess(out, "numpy", self.reduction_op, nout, self.opt_arg, dtype)
+
+    def stream(
+        self,
+        *args,
+        chunk_size=None,
+        chunks=None,
+        prefetch=True,
+        block_size=None,
+        backend="auto",
+        device_id=-1,
+        num_threads=None,
+        schedule=None,
+    ):
+        r"""
+        Apply the routine on arrays which are read by chunks along the reduction axis.
+
+        The variables indexed along the reduction axis (``Vj(..)`` variables if **axis** = 1,
+        ``Vi(..)`` variables if **axis** = 0) may be given as memory-mapped arrays
+        (``np.memmap``) which do not fit in memory, or by an iterator over chunks.
+        The routine is applied on each chunk of consecutive points, and the partial results
+        are merged as in the reduction itself : sums are added, log-sum-exps are merged with
+        a shift by the maximum, and (k-)min or max values are compared, with indices
+        relative to the whole reduction axis. While a chunk is reduced, the next one is
+        read by a background thread.
+
+        By default, only the reduction axis is streamed : the variables indexed along the
+        output axis are used as a whole by the kernel for each chunk. If **block_size** is
+        given, the output is also computed by blocks along the output axis, so that large
+        memory-mapped arrays are read by slices along both axes ; the chunks of the reduction
+        axis are then read once per block.
+
+        Supported reductions are **Sum**, **Min**, **Max**, **LogSumExp**, **SumSoftMaxWeight**
+        and the variants of the **ArgMin**, **ArgMax** and **ArgKMin** reductions.
+
+        Example:
+            >>> x = np.random.randn(1000, 3)
+            >>> y = np.memmap("y.dat", dtype="float64", mode="r", shape=(10**8, 3))
+            >>> op = Genred("SqDist(x,y)", ["x = Vi(3)", "y = Vj(3)"], reduction_op="ArgKMin", opt_arg=5, axis=1)
+            >>> ind = op.stream(x, y, chunk_size=10**6)  # (1000, 5) array of indices in [0, 10**8)
+
+        Args:
+            *args (arrays): The input arrays, as in :meth:`__call__`. If **chunks** is given,
+                the arguments indexed along the reduction axis should be None.
+
+        Keyword Args:
+            chunk_size (int, None by default): Number of points of the chunks along the reduction axis.
+                None means chunks of about 128MB.
+
+            chunks (iterable, None by default): Iterable over the chunks, each one given as a tuple
+                of arrays for the variables indexed along the reduction axis, in the order of the aliases
+                (or a single array if there is only one such variable). If None, the chunks are
+                slices of the arguments.
+
+            prefetch (bool, True by default): If True, the next chunk is read in a background
+                thread while the current one is reduced.
+
+            block_size (int, None by default): If not None, number of points of the blocks along the
+                output axis, each one reduced by chunks along the reduction axis. Not supported with **chunks**.
+
+            backend, device_id, num_threads, schedule: Same as in :meth:`__call__`, used for each chunk.
+
+        Returns:
+            The output of the reduction, as returned by :meth:`__call__`.
+        """
+        return stream_reduction(
+            self,
+            args,
+            chunk_size=chunk_size,
+            chunks=chunks,
+            prefetch=prefetch,
+            block_size=block_size,
+            backend=backend,
+            device_id=device_id,
+            num_threads=num_threads,
+            schedule=schedule,
+        )
+
+    def iter_blocks(
+        self,
+        *args,
+        block_size=None,
+        chunk_size=None,
+        prefetch=True,
+        backend="auto",
+        device_id=-1,
+        num_threads=None,
+        schedule=None,
+    ):
+        r"""
+        Generator over the output of the routine, computed by blocks of consecutive points
+        along the output axis.
+
+        The output is never allocated as a whole : for successive slices of the variables
+        indexed along the output axis (``Vi(..)`` variables if **axis** = 1, ``Vj(..)`` variables
+        if **axis** = 0), the routine is applied and the corresponding block of the output
+        is yielded. Slices of contiguous arrays, including memory-mapped arrays, are passed
+        to the kernel without any copy.
+
+        Example:
+            >>> x = np.memmap("x.dat", dtype="float32", mode="r", shape=(10**9, 3))
+            >>> op = Genred("SqDist(x,y)", ["x = Vi(3)", "y = Vj(3)"], reduction_op="ArgKMin", opt_arg=5, axis=1)
+            >>> for start, ind in op.iter_blocks(x, y, block_size=10**6):
+            ...     writer.write(ind)  # (10**6, 5) array of indices, for x[start:start+10**6]
+
+        Args:
+            *args (arrays): The input arrays, as in :meth:`__call__`.
+
+        Keyword Args:
+            block_size (int, None by default): Number of points of the blocks along the output axis.
+                None means slices of about 128MB of the variables indexed along the output axis.
+
+            chunk_size (int, None by default): If not None, each block is computed by
+                :meth:`stream`, reading the variables indexed along the reduction axis
+                by chunks of chunk_size points.
+
+            prefetch (bool, True by default): Same as in :meth:`stream`, if chunk_size is not None.
+
+            backend, device_id, num_threads, schedule: Same as in :meth:`__call__`, used for each block.
+
+        Yields:
+            Pairs (start, out), where out is the output of the reduction, as returned by :meth:`__call__`,
+            for the points start, start+1, ... of the output axis.
+        """
+        return iter_output_blocks(
+            self,
+            args,
+            block_size=block_size,
+            chunk_size=chunk_size,
+            prefetch=prefetch,
+            backend=backend,
+            device_id=device_id,
+            num_threads=num_threads,
+            schedule=schedule,
+        )
+
+    def call_async(self, *args, executor=None, **kwargs):
+        r"""
+        Apply the routine in a worker thread, without blocking the calling thread.
+
+        The Cpu kernel releases the GIL while it runs, so that the calling thread may prepare
+        other inputs or read files in the meantime, and several reductions may run in parallel.
+
+        Example:
+            >>> future = op.call_async(x, y, backend="CPU")
+            >>> ...  # other work
+            >>> res = future.result()
+
+        Args:
+            *args (arrays): The input arrays, as in :meth:`__call__`. They should not be modified
+                until the call is complete.
+
+        Keyword Args:
+            executor (concurrent.futures.Executor, None by default): The executor of the call ;
+                None means a pool of worker threads shared by all the asynchronous calls.
+
+            **kwargs: The keyword arguments of :meth:`__call__`.
+
+        Returns:
+            concurrent.futures.Future: The future output of the routine.
+        """
+        return call_async(self, *args, executor=executor, **kwargs)
+
+    async def acall(self, *args, executor=None, **kwargs):
+        r"""
+        Awaitable variant of :meth:`call_async`, for asyncio coroutines :
+        ``res = await op.acall(x, y)``.
+        """
+        return await asyncio.wrap_future(
+            self.call_async(*args, executor=executor, **kwargs)
+        )
@@ -0,0 +1,208 @@
+"""
+Streaming reductions, computed chunk by chunk along the reduction axis.
+
+The variables indexed along the reduction axis (the Vj(..) variables if axis=1) are read
+by chunks of consecutive points, e.g. from np.memmap arrays which do not fit in memory,
+or from an iterator over chunks. Each chunk is reduced with the compiled kernel of the
+Genred operation, and the partial results of the chunks are merged as in the reduction
+itself (see pykeops.common.partials), e.g. with a shift by the maximum for LogSumExp and by
+keeping the K smallest values for ArgKMin, with indices shifted by the start of the chunks.
+
+Symmetrically, the output may be computed by blocks of consecutive points along the output
+axis, so that the whole output array is never allocated : the blocks are yielded by a
+generator, and each of them may itself be computed by streaming over the reduction axis.
+Streaming reductions may also be computed by blocks along the output axis, so that only a
+block of the variables indexed along the output axis is used by the kernel at a time.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pykeops.common.parse_type import indexed_positions
+from pykeops.common.partials import (
+    compute_partial,
+    finalize,
+    merge_partials,
+    partial_routine,
+)
+
+# default size in bytes of the chunks of the reduced variables
+default_chunk_bytes = 2**27
+
+
+def indexed_size(args, positions):
+    # number of points of the arguments at the given positions
+    sizes = set(args[pos].shape[-2] for pos in positions)
+    if len(sizes) != 1:
+        raise ValueError(
+            "The arguments indexed along the same axis should have the same number of points."
+        )
+    return sizes.pop()
+
+
+def slice_chunks(args, positions, chunk_size):
+    # chunks of consecutive points of the arguments at the given positions, as views of
+    # these arguments
+    n = indexed_size(args, positions)
+    if chunk_size is None:
+        row_bytes = sum(args[pos].itemsize * args[pos].shape[-1] for pos in positions)
+        chunk_size = max(1, default_chunk_bytes // max(1, row_bytes))
+    for start in range(0, n, chunk_size):
+        yield tuple(args[pos][..., start : start + chunk_size, :] for pos in positions)
+
+
+def load_chunk(chunk):
+    # N.B. memory-mapped arrays are copied, so that the chunk is read from the disk here,
+    # and not while the kernel runs on it
+    if not isinstance(chunk, (tuple, list)):
+        chunk = (chunk,)
+    return tuple(
+        (
+            np.array(arr, order="C")
+            if isinstance(arr, np.memmap) or not arr.flags["C_CONTIGUOUS"]
+            else arr
+        )
+        for arr in chunk
+    )
+
+
+def prefetched(chunks, prefetch=True):
+    # loads the chunks in memory ; the next chunk is read by a background thread
+    # while the current chunk is reduced
+    chunks = iter(chunks)
+
+    def load():
+        chunk = next(chunks, None)
+        return None if chunk is None else load_chunk(chunk)
+
+    if not prefetch:
+        for chunk in chunks:
+            yield load_chunk(chunk)
+        return
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(load)
+        while True:
+            chunk = future.result()
+            if chunk is None:
+                return
+            future = executor.submit(load)
+            yield chunk
+
+
+def output_blocks(routine, args, block_size):
+    # arguments of the blocks of consecutive points along the output axis, with the slices
+    # of the variables indexed along the output axis
+    positions = indexed_positions(routine.aliases, 1 - routine.axis)
+    if not positions:
+        raise ValueError(
+            "Streaming reduction : there is no variable indexed along the output axis."
+        )
+    block_args = list(args)
+    for block in slice_chunks(args, positions, block_size):
+        # N.B. the slices of contiguous arrays are contiguous views, passed to the kernel
+        # with an offset pointer and without any copy
+        for pos, arr in zip(positions, block):
+            block_args[pos] = arr
+        yield block[0].shape[-2], block_args
+
+
+def concatenate_blocks(outs, axis):
+    # output of the reduction from the outputs of successive blocks along the output axis,
+    # which is the first axis after the batch dimensions
+    if isinstance(outs[0], tuple):
+        return tuple(np.concatenate(out, axis=axis) for out in zip(*outs))
+    return np.concatenate(outs, axis=axis)
+
+
+def stream_reduction(
+    routine,
+    args,
+    chunk_size=None,
+    chunks=None,
+    prefetch=True,
+    block_size=None,
+    **kwargs,
+):
+    r"""
+    Computes the reduction of the Genred operation routine on arguments whose variables
+    indexed along the reduction axis are read by chunks. See :meth:`Genred.stream`.
+    """
+    if len(args) != routine.nargs:
+        raise ValueError(
+            f"Invalid number of arguments in call to Genred (should be {routine.nargs} and got {len(args)})."
+        )
+    if block_size is not None:
+        if chunks is not None:
+            raise ValueError(
+                "Streaming reduction : block_size is not supported with chunks, which are read only once."
+            )
+        # N.B. the variables indexed along the reduction axis are read once per block
+        nbatchdims = max(len(arg.shape) for arg in args) - 2
+        return concatenate_blocks(
+            [
+                stream_reduction(
+                    routine,
+                    block_args,
+                    chunk_size=chunk_size,
+                    prefetch=prefetch,
+                    **kwargs,
+                )
+                for _, block_args in output_blocks(routine, args, block_size)
+            ],
+            nbatchdims,
+        )
+    # N.B. the variables indexed along the reduction axis are of category axis
+    positions = indexed_positions(routine.aliases, routine.axis)
+    if not positions:
+        raise ValueError(
+            "Streaming reduction : there is no variable indexed along the reduction axis."
+        )
+    if chunks is None:
+        chunks = slice_chunks(args, positions, chunk_size)
+    chunk_routine = partial_routine(routine)
+
+    args = [
+        None if pos in positions else np.ascontiguousarray(arg)
+        for pos, arg in enumerate(args)
+    ]
+    acc, start = None, 0
+    for chunk in prefetched(chunks, prefetch):
+        if len(chunk) != len(positions):
+            raise ValueError(
+                f"Streaming reduction : chunks should contain {len(positions)} arrays, got {len(chunk)}."
+            )
+        for pos, arr in zip(positions, chunk):
+            args[pos] = arr
+        out = compute_partial(chunk_routine, args, start, **kwargs)
+        acc = out if acc is None else merge_partials(routine, acc, out)
+        start += chunk[0].shape[-2]
+    if acc is None:
+        raise ValueError("Streaming reduction : no chunk to reduce.")
+    return finalize(routine, acc)
+
+
+def iter_output_blocks(
+    routine, args, block_size=None, chunk_size=None, prefetch=True, **kwargs
+):
+    r"""
+    Generator over the blocks of the output of the Genred operation routine, for successive
+    slices of the output axis. See :meth:`Genred.iter_blocks`.
+    """
+    if len(args) != routine.nargs:
+        raise ValueError(
+            f"Invalid number of arguments in call to Genred (should be {routine.nargs} and got {len(args)})."
+        )
+    if chunk_size is None:
+        # N.B. memory-mapped arrays are viewed as plain arrays, without reading them
+        args = tuple(np.asarray(arg) for arg in args)
+    start = 0
+    for size, block_args in output_blocks(routine, args, block_size):
+        if chunk_size is None:
+            out = routine(*block_args, **kwargs)
+        else:
+            out = stream_reduction(
+                routine, block_args, chunk_size=chunk_size, prefetch=prefetch, **kwargs
+            )
+        yield start, out
+        start += size
@@ -2,9 +2,14 @@ import numpy as np
 
 from pykeops.common.get_options import get_tag_backend
 from pykeops.common.keops_io import keops_binder
-from pykeops.common.operations import ConjugateGradientSolver
+from pykeops.common.operations import ConjugateGradientSolver, is_column_separable
 from pykeops.common.parse_type import get_sizes, complete_aliases, get_optional_flags
-from pykeops.common.utils import axis2cat
+from pykeops.common.preconditioners import (
+    diagonal_ranges,
+    get_preconditioner,
+    reduction_args,
+)
+from pykeops.common.utils import axis2cat, get_tools
 from pykeops import default_device_id
 from pykeops.common.utils import pyKeOps_Warning
 
@@ -172,12 +177,26 @@ class KernelSolve:
                 tmp[i] = s[: s.find("=")].strip()
             varinvpos = tmp.index(varinvalias)
         self.varinvpos = varinvpos
+        self.separable = is_column_separable(self.formula, self.aliases, varinvpos)
         self.axis = axis
         self.reduction_op = reduction_op
         self.optional_flags = optional_flags
 
     def __call__(
-        self, *args, backend="auto", device_id=-1, alpha=1e-10, eps=1e-6, ranges=None
+        self,
+        *args,
+        backend="auto",
+        device_id=-1,
+        alpha=1e-10,
+        eps=1e-6,
+        ranges=None,
+        x0=None,
+        maxiter=None,
+        rtol=None,
+        return_info=False,
+        precond=None,
+        precond_rank=None,
+        precond_tol=None,
     ):
         r"""
         To apply the routine on arbitrary NumPy arrays.
@@ -224,6 +243,48 @@ class KernelSolve:
                 as we loop over all indices
                 :math:`i\in[0,M)` and :math:`j\in[0,N)`.
 
+            x0 (array, default None): Initial guess of the solution, with the same shape as
+                the variable with respect to which the system is solved, e.g. the solution of
+                a previous, similar problem (warm start).
+
+            maxiter (int, default None): Maximum number of iterations of the conjugate
+                gradient solver ; None means no limit.
+
+            rtol (float, default None): Relative tolerance : a column of the solution has also
+                converged when the norm of its residual is below **rtol** times the norm of
+                the corresponding column of the right-hand side.
+
+            eps (float, default 1e-6): Absolute tolerance : a column of the solution has converged
+                when the mean of its squared residuals is below the square of **eps**.
+                All columns are solved together, with one kernel product per iteration.
+                If the formula is of the form ``g * a``, where ``a`` is the variable with respect
+                to which the system is solved and ``g`` a scalar formula, columns are
+                independent systems, with their own step sizes and convergence tests ;
+                otherwise, the solution is handled as a single vector.
+
+            return_info (bool, default False): If True, also returns a dict of convergence
+                diagnostics, with keys ``"iterations"`` (number of iterations), ``"converged"``
+                (True if all columns have converged) and ``"residuals"`` (norms of the residuals
+                of the columns), and ``"precond"`` (the preconditioner, see below).
+
+            precond (string or function, default None): Preconditioner of the conjugate
+                gradient solver, built from a low-rank approximation :math:`LL^\top` of
+                :math:`K_{xx}`, which is computed with KeOps reductions for any formula:
+
+                    - ``"nystrom"``: Nystrom approximation, from the columns of :math:`K_{xx}` at randomly chosen landmark points.
+                    - ``"pivoted_cholesky"``: greedy pivoted Cholesky decomposition of :math:`K_{xx}`.
+                    - a preconditioner returned in the ``"precond"`` entry of the diagnostics of a previous solve with the same kernel matrix, e.g. with other right-hand sides, which avoids computing the approximation again.
+
+                The approximation is computed once per call, before the iterations of the solver.
+                Preconditioners are not available with batch dimensions or **ranges**.
+
+            precond_rank (int, default None): Maximal rank of the approximation of the
+                preconditioner ; None means the square root of the size of the system.
+
+            precond_tol (float, default None): For ``"pivoted_cholesky"``, the decomposition
+                stops when the trace of :math:`K_{xx} - LL^\top` is below
+                **precond_tol** ; None means **alpha**.
+
         Returns:
             (M,D) or (N,D) array:
 
@@ -234,7 +295,9 @@ class KernelSolve:
 
         """
         # Get tags
-        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(backend, args)
+        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(
+            backend, args, sizes=get_sizes(self.aliases, *args)
+        )
 
         # number of batch dimensions
         # N.B. we assume here that there is at least a cat=0 or cat=1 variable in the formula...
@@ -246,7 +309,7 @@ class KernelSolve:
         if device_id == -1:
             device_id = default_device_id if tagCPUGPU == 1 else -1
 
-        self.myconv = keops_binder["nvrtc" if tagCPUGPU else "cpp"](
+        myconv = keops_binder["nvrtc" if tagCPUGPU else "cpp"](
             tagCPUGPU,
             tag1D2D,
             tagHostDevice,
@@ -259,17 +322,76 @@ class KernelSolve:
             "numpy",
             self.optional_flags,
         ).import_module()
+        # N.B. the module of the call is a local variable, as in Genred
+        self.myconv = myconv
 
         varinv = args[self.varinvpos]
 
         def linop(var):
             newargs = args[: self.varinvpos] + (var,) + args[self.varinvpos + 1 :]
             nx, ny = get_sizes(self.aliases, *newargs)
-            res = self.myconv.genred_numpy(
-                -1, ranges, nx, ny, nbatchdims, None, *newargs
-            )
+            res = myconv.genred_numpy(-1, ranges, nx, ny, nbatchdims, None, *newargs)
             if alpha:
                 res += alpha * var
             return res
 
-        return ConjugateGradientSolver("numpy", linop, varinv, eps=eps)
+        if isinstance(precond, str):
+            if use_ranges:
+                raise ValueError(
+                    "[KeOps] Preconditioners are not available with batch dimensions or ranges."
+                )
+
+            # N.B. the diagonal of the kernel matrix is computed by a block-sparse reduction,
+            # which requires a module compiled with ranges.
+            myconv_diag = keops_binder["nvrtc" if tagCPUGPU else "cpp"](
+                tagCPUGPU,
+                tag1D2D,
+                tagHostDevice,
+                True,
+                device_id,
+                self.formula,
+                self.aliases,
+                len(args),
+                dtype,
+                "numpy",
+                self.optional_flags,
+            ).import_module()
+            ranges_diag = diagonal_ranges(get_tools("numpy"), varinv.shape[0], "cpu")
+
+            def kernel_product(var, cols=None, diagonal=False):
+                newargs = reduction_args(
+                    args, self.aliases, self.axis, self.varinvpos, var, cols
+                )
+                nx, ny = get_sizes(self.aliases, *newargs)
+                if diagonal:
+                    return myconv_diag.genred_numpy(
+                        -1, ranges_diag, nx, ny, 0, None, *newargs
+                    )
+                return myconv.genred_numpy(-1, None, nx, ny, 0, None, *newargs)
+
+            precond = get_preconditioner(
+                "numpy",
+                precond,
+                kernel_product,
+                varinv,
+                alpha,
+                self.separable,
+                rank=precond_rank,
+                tol=precond_tol,
+            )
+
+        res = ConjugateGradientSolver(
+            "numpy",
+            linop,
+            varinv,
+            eps=eps,
+            x0=x0,
+            maxiter=maxiter,
+            rtol=rtol,
+            return_info=return_info,
+            separable=self.separable,
+            precond=precond,
+        )
+        if return_info:
+            res[1]["precond"] = precond
+        return res
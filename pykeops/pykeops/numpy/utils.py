@@ -60,6 +60,45 @@ class numpytools:
     def view(x, s):
         return np.reshape(x, s)
 
+    @staticmethod
+    def cat(xs, axis):
+        return np.concatenate(xs, axis=axis)
+
+    @staticmethod
+    def split(x, sizes, axis):
+        return np.split(x, np.cumsum(sizes)[:-1], axis=axis)
+
+    @staticmethod
+    def maximum(x, y):
+        return np.maximum(x, y)
+
+    @staticmethod
+    def minimum(x, y):
+        return np.minimum(x, y)
+
+    @staticmethod
+    def where(cond, x, y):
+        return np.where(cond, x, y)
+
+    @staticmethod
+    def argsort(x, axis):
+        # N.B. the sort is stable : equal values keep their order
+        return np.argsort(x, axis=axis, kind="stable")
+
+    @staticmethod
+    def take_along_axis(x, ind, axis):
+        return np.take_along_axis(x, ind, axis)
+
+    @staticmethod
+    def cholesky(x):
+        return np.linalg.cholesky(x)
+
+    @staticmethod
+    def svd(x):
+        # thin singular value decomposition, returns U and the singular values
+        U, S, _ = np.linalg.svd(x, full_matrices=False)
+        return U, S
+
     @staticmethod
     def long(x):
         return x.astype("int64")
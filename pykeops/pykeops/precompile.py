@@ -0,0 +1,324 @@
+"""
+Ahead-of-time compilation of KeOps kernels.
+
+A manifest is a json file containing a list of kernels to be compiled. Each entry is either :
+
+  - a high-level description of a reduction, with the arguments of Genred, e.g.
+      {"formula": "Exp(-SqDist(x,y))*b", "aliases": ["x=Vi(3)", "y=Vj(3)", "b=Vj(2)"],
+       "reduction_op": "Sum", "axis": 1, "dtype": "float32", "backend": "CPU", "lang": "numpy"}
+    Optional keys are "use_ranges", "device_id" and "options" (dict of other keyword arguments
+    of Genred, such as opt_arg or sum_scheme). "dtype" and "backend" may also be lists,
+    in which case all combinations are compiled.
+
+  - the exact arguments of a call to the KeOps binders, as recorded from a run with
+    record_manifest (such entries contain a "binder" key).
+
+Kernels are compiled in parallel by a pool of processes, through the usual binders :
+the build folder and cache index are populated as for a regular call, so that later
+runs pick up the compiled kernels transparently.
+
+Usage :
+    python -m pykeops.precompile compile manifest.json [-j NUM_WORKERS] [--bundle]
+    python -m pykeops.precompile record manifest.json script.py [script arguments]
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import pykeops
+from pykeops.common.get_options import SetBackend
+from pykeops.common.utils import pyKeOps_Message
+
+# names of the arguments of the KeOps binders (see LoadKeOps.init)
+binder_arg_names = (
+    "tagCPUGPU",
+    "tag1D2D",
+    "tagHostDevice",
+    "use_ranges",
+    "device_id",
+    "formula",
+    "aliases",
+    "nargs",
+    "dtype",
+    "lang",
+    "optional_flags",
+)
+
+
+def to_json(obj):
+    # tuples are encoded explicitly, since the string representation of the
+    # binder arguments is used as key in the cache index (see Cache_partial)
+    if isinstance(obj, tuple):
+        return {"__tuple__": [to_json(x) for x in obj]}
+    if isinstance(obj, list):
+        return [to_json(x) for x in obj]
+    if isinstance(obj, dict):
+        return {key: to_json(val) for key, val in obj.items()}
+    return obj
+
+
+def from_json(obj):
+    if isinstance(obj, dict):
+        if "__tuple__" in obj:
+            return tuple(from_json(x) for x in obj["__tuple__"])
+        return {key: from_json(val) for key, val in obj.items()}
+    if isinstance(obj, list):
+        return [from_json(x) for x in obj]
+    return obj
+
+
+def backend_tags(backend, lang):
+    # (tagCPUGPU, tag1D2D, tagHostDevice) for an explicit backend, as in SetBackend.define_tag_backend.
+    # Without explicit memory type, Gpu computations are assumed to use torch tensors
+    # stored on the device, or numpy arrays stored on the host.
+    if backend not in SetBackend.possible_options_list or backend == "auto":
+        raise ValueError(
+            f"Invalid backend {backend} in manifest. Should be one of {SetBackend.possible_options_list[1:]}"
+        )
+    split_backend = backend.split("_")
+    tagCPUGPU = SetBackend.dev[split_backend[0]]
+    if len(split_backend) == 1:
+        tag1D2D = SetBackend._find_grid()
+    elif tagCPUGPU == 0:
+        tag1D2D = SetBackend.cpu_scheme[split_backend[1]]
+    else:
+        tag1D2D = SetBackend.grid[split_backend[1]]
+    if len(split_backend) == 3:
+        tagHostDevice = SetBackend.memtype[split_backend[2]]
+    else:
+        tagHostDevice = int(tagCPUGPU == 1 and lang == "torch")
+    return tagCPUGPU, tag1D2D, tagHostDevice
+
+
+def expand_backend(backend):
+    # backends corresponding to "auto" mode : the Cpu scheme depends on the sizes of the data
+    if backend != "auto":
+        return [backend]
+    return ["GPU_1D"] if pykeops.config.gpu_available else ["CPU", "CPU_tiled"]
+
+
+def genred_binder_calls(
+    formula,
+    aliases,
+    reduction_op="Sum",
+    axis=0,
+    dtype="float32",
+    backend="auto",
+    lang="numpy",
+    use_ranges=False,
+    device_id=-1,
+    options={},
+):
+    # list of (binder name, binder arguments) corresponding to a high-level manifest entry
+    from pykeops.numpy import Genred
+
+    op = Genred(formula, list(aliases), reduction_op=reduction_op, axis=axis, **options)
+    optional_flags = op.optional_flags
+    if lang == "torch":
+        # as in GenredAutograd_base._forward
+        rec_multVar_highdim = options.get("rec_multVar_highdim", False)
+        optional_flags["multVar_highdim"] = int(
+            isinstance(rec_multVar_highdim, int) or rec_multVar_highdim
+        )
+
+    dtypes = dtype if isinstance(dtype, list) else [dtype]
+    backends = backend if isinstance(backend, list) else [backend]
+    backends = [b for backend in backends for b in expand_backend(backend)]
+
+    calls = []
+    for dtype, backend in itertools.product(dtypes, backends):
+        tagCPUGPU, tag1D2D, tagHostDevice = backend_tags(backend, lang)
+        if device_id == -1 and tagCPUGPU == 1:
+            device_id = pykeops.default_device_id
+        args = (
+            tagCPUGPU,
+            tag1D2D,
+            tagHostDevice,
+            use_ranges,
+            device_id,
+            op.formula,
+            op.aliases,
+            op.nargs,
+            dtype,
+            lang,
+            dict(optional_flags),
+        )
+        calls.append(("nvrtc" if tagCPUGPU else "cpp", args))
+    return calls
+
+
+def binder_calls(entry):
+    # list of (binder name, binder arguments) corresponding to a manifest entry
+    if "binder" in entry:
+        entry = from_json(entry)
+        return [(entry["binder"], tuple(entry[name] for name in binder_arg_names))]
+    return genred_binder_calls(**entry)
+
+
+def read_manifest(manifest_file):
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def init_worker(build_folder):
+    # worker processes use the build folder of the main process
+    if build_folder != pykeops.get_build_folder():
+        pykeops.set_build_folder(build_folder)
+
+
+def compile_kernel(binder, args):
+    # compiles - if needed - the kernel corresponding to a call to a binder, and returns its tag
+    from pykeops.common.keops_io import keops_binder
+
+    return keops_binder[binder](*args).params.tag
+
+
+def precompile(manifest, num_workers=None, bundle=False):
+    r"""
+    Compiles in parallel all kernels listed in a manifest.
+
+    Args:
+        manifest (string or list): path of a json manifest file, or list of manifest entries
+            (see the documentation of the module pykeops.precompile for the format of entries).
+
+    Keyword Args:
+        num_workers (int, default None): number of processes used for the compilations ;
+            None means the number of processors of the machine.
+        bundle (bool, default False): if True, all Cpu kernels are compiled together in a
+            single shared object (see pykeops.common.keops_io.LoadKeOps_cpp.compile_bundle).
+
+    Returns:
+        list of the tags (hash codes) of the kernels.
+    """
+    if isinstance(manifest, str):
+        manifest = read_manifest(manifest)
+
+    # remove duplicate calls, e.g. kernels recorded several times
+    calls = {}
+    for entry in manifest:
+        for binder, args in binder_calls(entry):
+            calls.setdefault(binder + str(args), (binder, args))
+    calls = list(calls.values())
+
+    build_folder = pykeops.get_build_folder()
+    pyKeOps_Message(
+        f"Precompiling {len(calls)} kernels in {build_folder} ... ", flush=True
+    )
+    cpp_calls = [args for binder, args in calls if binder == "cpp"]
+    if bundle and cpp_calls:
+        from pykeops.common.keops_io.LoadKeOps_cpp import compile_bundle
+
+        compile_bundle(cpp_calls, num_workers=num_workers)
+    # N.B. kernels of the bundle are already compiled ; the calls below only register them in the cache index
+    # processes are spawned, since forking a process which uses Cuda is not safe
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(build_folder,),
+    ) as executor:
+        tags = list(executor.map(compile_kernel, *zip(*calls))) if calls else []
+    pyKeOps_Message("Precompilation done.", flush=True)
+    return tags
+
+
+class _BinderRecorder:
+    # wraps one of the KeOps binders to record the arguments of all its calls
+    def __init__(self, name, binder, entries):
+        self.name = name
+        self.binder = binder
+        self.entries = entries
+
+    def __call__(self, *args):
+        entry = dict(binder=self.name, **dict(zip(binder_arg_names, args)))
+        entry = to_json(entry)
+        if entry not in self.entries:
+            self.entries.append(entry)
+        return self.binder(*args)
+
+    def call_from(self, owner, key, *args):
+        # N.B. the identity lookup of the binder is bypassed, so that all calls are recorded
+        return self(*args)
+
+    def __getattr__(self, attr):
+        return getattr(self.binder, attr)
+
+
+@contextmanager
+def record_manifest(manifest_file):
+    r"""
+    Context manager recording all kernels used within its scope, and saving them
+    in a manifest file which can be passed to :func:`precompile`. Entries already
+    present in the manifest file are kept.
+
+    Example:
+        >>> with record_manifest("manifest.json"):
+        ...     my_conv(x, y)
+    """
+    from pykeops.common.keops_io import keops_binder
+
+    entries = read_manifest(manifest_file) if os.path.isfile(manifest_file) else []
+    binders = dict(keops_binder)
+    for name, binder in binders.items():
+        keops_binder[name] = _BinderRecorder(name, binder, entries)
+    try:
+        yield entries
+    finally:
+        keops_binder.update(binders)
+        with open(manifest_file, "w") as f:
+            json.dump(entries, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pykeops.precompile",
+        description="Ahead-of-time compilation of KeOps kernels.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_compile = subparsers.add_parser(
+        "compile", help="compile in parallel all kernels listed in a manifest file"
+    )
+    parser_compile.add_argument("manifest", help="path of the json manifest file")
+    parser_compile.add_argument(
+        "-j",
+        "--num-workers",
+        type=int,
+        default=None,
+        help="number of compilation processes (default : number of processors)",
+    )
+    parser_compile.add_argument(
+        "--bundle",
+        action="store_true",
+        help="compile all Cpu kernels together in a single shared object",
+    )
+
+    parser_record = subparsers.add_parser(
+        "record", help="run a Python script and record the kernels it uses"
+    )
+    parser_record.add_argument("manifest", help="path of the json manifest file")
+    parser_record.add_argument("script", help="Python script to run")
+    parser_record.add_argument(
+        "script_args", nargs=argparse.REMAINDER, help="arguments of the script"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        precompile(args.manifest, num_workers=args.num_workers, bundle=args.bundle)
+    elif args.command == "record":
+        sys.argv = [args.script] + args.script_args
+        with record_manifest(args.manifest) as entries:
+            runpy.run_path(args.script, run_name="__main__")
+        pyKeOps_Message(f"{len(entries)} kernels recorded in {args.manifest}.")
+
+
+if __name__ == "__main__":
+    main()
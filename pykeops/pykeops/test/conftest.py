@@ -0,0 +1,21 @@
+import contextlib
+
+import pytest
+
+import keopscore
+
+
+@pytest.fixture
+def keopscore_flags(monkeypatch):
+    # context manager which sets flags of keopscore, e.g.
+    #     with keopscore_flags(use_cpu_simd=False):
+    #         res = op(x, y, backend="CPU")
+    # the flags are restored at the end of the block
+    @contextlib.contextmanager
+    def set_flags(**flags):
+        with monkeypatch.context() as m:
+            for name, value in flags.items():
+                m.setattr(keopscore, name, value)
+            yield
+
+    return set_flags
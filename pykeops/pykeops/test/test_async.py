@@ -0,0 +1,103 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import torch
+
+from pykeops.numpy import Genred, LazyTensor
+from pykeops.torch import Genred as Genred_torch
+from pykeops.torch import LazyTensor as LazyTensor_torch
+
+M, N, D = 100, 200, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, 2)
+
+aliases = [f"x=Vi({D})", f"y=Vj({D})", "b=Vj(2)"]
+
+
+class TestAsync:
+    def test_call_async(self):
+        op = Genred("Exp(-SqDist(x,y))*b", aliases, axis=1)
+        res = op(x, y, b, backend="CPU")
+        futures = [op.call_async(x, y, b * k, backend="CPU") for k in range(4)]
+        for k, future in enumerate(futures):
+            assert isinstance(future, Future)
+            assert np.allclose(future.result(), k * res)
+        # user executor, and exceptions raised by the call
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future = op.call_async(x, y, b, executor=executor, backend="CPU")
+            assert np.allclose(future.result(), res)
+            with pytest.raises(ValueError):
+                op.call_async(x, y, executor=executor).result()
+
+    def test_acall(self):
+        op = Genred("SqDist(x,y)", aliases[:2], "ArgKMin", axis=1, opt_arg=3)
+        res = op(x, y, backend="CPU")
+
+        async def main():
+            return await asyncio.gather(
+                op.acall(x, y, backend="CPU"), op.acall(y, x, backend="CPU")
+            )
+
+        res_1, res_2 = asyncio.run(main())
+        assert np.array_equal(res_1, res)
+        assert np.array_equal(res_2, op(y, x, backend="CPU"))
+
+    def test_torch(self):
+        x_t = torch.tensor(x, requires_grad=True)
+        y_t, b_t = torch.tensor(y), torch.tensor(b)
+        op = Genred_torch("Exp(-SqDist(x,y))*b", aliases, axis=1)
+        res = op(x_t, y_t, b_t, backend="CPU")
+        (g,) = torch.autograd.grad(res.sum(), [x_t])
+        res_a = op.call_async(x_t, y_t, b_t, backend="CPU").result()
+        assert torch.allclose(res_a, res)
+        (g_a,) = torch.autograd.grad(res_a.sum(), [x_t])
+        assert torch.allclose(g_a, g)
+        # the grad mode of the caller is used
+        with torch.no_grad():
+            assert (
+                not op.call_async(x_t, y_t, b_t, backend="CPU").result().requires_grad
+            )
+
+    def test_lazytensor(self):
+        x_i, y_j = LazyTensor(x[:, None, :]), LazyTensor(y[None, :, :])
+        K_ij = (-((x_i - y_j) ** 2).sum(-1)).exp()
+        future = K_ij.sum(1, asynchronous=True, backend="CPU")
+        assert isinstance(future, Future)
+        assert np.allclose(future.result(), K_ij.sum(1, backend="CPU"))
+        future = K_ij.argmin(0, asynchronous=True)
+        assert np.array_equal(future.result(), K_ij.argmin(0))
+
+        x_t, y_t = torch.tensor(x), torch.tensor(y)
+        x_i, y_j = LazyTensor_torch(x_t[:, None, :]), LazyTensor_torch(y_t[None, :, :])
+        D_ij = ((x_i - y_j) ** 2).sum(-1)
+        res = D_ij.logsumexp(1, backend="CPU")
+        assert torch.allclose(D_ij.logsumexp(1, asynchronous=True).result(), res)
+
+    def test_errors(self):
+        x_i = LazyTensor((0, 3, 0))
+        y_j = LazyTensor((1, 3, 1))
+        with pytest.raises(ValueError):
+            ((x_i - y_j) ** 2).sum(1, asynchronous=True)
+
+    def test_concurrent(self):
+        # calls of the same routine with other dtypes, batch dimensions and ranges,
+        # running concurrently in several threads
+        op = Genred("Exp(-SqDist(x,y))*b", aliases, axis=1)
+        x_b, y_b, b_b = x.reshape(4, 25, D), y.reshape(4, 50, D), b.reshape(4, 50, 2)
+        calls = [(x, y, b), (x_b, y_b, b_b)]
+        calls += [tuple(arg.astype("float32") for arg in args) for args in calls]
+        expected = [op(*args, backend="CPU") for args in calls]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                op.call_async(*calls[k % 4], executor=executor, backend="CPU")
+                for k in range(32)
+            ]
+            for k, future in enumerate(futures):
+                res = future.result()
+                assert res.dtype == expected[k % 4].dtype
+                assert np.allclose(res, expected[k % 4], rtol=1e-4)
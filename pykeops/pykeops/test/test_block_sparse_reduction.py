@@ -3,7 +3,6 @@ import numpy as np
 import torch
 from pykeops.torch import LazyTensor
 
-
 # Import clustering functions from KeOps
 from pykeops.torch.cluster import (
     grid_cluster,
@@ -91,5 +90,34 @@ def test_block_sparse_reduction():
     assert rel_error < 0.2, "Relative error {}% is above tolerance".format(rel_error)
 
 
+def test_block_sparse_reduction_uneven_clusters():
+    # many small clusters of very different sizes and costs, some of them empty or
+    # without any interaction, compared with the masked dense reduction
+    M, N, D = 400, 300, 3
+    sizes_i = torch.randint(0, 12, (60,))
+    sizes_i[-1] += M - sizes_i.sum()
+    sizes_j = torch.randint(1, 8, (50,))
+    sizes_j[-1] += N - sizes_j.sum()
+    x_ranges = torch.stack(
+        (sizes_i.cumsum(0) - sizes_i, sizes_i.cumsum(0)), dim=1
+    ).int()
+    y_ranges = torch.stack(
+        (sizes_j.cumsum(0) - sizes_j, sizes_j.cumsum(0)), dim=1
+    ).int()
+    keep = torch.rand(len(sizes_i), len(sizes_j)) < 0.2
+    keep[0, :] = True  # one expensive cluster
+    keep[1, :] = False  # one cluster without interactions
+    ranges_ij = from_matrix(x_ranges, y_ranges, keep)
+
+    x, y, b = torch.randn(M, D), torch.randn(N, D), torch.randn(N, 2)
+    K = (-((LazyTensor(x[:, None, :]) - LazyTensor(y[None, :, :])) ** 2).sum(2)).exp()
+    K.ranges = ranges_ij
+    a = K @ b
+
+    mask = keep.repeat_interleave(sizes_i, dim=0).repeat_interleave(sizes_j, dim=1)
+    K_dense = (-((x[:, None, :] - y[None, :, :]) ** 2).sum(2)).exp() * mask
+    assert torch.allclose(a, K_dense @ b, atol=1e-5)
+
+
 if __name__ == "__main__":
     test_block_sparse_reduction()
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+import pykeops
+from pykeops.common.keops_io.LoadKeOps_cpp import (
+    LoadKeOps_cpp_class,
+    LoadKeOps_cpp_source,
+    compile_bundle,
+)
+from pykeops.precompile import genred_binder_calls
+
+M, N = 50, 60
+
+formula = "Exp(-SqDist(x,y)*IntCst(3))*b"
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(2)"]
+
+np.random.seed(0)
+x = np.random.randn(M, 3)
+y = np.random.randn(N, 3)
+b = np.random.randn(N, 2)
+
+
+class TestBundle:
+    def test_compile_bundle(self):
+        calls = [
+            args
+            for axis in (0, 1)
+            for _, args in genred_binder_calls(
+                formula, aliases, axis=axis, dtype="float64", backend="CPU"
+            )
+        ]
+        tags = compile_bundle(calls)
+        assert len(set(tags)) == 2
+        for args in calls:
+            assert os.path.exists(LoadKeOps_cpp_source(*args).get_dllname())
+
+        from pykeops.numpy import Genred
+
+        res = Genred(formula, aliases, axis=1)(x, y, b, backend="CPU")
+        K = np.exp(-3 * ((x[:, None, :] - y[None, :, :]) ** 2).sum(-1))
+        assert np.allclose(res, K @ b)
+
+    @pytest.mark.parametrize("content", [b"", b"not a shared object"])
+    def test_recompile_invalid_module(self, content):
+        # empty or unloadable module files, e.g. left by an interrupted compilation, are
+        # compiled again ; each case uses its own formula, which is not loaded yet
+        scale = 5 if content else 7
+        calls = genred_binder_calls(
+            f"Exp(-SqDist(x,y)*IntCst({scale}))*b",
+            aliases,
+            axis=1,
+            dtype="float64",
+            backend="CPU",
+        )
+        args = calls[0][1]
+        dllname = LoadKeOps_cpp_source(*args).get_dllname()
+        with open(dllname, "wb") as f:
+            f.write(content)
+
+        LoadKeOps_cpp_class(*args)
+        assert os.path.getsize(dllname) > len(content)
+        assert not any(
+            name.startswith(os.path.basename(dllname) + ".")
+            for name in os.listdir(os.path.dirname(dllname))
+        )
+
+    def test_bundle_grads(self):
+        torch = pytest.importorskip("torch")
+        from pykeops.torch import Genred
+
+        xt, yt, bt = (torch.tensor(v, requires_grad=True) for v in (x, y, b))
+        op = Genred(formula, aliases, axis=1)
+        pykeops.bundle_grads = True
+        try:
+            res = op(xt, yt, bt, backend="CPU")
+        finally:
+            pykeops.bundle_grads = False
+        grads = torch.autograd.grad(res.sum(), [xt, yt, bt])
+
+        K = torch.exp(-3 * ((xt[:, None, :] - yt[None, :, :]) ** 2).sum(-1))
+        res_ref = K @ bt
+        grads_ref = torch.autograd.grad(res_ref.sum(), [xt, yt, bt])
+        assert torch.allclose(res, res_ref)
+        for g, g_ref in zip(grads, grads_ref):
+            assert torch.allclose(g, g_ref)
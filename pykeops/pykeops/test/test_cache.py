@@ -0,0 +1,170 @@
+import gc
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import keopscore
+from keopscore.utils.Cache import (
+    Cache,
+    Cache_partial,
+    cache_stats,
+    env_param,
+    evict_cache,
+    record_bundle,
+)
+
+
+def fake_get_keops_dll(tag, build_folder):
+    # mimics get_keops_dll : writes the files of a kernel and returns a tuple starting with its tag
+    time.sleep(0.1)
+    with open(os.path.join(build_folder, "calls.txt"), "a") as f:
+        f.write(tag + "\n")
+    for ext, size in ((".cpp", 100), (".nfo", 10)):
+        with open(os.path.join(build_folder, tag + ext), "w") as f:
+            f.write("x" * size)
+    return (tag, os.path.join(build_folder, tag + ".cpp"))
+
+
+def calls(build_folder):
+    with open(os.path.join(build_folder, "calls.txt")) as f:
+        return f.read().split()
+
+
+def call_new_cache(build_folder, tag):
+    cache = Cache(fake_get_keops_dll, use_cache_file=True, save_folder=build_folder)
+    return cache(tag, build_folder)
+
+
+class Counted:
+    # mimics the binders : objects built from their arguments, counting the builds
+    builds = 0
+
+    def __init__(self, *args):
+        Counted.builds += 1
+        self.args = args
+
+
+class Owner:
+    pass
+
+
+class TestCache:
+    tags = ["0123456789", "abcdef0123", "fedcba9876"]
+
+    def test_persistent(self, tmp_path):
+        folder = str(tmp_path)
+        res = call_new_cache(folder, self.tags[0])
+        assert call_new_cache(folder, self.tags[0]) == res
+        assert calls(folder) == [self.tags[0]]
+
+    def test_merge(self, tmp_path):
+        # two caches of the same folder, as in two processes, do not overwrite their entries
+        folder = str(tmp_path)
+        cache1 = Cache(fake_get_keops_dll, use_cache_file=True, save_folder=folder)
+        cache2 = Cache(fake_get_keops_dll, use_cache_file=True, save_folder=folder)
+        cache1(self.tags[0], folder)
+        cache2(self.tags[1], folder)
+        for tag in self.tags[:2]:
+            call_new_cache(folder, tag)
+        assert sorted(calls(folder)) == self.tags[:2]
+
+    def test_concurrent(self, tmp_path):
+        folder = str(tmp_path)
+        with multiprocessing.get_context("fork").Pool(4) as pool:
+            res = pool.starmap(call_new_cache, [(folder, self.tags[0])] * 8)
+        assert all(r == res[0] for r in res)
+        assert calls(folder) == [self.tags[0]]
+
+    def test_evict(self, tmp_path):
+        folder = str(tmp_path)
+        for k, tag in enumerate(self.tags):
+            call_new_cache(folder, tag)
+            os.utime(os.path.join(folder, tag + ".nfo"), (k, k))
+        # a new use of the first kernel makes it the most recently used one
+        call_new_cache(folder, self.tags[0])
+        stats = cache_stats(folder)
+        assert stats["kernels"] == 3
+        assert evict_cache(max_size=stats["size"] - 1, build_folder=folder) == [
+            self.tags[1]
+        ]
+        assert not os.path.exists(os.path.join(folder, self.tags[1] + ".cpp"))
+        assert cache_stats(folder)["kernels"] == 2
+        assert evict_cache(max_age=3600, build_folder=folder) == [self.tags[2]]
+        # evicted kernels are compiled again
+        call_new_cache(folder, self.tags[1])
+        assert calls(folder).count(self.tags[1]) == 2
+
+    def test_evict_bundle(self, tmp_path):
+        # the modules of kernels compiled together are links to a common shared object,
+        # which is removed with the last of them
+        folder = str(tmp_path)
+        bundle_file = "pykeops_cpp_bundle_5555555555.so"
+        with open(os.path.join(folder, bundle_file), "w") as f:
+            f.write("x" * 1000)
+        record_bundle(folder, bundle_file, self.tags[:2])
+        for k, tag in enumerate(self.tags):
+            call_new_cache(folder, tag)
+            os.utime(os.path.join(folder, tag + ".nfo"), (k, k))
+        for tag in self.tags[:2]:
+            os.symlink(bundle_file, os.path.join(folder, f"pykeops_cpp_{tag}.so"))
+        stats = cache_stats(folder)
+        assert stats["kernels"] == 3 and stats["bundles"] == 1
+
+        # the bundle is not freed with its first kernel : the second one is evicted too
+        assert evict_cache(max_size=stats["size"] - 1000, build_folder=folder) == [
+            self.tags[0],
+            self.tags[1],
+        ]
+        assert not os.path.exists(os.path.join(folder, bundle_file))
+        stats = cache_stats(folder)
+        assert stats["kernels"] == 1 and stats["bundles"] == 0
+        assert not any(name.startswith("pykeops_cpp") for name in os.listdir(folder))
+
+    def test_fast_library(self):
+        cache = Cache(lambda *args: Counted(*args))
+        Counted.builds = 0
+        # hashable arguments are looked up by the tuple of arguments
+        res = cache("a", 1, (2, 3))
+        assert cache("a", 1, (2, 3)) is res
+        assert len(cache.fast_library) == 1
+        # unhashable arguments use the string key only
+        res = cache("a", [1, 2])
+        assert cache("a", [1, 2]) is res
+        assert len(cache.fast_library) == 1
+        assert Counted.builds == 2
+        cache.reset()
+        assert not cache.fast_library
+
+    def test_call_from(self):
+        cache = Cache_partial(Counted)
+        Counted.builds = 0
+        owner = Owner()
+        args = ("Sum_Reduction(x,0)", ["x=Vi(3)"], {"flag": 0})
+        res = cache.call_from(owner, ("float32",), *args)
+        assert cache.call_from(owner, ("float32",), *args) is res
+        # other owners and callers without owner share the entries of the string key
+        assert cache.call_from(Owner(), ("float32",), *args) is res
+        assert cache.call_from(None, ("float32",), *args) is res
+        assert cache(*args) is res
+        assert Counted.builds == 1
+        assert cache.call_from(owner, ("float64",), *args[:2], {"flag": 1}) is not res
+        # entries of an owner are dropped with it
+        del owner
+        gc.collect()
+        assert len(cache.owner_library) == 0
+
+    def test_env(self, keopscore_flags):
+        cache = Cache_partial(Counted)
+        owner = Owner()
+        args = ("Sum_Reduction(x,0)", ["x=Vi(3)"], {"flag": 0})
+        res = cache.call_from(owner, ("float32",), *args)
+        env = env_param()
+        assert f" use_cpu_simd={keopscore.use_cpu_simd} " in env
+        # a change of the flags changes the keys of the lookups by identity
+        with keopscore_flags(use_cpu_simd=not keopscore.use_cpu_simd):
+            assert env_param() != env
+            assert cache.call_from(owner, ("float32",), *args) is not res
+        assert env_param() is env
+        assert cache.call_from(owner, ("float32",), *args) is res
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from keopscore.formulas.factorization.Hoist import hoist_subformulas
+from keopscore.formulas.GetReduction import GetReduction
+from keopscore.mapreduce.cpu.CpuReduc_tiled import CpuReduc_tiled
+from pykeops.numpy import Genred
+
+M, N, D = 143, 1001, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, 2)
+g = np.random.rand(1)
+
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(2)", "g=Pm(1)"]
+
+
+class TestCpuHoist:
+    def test_hoist_subformulas(self):
+        red_formula = GetReduction(
+            "Sum_Reduction(Exp(-g*SqNorm2(x))*Exp(-SqDist(x,y))*Rsqrt(Sum(x*x)+g),0)",
+            aliases=["x=Var(0,3,0)", "y=Var(1,3,1)", "g=Var(2,1,2)"],
+        )
+        formula, hoisted = hoist_subformulas(red_formula.formula, (0, 2), 3)
+        assert len(hoisted) == 2
+        assert [v.ind for v, _ in hoisted] == [3, 4]
+        assert all(v.cat == 3 for v, _ in hoisted)
+        assert all(v.cat != 1 for _, f in hoisted for v in f.Vars_)
+        # the formula evaluated in the loop over j only depends on y and the new variables
+        assert set(v.ind for v in formula.Vars_) == {0, 1, 3, 4}
+
+    @pytest.mark.parametrize(
+        "formula",
+        [
+            "Exp(-g*SqNorm2(x))*Exp(-SqDist(x,y))*b",
+            "Rsqrt(Sum(x*x)+g)*Exp(-SqDist(x/Sqrt(SqNorm2(x)),y))*b",
+            "Exp(x|x)*b+Log(IntCst(2))*Sum(x)",
+        ],
+    )
+    @pytest.mark.parametrize("backend", ["CPU", "CPU_tiled"])
+    def test_sum(self, formula, backend, keopscore_flags):
+        op = Genred(formula, aliases, reduction_op="Sum", axis=1)
+        with keopscore_flags(hoist_invariants=False):
+            res = op(x, y, b, g, backend=backend)
+        with keopscore_flags(hoist_invariants=True):
+            res_hoist = op(x, y, b, g, backend=backend)
+        assert np.allclose(res, res_hoist, rtol=1e-12, atol=1e-12)
+
+    def test_tiled_code(self, keopscore_flags):
+        # in the tiled scheme, the subformulas which only depend on "i" variables are
+        # evaluated once per index i, before the loop over the tiles of "j" columns
+        with keopscore_flags(hoist_invariants=True):
+            reduc = CpuReduc_tiled(
+                "Sum_Reduction(Exp(-g*SqNorm2(x))*Exp(-SqDist(x,y))*b,0)",
+                ["x=Var(0,3,0)", "y=Var(1,3,1)", "b=Var(2,2,1)", "g=Var(3,1,2)"],
+                *(4, "double", "double", "block_sum", 1, 0, 0, 0, 0, -1),
+            )
+            reduc.get_code()
+        # N.B. the code of the tiled kernel is followed by the one of the split j scheme
+        code = reduc.code.split("CpuConv_split_j", 1)[0]
+        code_block, code_tiles = code.split("for (signed long int jstart", 1)
+        # the parameter g only appears in the hoisted subformula
+        assert "Var(3,1,2)" in code_block
+        assert "Var(3,1,2)" not in code_tiles
+
+    def test_reductions(self, keopscore_flags):
+        # reduction over i : the hoisted subformulas depend on the j variables
+        op = Genred(
+            "Exp(-g*SqNorm2(x))*SqDist(x,y)",
+            aliases[:2] + ["g=Pm(1)"],
+            "ArgKMin",
+            axis=0,
+            opt_arg=3,
+        )
+        with keopscore_flags(hoist_invariants=False):
+            res = op(x, y, g, backend="CPU")
+        with keopscore_flags(hoist_invariants=True):
+            assert np.array_equal(res, op(x, y, g, backend="CPU"))
+            # the whole formula does not depend on j
+            op = Genred("-SqNorm2(x)", ["x=Vi(3)", "y=Vj(3)"], "LogSumExp", axis=1)
+            res = op(x, y, backend="CPU")
+        assert np.allclose(res.ravel(), -(x**2).sum(1) + np.log(N))
+
+    def test_ranges(self, keopscore_flags):
+        # batch dimensions use the scheme with ranges
+        op = Genred("Exp(-g*SqNorm2(x))*Exp(-SqDist(x,y))*b", aliases, axis=1)
+        xb, yb, bb = x[None, :140].reshape(2, 70, D), y[None, :1000], b[None, :1000]
+        with keopscore_flags(hoist_invariants=False):
+            res = op(xb, yb, bb, g, backend="CPU")
+        with keopscore_flags(hoist_invariants=True):
+            res_hoist = op(xb, yb, bb, g, backend="CPU")
+        assert np.allclose(res, res_hoist, rtol=1e-12, atol=1e-12)
+
+    @pytest.mark.parametrize(
+        "formula",
+        [
+            "Exp(-SqDist(x,y))*Exp(b)*Rsqrt(SqNorm2(y)+g)",
+            "Exp(-SqDist(x/Sqrt(SqNorm2(x)),y/Sqrt(SqNorm2(y))))*b",
+        ],
+    )
+    @pytest.mark.parametrize("backend", ["CPU", "CPU_tiled"])
+    def test_precompute_j(self, formula, backend, keopscore_flags):
+        # subformulas which only depend on j variables are computed in a linear pass
+        op = Genred(formula, aliases, reduction_op="Sum", axis=1)
+        with keopscore_flags(hoist_invariants=False):
+            res = op(x, y, b, g, backend=backend)
+        with keopscore_flags(hoist_invariants=True):
+            res_hoist = op(x, y, b, g, backend=backend)
+        assert np.allclose(res, res_hoist, rtol=1e-12, atol=1e-12)
+        # reduction over i, and few outputs with the j range split across threads
+        op = Genred(formula, ["x=Vj(3)", "y=Vi(3)", "b=Vi(2)", "g=Pm(1)"], axis=0)
+        yl, bl = np.random.randn(5000, D), np.random.randn(5000, 2)
+        for args in [(x, y, b, g), (x[:2], yl, bl, g)]:
+            with keopscore_flags(hoist_invariants=False):
+                res = op(*args, backend=backend)
+            with keopscore_flags(hoist_invariants=True):
+                res_hoist = op(*args, backend=backend, num_threads=4)
+            assert np.allclose(res, res_hoist, rtol=1e-12, atol=1e-12)
+
+    def test_grad(self, keopscore_flags):
+        # the backward formulas are compiled with the same passes
+        import torch
+        from pykeops.torch import Genred as Genred_torch
+
+        op = Genred_torch(
+            "Exp(-g*SqNorm2(x))*Exp(-SqDist(x,y))*Exp(b)", aliases, axis=1
+        )
+        x_t, y_t = torch.tensor(x, requires_grad=True), torch.tensor(y)
+        b_t, g_t = torch.tensor(b, requires_grad=True), torch.tensor(g)
+        grads = []
+        for hoist in [False, True]:
+            with keopscore_flags(hoist_invariants=hoist):
+                res = op(x_t, y_t, b_t, g_t, backend="CPU")
+                grads.append(torch.autograd.grad((res**2).sum(), [x_t, b_t]))
+        for g_0, g_1 in zip(*grads):
+            assert torch.allclose(g_0, g_1, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from keopscore.formulas.factorization.InnerProducts import expand_inner_products
+from keopscore.formulas.GetReduction import GetReduction
+from pykeops.numpy import Genred
+
+M, N, D = 143, 1001, 32
+
+np.random.seed(0)
+x = np.random.randn(M, D) / 4
+y = np.random.randn(N, D) / 4
+b = np.random.randn(N, 2)
+e = np.random.randn(M, 2)
+
+aliases = [f"x=Vi({D})", f"y=Vj({D})", "b=Vj(2)", "e=Vi(2)"]
+
+
+class TestCpuInnerProducts:
+    def test_expand_inner_products(self):
+        formula = GetReduction(
+            "Sum_Reduction(Exp(-SqDist(x,y))*(x|y)*(z|y)+SqDist(x,z),0)",
+            aliases=["x=Var(0,16,0)", "y=Var(1,16,1)", "z=Var(2,16,0)"],
+        ).formula
+        new_formula, dots = expand_inner_products(formula, 0, 1, 3, 16)
+        # <x,y> is shared by SqDist(x,y) and (x|y) ; SqDist(x,z) is left in place
+        assert sorted((xv.ind, yv.ind) for _, xv, yv in dots) == [(0, 1), (2, 1)]
+        assert sorted(v.ind for v, _, _ in dots) == [3, 4]
+        assert all(v.cat == 3 and v.dim == 1 for v, _, _ in dots)
+        assert "ReLU" in str(new_formula)
+        # small dimensions are not expanded
+        assert expand_inner_products(formula, 0, 1, 3, 32) == (formula, [])
+
+    @pytest.mark.parametrize(
+        "formula",
+        [
+            "Exp(-SqDist(x,y))*b",
+            "Exp(x|y)*b+SqDist(y,x)*b",
+            "Grad(Exp(-SqDist(x,y))*b,x,e)",
+        ],
+    )
+    @pytest.mark.parametrize("dtype", ["float32", "float64"])
+    def test_sum(self, formula, dtype, keopscore_flags):
+        op = Genred(formula, aliases, reduction_op="Sum", axis=1)
+        args = [arg.astype(dtype) for arg in (x, y, b, e)]
+        with keopscore_flags(expand_inner_products=False):
+            res = op(*args, backend="CPU_tiled")
+        with keopscore_flags(expand_inner_products=True):
+            res_expand = op(*args, backend="CPU_tiled")
+        tol = 1e-4 if dtype == "float32" else 1e-10
+        assert np.allclose(res, res_expand, rtol=tol, atol=tol)
+
+    def test_argkmin(self, keopscore_flags):
+        # K nearest neighbours, with reductions over i and j
+        for axis in [0, 1]:
+            op = Genred("SqDist(x,y)", aliases[:2], "ArgKMin", axis=axis, opt_arg=5)
+            with keopscore_flags(expand_inner_products=False):
+                res = op(x, y, backend="CPU_tiled")
+            with keopscore_flags(expand_inner_products=True):
+                assert np.array_equal(res, op(x, y, backend="CPU_tiled"))
+
+    def test_distance_to_self(self, keopscore_flags):
+        # N.B. the expanded squared distances are clamped to zero
+        op = Genred("Sqrt(SqDist(x,y))", [f"x=Vi({D})", f"y=Vj({D})"], axis=1)
+        with keopscore_flags(expand_inner_products=True):
+            res = op(y, y, backend="CPU_tiled")
+        assert not np.isnan(res).any()
+        with keopscore_flags(expand_inner_products=False):
+            res_direct = op(y, y, backend="CPU_tiled")
+        assert np.allclose(res, res_direct, rtol=1e-6, atol=1e-6)
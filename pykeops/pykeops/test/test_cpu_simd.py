@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+import keopscore
+from pykeops.numpy import Genred
+
+M, N, D = 143, 1001, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, 2)
+
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(2)"]
+
+
+class TestCpuSimd:
+    @pytest.mark.parametrize(
+        "formula", ["Inv(IntCst(1)+SqDist(x,y))*b", "Exp(-SqDist(x,y))*(x|y)*b"]
+    )
+    @pytest.mark.parametrize("backend", ["CPU", "CPU_tiled"])
+    def test_sum(self, formula, backend, keopscore_flags):
+        op = Genred(formula, aliases, reduction_op="Sum", axis=1)
+        with keopscore_flags(use_cpu_simd=False):
+            res_scalar = op(x, y, b, backend=backend)
+        with keopscore_flags(use_cpu_simd=True):
+            res_simd = op(x, y, b, backend=backend)
+        assert np.allclose(res_scalar, res_simd, rtol=1e-12, atol=1e-12)
+
+    @pytest.mark.skipif(
+        not os.path.exists("/proc/cpuinfo")
+        or "avx2" not in open("/proc/cpuinfo").read(),
+        reason="AVX2 is not available",
+    )
+    @pytest.mark.parametrize("dtype", ["float32", "float64"])
+    def test_math_functions(self, dtype, keopscore_flags, monkeypatch):
+        # with vector units of 256 bits, exp and log are computed by the vectorized
+        # functions of keopscore/include/cpu_math.h
+        config = keopscore.config
+        monkeypatch.setattr(config, "cpp_flags", config.cpp_flags + " -mavx2 -mfma")
+        op = Genred(
+            "(Exp(-SqDist(x,y))+Log(IntCst(1)+SqDist(x,y))+XLogX(SqDist(x,y)))*b",
+            aliases,
+            axis=1,
+        )
+        args = [arg.astype(dtype) for arg in (x, y, b)]
+        with keopscore_flags(use_cpu_simd=False):
+            res_scalar = op(*args, backend="CPU")
+        with keopscore_flags(use_cpu_simd=True):
+            res_simd = op(*args, backend="CPU")
+        d2 = ((x[:, None, :] - y[None, :, :]) ** 2).sum(-1)
+        expected = (np.exp(-d2) + np.log(1 + d2) + d2 * np.log(d2)) @ b
+        tol = 1e-4 if dtype == "float32" else 1e-12
+        for res in [res_scalar, res_simd]:
+            assert np.allclose(res, expected, rtol=tol, atol=tol)
+
+    def test_argkmin(self, keopscore_flags):
+        op = Genred(
+            "SqDist(x,y)", ["x=Vi(3)", "y=Vj(3)"], reduction_op="ArgKMin", opt_arg=3
+        )
+        with keopscore_flags(use_cpu_simd=False):
+            res_scalar = op(x, y, backend="CPU")
+        with keopscore_flags(use_cpu_simd=True):
+            res_simd = op(x, y, backend="CPU")
+        assert np.array_equal(res_scalar, res_simd)
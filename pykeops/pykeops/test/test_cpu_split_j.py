@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from pykeops.numpy import Genred
+
+# few outputs and many "j" indices : with more threads than outputs, the "j" range
+# is split across threads and the partial results are merged
+M, N, D = 5, 20000, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, 2)
+
+aliases = ["x=Vi(3)", "y=Vj(3)"]
+sqdist = ((x[:, None, :] - y[None, :, :]) ** 2).sum(-1)
+
+
+def check_reductions():
+    for sum_scheme in ["direct_sum", "block_sum", "kahan_scheme"]:
+        op = Genred(
+            "Exp(-SqDist(x,y))*b",
+            aliases + ["b=Vj(2)"],
+            reduction_op="Sum",
+            axis=1,
+            sum_scheme=sum_scheme,
+        )
+        assert np.allclose(op(x, y, b, backend="CPU"), np.exp(-sqdist) @ b)
+        # the axis=0 reduction of the transposed problem is also split
+        op = Genred(
+            "Exp(-SqDist(x,y))*b",
+            ["x=Vj(3)", "y=Vi(3)", "b=Vi(2)"],
+            reduction_op="Sum",
+            axis=0,
+            sum_scheme=sum_scheme,
+        )
+        assert np.allclose(op(x, y, b, backend="CPU_tiled"), np.exp(-sqdist) @ b)
+
+    op = Genred("-SqDist(x,y)", aliases, reduction_op="LogSumExp", axis=1)
+    lse = np.log(np.exp(-sqdist).sum(1))
+    assert np.allclose(op(x, y, backend="CPU").ravel(), lse)
+
+    op = Genred("SqDist(x,y)", aliases, reduction_op="Min_ArgMin", axis=1)
+    val, ind = op(x, y, backend="CPU")
+    assert np.allclose(val.ravel(), sqdist.min(1))
+    assert np.array_equal(ind.ravel(), sqdist.argmin(1))
+
+    op = Genred("SqDist(x,y)", aliases, reduction_op="ArgKMin", opt_arg=5, axis=1)
+    assert np.array_equal(op(x, y, backend="CPU"), np.argsort(sqdist, 1)[:, :5])
+
+
+class TestCpuSplitJ:
+    def test_reductions(self):
+        check_reductions()
+
+    @pytest.mark.parametrize("nthreads", ["3", "16"])
+    def test_reductions_threads(self, nthreads):
+        # the number of OpenMP threads is fixed when the runtime starts
+        env = dict(os.environ, OMP_NUM_THREADS=nthreads)
+        subprocess.run([sys.executable, __file__], env=env, check=True)
+
+
+if __name__ == "__main__":
+    check_reductions()
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from pykeops.numpy import Genred
+
+M, N, D = 157, 1203, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, 2)
+
+formula = "Exp(-SqDist(x,y))*b"
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(2)"]
+
+
+class TestCpuTiled:
+    @pytest.mark.parametrize("dtype", ["float32", "float64"])
+    @pytest.mark.parametrize("axis", [0, 1])
+    @pytest.mark.parametrize("sum_scheme", ["direct_sum", "block_sum", "kahan_scheme"])
+    def test_sum(self, dtype, axis, sum_scheme):
+        args = (x.astype(dtype), y.astype(dtype), b.astype(dtype))
+        op = Genred(
+            formula, aliases, reduction_op="Sum", axis=axis, sum_scheme=sum_scheme
+        )
+        res_ref = op(*args, backend="CPU")
+        res_tiled = op(*args, backend="CPU_tiled")
+        rtol = 1e-4 if dtype == "float32" else 1e-10
+        assert np.allclose(res_ref, res_tiled, rtol=rtol, atol=rtol)
+
+    @pytest.mark.parametrize("reduction_op", ["LogSumExp", "Min"])
+    def test_other_reductions(self, reduction_op):
+        op = Genred("-SqDist(x,y)", ["x=Vi(3)", "y=Vj(3)"], reduction_op=reduction_op)
+        res_ref = op(x, y, backend="CPU")
+        res_tiled = op(x, y, backend="CPU_tiled")
+        assert np.allclose(res_ref, res_tiled)
+
+    def test_argkmin(self):
+        op = Genred(
+            "SqDist(x,y)", ["x=Vi(3)", "y=Vj(3)"], reduction_op="ArgKMin", opt_arg=5
+        )
+        res_ref = op(x, y, backend="CPU")
+        res_tiled = op(x, y, backend="CPU_tiled")
+        assert np.array_equal(res_ref, res_tiled)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from keopscore.formulas.factorization.CSE import (
+    FormulaDAG,
+    common_subformulas,
+    cse_stats,
+)
+from keopscore.formulas.GetReduction import GetReduction
+from pykeops.numpy import Genred
+
+M, N, D = 143, 1001, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, D)
+e = np.random.randn(M, D)
+
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(3)", "e=Vi(3)"]
+
+formulas = [
+    "Grad(Exp(-SqDist(x,y))*b,x,e)",
+    "Grad(Grad(Exp(-SqDist(x,y))*b,x,e),x,e)",
+    "Laplacian(Exp(-SqDist(x,y)),x)*b",
+    "Exp(-SqDist(x,y))*(x-y)+Sqrt(SqDist(x,y))*b",
+]
+
+
+class TestCSE:
+    def test_dag(self):
+        formula = GetReduction(
+            "Sum_Reduction(Exp(-SqDist(x,y))*(x-y)+Sqrt(SqDist(x,y))*y,0)",
+            aliases=["x=Var(0,3,0)", "y=Var(1,3,1)"],
+        ).formula
+        dag = FormulaDAG(formula)
+        # x, y, x-y, Square, Sum, Minus, Exp, Mult, Sqrt, Mult, Add
+        assert len(dag.nodes) == 11
+        assert dag.num_evaluations == 13
+        new_formula, subformulas, removed = common_subformulas(formula)
+        # x-y and SqDist(x,y)=Sum(Square(x-y)) are evaluated once
+        assert len(subformulas) == 2
+        assert removed == 4
+        assert all(v.cat == 3 and v.ind < 0 for v, _ in subformulas)
+        assert cse_stats(formula) == dict(
+            evaluations=13, evaluations_cse=9, removed=4, shared_subformulas=2
+        )
+
+    def test_second_order(self):
+        formula = GetReduction(
+            "Sum_Reduction(Grad(Grad(Exp(-SqDist(x,y))*b,x,e),x,e),0)",
+            aliases=["x=Var(0,3,0)", "y=Var(1,3,1)", "b=Var(2,3,1)", "e=Var(3,3,0)"],
+        ).formula
+        assert cse_stats(formula)["removed"] > 0
+
+    @pytest.mark.parametrize("formula", formulas)
+    @pytest.mark.parametrize("backend", ["CPU", "CPU_tiled"])
+    def test_sum(self, formula, backend, keopscore_flags):
+        op = Genred(formula, aliases, reduction_op="Sum", axis=1)
+        with keopscore_flags(eliminate_common_subformulas=False):
+            res = op(x, y, b, e, backend=backend)
+        with keopscore_flags(eliminate_common_subformulas=True):
+            res_cse = op(x, y, b, e, backend=backend)
+        assert np.allclose(res, res_cse, rtol=1e-12, atol=1e-12)
+
+    def test_ranges(self, keopscore_flags):
+        op = Genred(formulas[1], aliases, axis=1)
+        xb, eb = x[None, :140].reshape(2, 70, D), e[None, :140].reshape(2, 70, D)
+        yb, bb = y[None, :1000], b[None, :1000]
+        with keopscore_flags(eliminate_common_subformulas=False):
+            res = op(xb, yb, bb, eb, backend="CPU")
+        with keopscore_flags(eliminate_common_subformulas=True):
+            res_cse = op(xb, yb, bb, eb, backend="CPU")
+        assert np.allclose(res, res_cse, rtol=1e-12, atol=1e-12)
+
+    def test_auto_factorize(self, keopscore_flags):
+        # the formulas may already contain Factorize operations
+        op = Genred(formulas[2], aliases, axis=1)
+        with keopscore_flags(eliminate_common_subformulas=False):
+            res = op(x, y, b, e, backend="CPU")
+        with keopscore_flags(eliminate_common_subformulas=True, auto_factorize=True):
+            res_cse = op(x, y, b, e, backend="CPU")
+        assert np.allclose(res, res_cse, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,96 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from pykeops.distributed import LocalTransport, TorchDistributedTransport, reduce
+from pykeops.numpy import Genred
+
+M, N, D = 40, 500, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+
+aliases = [f"x=Vi({D})", f"y=Vj({D})"]
+
+reductions = [
+    ("Exp(-SqDist(x,y))", "Sum", None),
+    ("-SqDist(x,y)", "LogSumExp", None),
+    ("SqDist(x,y)", "ArgMin", None),
+    ("SqDist(x,y)", "KMin_ArgKMin", 4),
+]
+
+
+def check_reductions(transport, genred=Genred, args=(x, y), **kwargs):
+    for formula, reduction_op, opt_arg in reductions:
+        op = genred(formula, aliases, reduction_op, axis=1, opt_arg=opt_arg)
+        res = op(*args, backend="CPU")
+        res_d = reduce(op, *args, transport=transport, backend="CPU", **kwargs)
+        res, res_d = (res, res_d) if isinstance(res, tuple) else ((res,), (res_d,))
+        for r, r_d in zip(res, res_d):
+            assert type(r) is type(r_d)
+            assert r.shape == r_d.shape and r.dtype == r_d.dtype
+            assert np.allclose(r, r_d)
+
+
+class TestDistributed:
+    @pytest.mark.parametrize("shards, output_shards", [(1, 1), (3, 1), (4, 3)])
+    def test_sequential(self, shards, output_shards):
+        check_reductions(None, shards=shards, output_shards=output_shards)
+
+    def test_local_processes(self):
+        with LocalTransport(num_workers=2) as transport:
+            check_reductions(transport, output_shards=2, num_threads=1)
+
+    def test_torch_routine(self):
+        import torch
+        from pykeops.torch import Genred as TorchGenred
+
+        args = (torch.from_numpy(x), torch.from_numpy(y))
+        check_reductions(None, TorchGenred, args, shards=3, output_shards=2)
+        # numpy arrays are not converted to tensors
+        op = TorchGenred("SqDist(x,y)", aliases, "Sum", axis=1)
+        with pytest.raises(TypeError):
+            reduce(op, x, y)
+
+    def test_torch_local_processes(self):
+        import torch
+        from pykeops.torch import Genred as TorchGenred
+
+        # the routine and the tensors of the shards are pickled to the worker processes
+        op = TorchGenred("SqDist(x,y)", aliases, "Sum", axis=1)
+        assert vars(pickle.loads(pickle.dumps(op))) == vars(op)
+        args = (torch.from_numpy(x), torch.from_numpy(y))
+        with LocalTransport(num_workers=2) as transport:
+            check_reductions(
+                transport, TorchGenred, args, output_shards=2, num_threads=1
+            )
+
+    def test_torch_distributed(self, tmp_path):
+        # processes of a gloo process group, initialized with a shared file
+        world_size = 2
+        procs = [
+            subprocess.Popen(
+                [sys.executable, __file__, str(rank), str(world_size), str(tmp_path)]
+            )
+            for rank in range(world_size)
+        ]
+        assert all(proc.wait(timeout=600) == 0 for proc in procs)
+
+
+if __name__ == "__main__":
+    import torch.distributed as dist
+
+    rank, world_size, folder = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+    dist.init_process_group(
+        "gloo",
+        init_method="file://" + os.path.join(folder, "init"),
+        rank=rank,
+        world_size=world_size,
+    )
+    check_reductions(TorchDistributedTransport(), shards=3)
+    dist.destroy_process_group()
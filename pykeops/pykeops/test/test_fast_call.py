@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from pykeops.numpy import Genred
+from pykeops.common.keops_io.LoadKeOps_cpp import LoadKeOps_cpp_class
+
+M, N = 30, 40
+
+np.random.seed(0)
+x = np.random.randn(M, 3)
+y = np.random.randn(N, 3)
+b = np.random.randn(N, 2)
+
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(2)"]
+
+
+class TestFastCall:
+    @pytest.mark.parametrize("axis", [0, 1])
+    @pytest.mark.parametrize("backend", ["CPU", "CPU_tiled"])
+    def test_fast_call(self, axis, backend, monkeypatch):
+        op = Genred("Exp(-SqDist(x,y))*b", aliases, reduction_op="Sum", axis=axis)
+        res_fast = op(x, y, b, backend=backend)
+        assert op.myconv.launch_keops_cpu_fast is not None
+        monkeypatch.setattr(LoadKeOps_cpp_class, "fast_call", False)
+        res = op(x, y, b, backend=backend)
+        assert np.array_equal(res_fast, res)
+
+    def test_out(self, monkeypatch):
+        op = Genred("Exp(-SqDist(x,y))*b", aliases, reduction_op="Sum", axis=1)
+        out = np.zeros((M, 2))
+        res = op(x, y, b, backend="CPU", out=out)
+        assert res is out
+        monkeypatch.setattr(LoadKeOps_cpp_class, "fast_call", False)
+        assert np.array_equal(out, op(x, y, b, backend="CPU"))
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import torch
+
+from pykeops.common.incremental import IncrementalReduction
+from pykeops.numpy import Genred, LazyTensor
+from pykeops.torch import LazyTensor as LazyTensor_torch
+
+M, N, D = 30, 200, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, 2)
+y_new, b_new = np.random.randn(50, D), np.random.randn(50, 2)
+
+aliases = [f"x=Vi({D})", f"y=Vj({D})", "b=Vj(2)"]
+
+
+def as_tuple(res):
+    return res if isinstance(res, tuple) else (res,)
+
+
+class TestIncremental:
+    @pytest.mark.parametrize(
+        "formula, reduction_op, opt_arg",
+        [
+            ("Exp(-SqDist(x,y))*b", "Sum", None),
+            ("-SqDist(x,y)", "LogSumExp", None),
+            ("SqDist(x,y)*b", "Min", None),
+            ("SqDist(x,y)*b", "ArgMin", None),
+            ("SqDist(x,y)", "KMin_ArgKMin", 3),
+        ],
+    )
+    def test_append_remove(self, formula, reduction_op, opt_arg):
+        op = Genred(formula, aliases, reduction_op, axis=1, opt_arg=opt_arg)
+        inc = IncrementalReduction(op, x, y, b, backend="CPU")
+        inc.append(y_new, b_new)
+        y_all, b_all = np.concatenate((y, y_new)), np.concatenate((b, b_new))
+        res = op(x, y_all, b_all, backend="CPU")
+        for r, r_i in zip(as_tuple(res), as_tuple(inc.result())):
+            assert r.shape == r_i.shape and r.dtype == r_i.dtype
+            assert np.allclose(r, r_i)
+        # removal of the nearest neighbours of some x_i, which changes their extrema
+        sqdist = ((x[:, None, :] - y_all[None, :, :]) ** 2).sum(-1)
+        removed = np.concatenate((sqdist[:5].argmin(1), np.arange(10, 60)))
+        inc.remove(removed)
+        keep = np.setdiff1d(np.arange(N + 50), removed)
+        assert inc.size == len(keep)
+        res = op(x, y_all[keep], b_all[keep], backend="CPU")
+        for r, r_i in zip(as_tuple(res), as_tuple(inc.result())):
+            assert np.allclose(r, r_i)
+
+    def test_logsumexp_cancellation(self):
+        # the removed point carries almost all the sum of the first row
+        op = Genred("-SqDist(x,y)", aliases[:2], "LogSumExp", axis=1)
+        y_ = y.copy()
+        y_[7] = x[0]
+        inc = IncrementalReduction(op, x, y_ * 10, backend="CPU")
+        y_[7] = 100
+        res = op(x, np.delete(y_ * 10, 7, axis=0), backend="CPU")
+        assert np.allclose(inc.remove([7]).result(), res)
+
+    def test_lazytensor(self):
+        x_i, y_j = LazyTensor(x[:, None, :]), LazyTensor(y[None, :, :])
+        D_ij = ((x_i - y_j) ** 2).sum(-1)
+        inc = (-D_ij).logsumexp(dim=1, incremental=True, backend="CPU")
+        (y_all,) = inc.append(y_new).points
+        res = (-((x_i - LazyTensor(y_all[None, :, :])) ** 2).sum(-1)).logsumexp(dim=1)
+        assert np.allclose(inc.result(), res)
+        # torch
+        x_t, y_t = torch.tensor(x), torch.tensor(y)
+        x_i, y_j = LazyTensor_torch(x_t[:, None, :]), LazyTensor_torch(y_t[None, :, :])
+        inc = ((x_i - y_j) ** 2).sum(-1).argKmin(4, dim=1, incremental=True)
+        inc.remove(torch.arange(20))
+        y_j = LazyTensor_torch(y_t[None, 20:, :])
+        res = ((x_i - y_j) ** 2).sum(-1).argKmin(4, dim=1)
+        assert torch.equal(inc.result(), res)
+
+    def test_fewer_points_than_k(self):
+        # with fewer points than K, the last indices may be invalid (-1)
+        op = Genred("SqDist(x,y)", aliases[:2], "KMin_ArgKMin", axis=1, opt_arg=5)
+        inc = IncrementalReduction(op, x, y[:3], backend="CPU")
+        vals, inds = inc.state
+        inc.state = (vals, np.where(vals == np.inf, -1, inds))
+        vals, inds = inc.remove([0]).result()
+        res_vals, res_inds = op(x, y[1:3], backend="CPU")
+        assert np.allclose(vals, res_vals)
+        assert np.array_equal(inds[:, :2], res_inds[:, :2])
+
+    def test_lazytensor_errors(self):
+        x_i, y_j = LazyTensor(x[:, None, :]), LazyTensor(y[None, :, :])
+        D_ij = ((x_i - y_j) ** 2).sum(-1)
+        # block-sparse ranges are not ignored
+        D_ij.ranges = (np.zeros((1, 2), dtype="int32"),) * 6
+        with pytest.raises(ValueError):
+            (-D_ij).logsumexp(dim=1, incremental=True, backend="CPU")
+        # Sum(K*V) with a high dimensional variable V is computed as Sum(K)*V
+        v_j = LazyTensor(np.random.randn(1, N, 101))
+        K_ij = (-((x_i - y_j) ** 2).sum(-1)).exp()
+        with pytest.raises(ValueError):
+            (K_ij * v_j).sum(dim=0, incremental=True, backend="CPU")
@@ -0,0 +1,131 @@
+import numpy as np
+import torch
+
+from pykeops.numpy import KernelSolve as KernelSolve_np
+from pykeops.torch import KernelSolve
+
+N, D, Dv = 200, 3, 4
+
+formula = "Exp(-SqDist(x,y)/2)*a"
+aliases = [f"x=Vi({D})", f"y=Vj({D})", f"a=Vj({Dv})"]
+alpha = 0.1
+
+
+def gaussian_matrix(x):
+    return np.exp(-((x[:, None, :] - x[None, :, :]) ** 2).sum(-1) / 2)
+
+
+class TestKernelSolve:
+    x = np.random.rand(N, D)
+    b = np.random.randn(N, Dv)
+    # columns of very different scales, which converge at different iterations
+    b[:, 0] *= 1e3
+
+    def solve(self, **kwargs):
+        Kinv = KernelSolve_np(formula, aliases, "a", axis=1)
+        return Kinv(self.x, self.x, self.b, alpha=alpha, backend="CPU", **kwargs)
+
+    def test_multi_rhs(self):
+        a, info = self.solve(eps=1e-8, return_info=True)
+        a_ref = np.linalg.solve(gaussian_matrix(self.x) + alpha * np.eye(N), self.b)
+        assert info["converged"]
+        assert info["residuals"].shape == (Dv,)
+        assert np.allclose(a, a_ref, rtol=1e-4, atol=1e-6)
+
+    def test_warm_start(self):
+        a, info = self.solve(eps=1e-8, return_info=True)
+        # a small perturbation of the right-hand side converges faster from the previous solution
+        self.b += 1e-3 * np.random.randn(N, Dv)
+        _, info_cold = self.solve(eps=1e-8, return_info=True)
+        _, info_warm = self.solve(eps=1e-8, x0=a, return_info=True)
+        assert info_warm["converged"]
+        assert info_warm["iterations"] < info_cold["iterations"]
+        # initial guess which is already a solution
+        _, info = self.solve(eps=1e-8, x0=self.solve(eps=1e-10), return_info=True)
+        assert info["iterations"] == 0
+
+    def test_maxiter_rtol(self):
+        _, info = self.solve(eps=1e-8, maxiter=2, return_info=True)
+        assert info["iterations"] == 2 and not info["converged"]
+        a, info = self.solve(eps=0, rtol=1e-4, return_info=True)
+        assert info["converged"]
+        assert np.all(info["residuals"] <= 1e-4 * np.linalg.norm(self.b, axis=0))
+
+    def test_torch(self):
+        x = torch.tensor(self.x, requires_grad=True)
+        b = torch.tensor(self.b)
+        Kinv = KernelSolve(formula, aliases, "a", axis=1)
+        a = Kinv(x, x, b, alpha=alpha, eps=1e-8, backend="CPU")
+        a_warm, info = Kinv(
+            x, x, b, alpha=alpha, eps=1e-8, x0=a.detach(), return_info=True
+        )
+        assert info["iterations"] <= 1
+        assert torch.allclose(a, a_warm)
+        # the warm start of the forward solve does not change the gradients
+        (g,) = torch.autograd.grad(a.sum(), x)
+        (g_warm,) = torch.autograd.grad(a_warm.sum(), x)
+        assert torch.allclose(g, g_warm, rtol=1e-4, atol=1e-6)
+
+    def test_separable(self):
+        Kinv = KernelSolve_np(formula, aliases, "a", axis=1)
+        assert Kinv.separable
+        Kinv = KernelSolve_np("a*(-Exp(-SqDist(x,y)/2))", aliases, "a", axis=1)
+        assert Kinv.separable
+        # kernel mixing the columns of a, K(x,y) * (M a) with M symmetric positive definite
+        formula_M = f"Exp(-SqDist(x,y)/2)*MatVecMult(M,a)"
+        Kinv = KernelSolve_np(formula_M, aliases + [f"M=Pm({Dv*Dv})"], "a", axis=1)
+        assert not Kinv.separable
+        A = np.random.randn(Dv, Dv)
+        M = A @ A.T + np.eye(Dv)
+        a = Kinv(
+            self.x, self.x, self.b, M.ravel(), alpha=alpha, eps=1e-8, backend="CPU"
+        )
+        K = np.kron(gaussian_matrix(self.x), M) + alpha * np.eye(N * Dv)
+        a_ref = np.linalg.solve(K, self.b.ravel()).reshape(N, Dv)
+        assert np.allclose(a, a_ref, rtol=1e-4, atol=1e-6)
+
+    def test_precond(self):
+        a_ref = np.linalg.solve(gaussian_matrix(self.x) + alpha * np.eye(N), self.b)
+        _, info = self.solve(eps=1e-8, return_info=True)
+        for precond in ("nystrom", "pivoted_cholesky"):
+            a, info_p = self.solve(eps=1e-8, precond=precond, return_info=True)
+            assert info_p["converged"] and info_p["precond"].rank > 0
+            assert info_p["iterations"] < info["iterations"] / 2
+            assert np.allclose(a, a_ref, rtol=1e-4, atol=1e-6)
+            # the preconditioner is reused for other right-hand sides
+            a, _ = self.solve(eps=1e-8, precond=info_p["precond"], return_info=True)
+            assert np.allclose(a, a_ref, rtol=1e-4, atol=1e-6)
+
+    def test_precond_not_separable(self):
+        formula_M = f"Exp(-SqDist(x,y)/2)*MatVecMult(M,a)"
+        Kinv = KernelSolve_np(formula_M, aliases + [f"M=Pm({Dv*Dv})"], "a", axis=1)
+        A = np.random.randn(Dv, Dv)
+        M = A @ A.T + np.eye(Dv)
+        K = np.kron(gaussian_matrix(self.x), M) + alpha * np.eye(N * Dv)
+        a_ref = np.linalg.solve(K, self.b.ravel()).reshape(N, Dv)
+        args = (self.x, self.x, self.b, M.ravel())
+        _, info = Kinv(*args, alpha=alpha, eps=1e-8, backend="CPU", return_info=True)
+        for precond in ("nystrom", "pivoted_cholesky"):
+            a, info_p = Kinv(
+                *args,
+                alpha=alpha,
+                eps=1e-8,
+                backend="CPU",
+                precond=precond,
+                return_info=True,
+            )
+            assert info_p["iterations"] < info["iterations"] / 2
+            assert np.allclose(a, a_ref, rtol=1e-4, atol=1e-6)
+
+    def test_precond_torch(self):
+        x = torch.tensor(self.x, requires_grad=True)
+        b = torch.tensor(self.b)
+        Kinv = KernelSolve(formula, aliases, "a", axis=1)
+        a = Kinv(x, x, b, alpha=alpha, eps=1e-8, backend="CPU")
+        a_p, info = Kinv(
+            x, x, b, alpha=alpha, eps=1e-8, precond="nystrom", return_info=True
+        )
+        assert torch.allclose(a, a_p, rtol=1e-4, atol=1e-6)
+        (g,) = torch.autograd.grad(a.sum(), x)
+        (g_p,) = torch.autograd.grad(a_p.sum(), x)
+        assert torch.allclose(g, g_p, rtol=1e-4, atol=1e-3)
@@ -0,0 +1,35 @@
+import numpy as np
+import torch
+
+from pykeops.numpy import LazyTensor as LazyTensor_np
+from pykeops.torch import LazyTensor
+
+M, N, D = 100, 120, 3
+
+
+class TestMultiRHS:
+    def test_numpy(self):
+        x, y = np.random.rand(M, 1, D), np.random.rand(1, N, D)
+        K = (-LazyTensor_np(x).sqdist(LazyTensor_np(y))).exp()
+        v1, v2, v3 = np.random.randn(N), np.random.randn(N, 2), np.random.randn(N, 1)
+        Kvs = K.__matmul__([v1, v2, v3], backend="CPU")
+        assert [Kv.shape for Kv in Kvs] == [(M,), (M, 2), (M, 1)]
+        for Kv, v in zip(Kvs, (v1, v2, v3)):
+            assert np.allclose(Kv, K.__matmul__(v, backend="CPU"))
+
+    def test_torch(self):
+        x, y = torch.rand(2, M, 1, D), torch.rand(2, 1, N, D)
+        K = (-LazyTensor(x).sqdist(LazyTensor(y))).exp()
+        v1 = torch.randn(2, N, 2, requires_grad=True)
+        v2 = torch.randn(2, N, 3, requires_grad=True)
+        Kv1, Kv2 = K.__matmul__((v1, v2), backend="CPU")
+        assert Kv1.shape == (2, M, 2) and Kv2.shape == (2, M, 3)
+        Kv1_ref = K.__matmul__(v1, backend="CPU")
+        Kv2_ref = K.__matmul__(v2, backend="CPU")
+        assert torch.allclose(Kv1, Kv1_ref, atol=1e-5)
+        assert torch.allclose(Kv2, Kv2_ref, atol=1e-5)
+        # gradients flow back to each right-hand side
+        g1, g2 = torch.autograd.grad((Kv1.sum() + Kv2.sum()), (v1, v2))
+        g1_ref, g2_ref = torch.autograd.grad((Kv1_ref.sum() + Kv2_ref.sum()), (v1, v2))
+        assert torch.allclose(g1, g1_ref, atol=1e-5)
+        assert torch.allclose(g2, g2_ref, atol=1e-5)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import torch
+
+import pykeops
+from pykeops.common.utils import get_openmp_settings, openmp_settings
+from pykeops.numpy import Genred as Genred_np
+from pykeops.torch import Genred, LazyTensor
+
+M, N, D = 300, 200, 3
+
+formula = "Exp(-SqDist(x,y))*b"
+aliases = [f"x=Vi({D})", f"y=Vj({D})", "b=Vj(2)"]
+
+
+class TestNumThreads:
+    def test_settings(self):
+        assert pykeops.get_num_threads() is None
+        assert get_openmp_settings("numpy") == (0, 1, 0)
+        assert get_openmp_settings("torch") == (torch.get_num_threads(), 1, 0)
+        try:
+            pykeops.set_num_threads(3)
+            pykeops.set_schedule("dynamic", 16)
+            assert get_openmp_settings("torch") == (3, 2, 16)
+            with openmp_settings(num_threads=2, schedule="guided"):
+                assert get_openmp_settings("numpy") == (2, 3, 0)
+                with openmp_settings(schedule=("static", 8)):
+                    assert get_openmp_settings("numpy") == (2, 1, 8)
+            assert get_openmp_settings("numpy") == (3, 2, 16)
+        finally:
+            pykeops.set_num_threads()
+            pykeops.set_schedule()
+        with pytest.raises(ValueError):
+            pykeops.set_schedule("unknown")
+        with pytest.raises(ValueError):
+            pykeops.set_num_threads(0)
+
+    @pytest.mark.parametrize("backend", ["CPU", "CPU_tiled"])
+    def test_numpy(self, backend):
+        x, y, b = np.random.randn(M, D), np.random.randn(N, D), np.random.randn(N, 2)
+        op = Genred_np(formula, aliases, axis=1)
+        res = op(x, y, b, backend=backend)
+        for num_threads, schedule in [(1, None), (2, "dynamic"), (None, ("guided", 7))]:
+            res_t = op(
+                x, y, b, backend=backend, num_threads=num_threads, schedule=schedule
+            )
+            assert np.allclose(res, res_t)
+
+    def test_torch(self):
+        x = torch.randn(M, D, requires_grad=True)
+        y, b = torch.randn(N, D), torch.randn(N, 2)
+        op = Genred(formula, aliases, axis=1)
+        res = op(x, y, b, backend="CPU")
+        res_t = op(x, y, b, backend="CPU", num_threads=2, schedule=("dynamic", 4))
+        assert torch.allclose(res, res_t)
+        (g,) = torch.autograd.grad(res.sum(), x)
+        (g_t,) = torch.autograd.grad(res_t.sum(), x)
+        assert torch.allclose(g, g_t)
+        # LazyTensor reductions forward the settings to Genred
+        x_i, y_j = LazyTensor(x[:, None, :]), LazyTensor(y[None, :, :])
+        K_ij = (-((x_i - y_j) ** 2).sum(-1)).exp()
+        res_lt = K_ij.sum(dim=1, backend="CPU", num_threads=1, schedule="static")
+        assert torch.allclose(res_lt, K_ij.sum(dim=1, backend="CPU"))
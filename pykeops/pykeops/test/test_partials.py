@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+import torch
+
+import pykeops
+from pykeops.numpy import Genred as Genred_np
+from pykeops.torch import Genred
+
+M, N, D = 30, 200, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, 2)
+
+aliases = [f"x=Vi({D})", f"y=Vj({D})", "b=Vj(2)"]
+
+reductions = [
+    ("Exp(-SqDist(x,y))*b", "Sum", None, None),
+    ("SqDist(x,y)*b", "Min", None, None),
+    ("SqDist(x,y)*b", "Max", None, None),
+    ("-SqDist(x,y)", "LogSumExp", None, None),
+    ("-SqDist(x,y)", "LogSumExp", None, "Exp(b)"),
+    ("-SqDist(x,y)", "SumSoftMaxWeight", None, "b"),
+    ("SqDist(x,y)*b", "ArgMin", None, None),
+    ("SqDist(x,y)", "Min_ArgMin", None, None),
+    ("SqDist(x,y)*b", "ArgMax", None, None),
+    ("SqDist(x,y)", "Max_ArgMax", None, None),
+    ("SqDist(x,y)", "KMin", 3, None),
+    ("SqDist(x,y)*b", "ArgKMin", 3, None),
+    ("SqDist(x,y)", "KMin_ArgKMin", 3, None),
+]
+
+
+def as_tuple(res):
+    return res if isinstance(res, tuple) else (res,)
+
+
+class TestPartials:
+    @pytest.mark.parametrize("formula, reduction_op, opt_arg, formula2", reductions)
+    def test_numpy(self, formula, reduction_op, opt_arg, formula2):
+        op = Genred_np(
+            formula,
+            aliases,
+            reduction_op,
+            axis=1,
+            opt_arg=opt_arg,
+            formula2=formula2,
+        )
+        res = op(x, y, b, backend="CPU")
+        # partial results over three slices of the j points, merged in any order
+        cuts = [0, 50, 120, N]
+        parts = [
+            op(x, y[s:e], b[s:e], backend="CPU", return_partial=True)
+            for s, e in zip(cuts[:-1], cuts[1:])
+        ]
+        state = pykeops.merge_partials(op, parts[0], parts[1], offset=cuts[1])
+        state = pykeops.merge_partials(op, state, parts[2], offset=cuts[2])
+        for r, r_p in zip(as_tuple(res), as_tuple(pykeops.finalize(op, state))):
+            assert r.shape == r_p.shape and r.dtype == r_p.dtype
+            assert np.allclose(r, r_p)
+        # the partial result over all the points is finalized as the output
+        state = op(x, y, b, backend="CPU", return_partial=True)
+        for r, r_p in zip(as_tuple(res), as_tuple(pykeops.finalize(op, state))):
+            assert np.allclose(r, r_p)
+
+    @pytest.mark.parametrize(
+        "formula, reduction_op, opt_arg, formula2",
+        [reductions[0], reductions[3], reductions[12]],
+    )
+    def test_torch(self, formula, reduction_op, opt_arg, formula2):
+        op = Genred(
+            formula, aliases, reduction_op, axis=1, opt_arg=opt_arg, formula2=formula2
+        )
+        x_, y_, b_ = torch.tensor(x), torch.tensor(y), torch.tensor(b)
+        res = op(x_, y_, b_, backend="CPU")
+        a = op(x_, y_[:80], b_[:80], backend="CPU", return_partial=True)
+        c = op(x_, y_[80:], b_[80:], backend="CPU", return_partial=True)
+        state = pykeops.merge_partials(op, a, c, offset=80)
+        for r, r_p in zip(as_tuple(res), as_tuple(pykeops.finalize(op, state))):
+            assert r.shape == r_p.shape and r.dtype == r_p.dtype
+            assert torch.allclose(r, r_p)
+
+    def test_out(self):
+        # partial results are new arrays : out is not supported
+        op = Genred_np("Exp(-SqDist(x,y))*b", aliases, axis=1)
+        with pytest.raises(ValueError):
+            op(x, y, b, backend="CPU", out=np.empty((M, 2)), return_partial=True)
+        op = Genred("Exp(-SqDist(x,y))*b", aliases, axis=1)
+        x_, y_, b_ = torch.tensor(x), torch.tensor(y), torch.tensor(b)
+        with pytest.raises(ValueError):
+            op(x_, y_, b_, backend="CPU", out=torch.empty(M, 2), return_partial=True)
@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+
+from pykeops.numpy import Genred
+from pykeops.precompile import binder_calls, precompile, record_manifest
+
+M, N = 50, 60
+
+formula = "Exp(-SqDist(x,y))*b"
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(2)"]
+
+entry = dict(
+    formula=formula,
+    aliases=aliases,
+    reduction_op="Sum",
+    axis=1,
+    dtype=["float32", "float64"],
+    backend="CPU",
+    lang="numpy",
+)
+
+
+class TestPrecompile:
+    def test_record(self, tmp_path):
+        manifest_file = str(tmp_path / "manifest.json")
+        x, y, b = np.random.randn(M, 3), np.random.randn(N, 3), np.random.randn(N, 2)
+        op = Genred(formula, aliases, reduction_op="Sum", axis=1)
+        with record_manifest(manifest_file):
+            op(x, y, b, backend="CPU")
+            op(x, y, b, backend="CPU")
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        assert len(manifest) == 1
+        # the recorded call is the same as the one described by the high-level entry
+        assert binder_calls(manifest[0]) == binder_calls(entry)[1:]
+
+    def test_precompile(self):
+        tags = precompile([entry], num_workers=2)
+        assert len(set(tags)) == 2
+        from pykeops.common.keops_io import keops_binder
+
+        for (binder, args), tag in zip(binder_calls(entry), tags):
+            assert keops_binder[binder](*args).params.tag == tag
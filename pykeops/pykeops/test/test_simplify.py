@@ -0,0 +1,137 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from keopscore.formulas.factorization.Simplify import formula_cost, simplify
+from keopscore.formulas.GetReduction import GetReduction
+from keopscore.formulas.variables.IntCst import IntCst_Impl
+from keopscore.formulas.variables.RatCst import RatCst_Impl
+from pykeops.numpy import Genred
+
+M, N, D = 143, 1001, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y = np.random.randn(N, D)
+b = np.random.randn(N, D)
+g = np.random.rand(1)
+
+aliases = ["x=Vi(3)", "y=Vj(3)", "b=Vj(3)", "g=Pm(1)"]
+var_aliases = ["x=Var(0,3,0)", "y=Var(1,3,1)", "b=Var(2,3,1)", "g=Var(3,1,2)"]
+
+
+def get_formula(formula):
+    return GetReduction(f"Sum_Reduction({formula},0)", var_aliases)
+
+
+class TestSimplify:
+    @pytest.mark.parametrize(
+        "formula,expected",
+        [
+            ("Sqrt(Square(x-y))", "Abs(x-y)"),
+            ("Log(Exp(x|y))", "x|y"),
+            ("Exp(x|y)/Exp(g)", "Exp((x|y)-g)"),
+            ("Exp(x|y)*b*Exp(g)", "b*Exp((x|y)+g)"),
+            ("Pow(SqDist(x,y),4)", "Square(Square(SqDist(x,y)))"),
+            ("Pow(x-y,3)", "(x-y)*Square(x-y)"),
+            ("Pow(x-y,-2)", "Inv(Square(x-y))"),
+            ("Powf(SqDist(x,y),IntCst(2))", "Square(SqDist(x,y))"),
+            ("Powf(SqDist(x,y),IntCst(1)/IntCst(2))", "Sqrt(SqDist(x,y))"),
+            ("Sqrt(IntCst(4))*b*Exp(Zero(1))", "IntCst(2)*b"),
+        ],
+    )
+    def test_rules(self, formula, expected, keopscore_flags):
+        with keopscore_flags(simplify_formulas=False):
+            expected = get_formula(expected).formula
+            original = get_formula(formula).formula
+        assert simplify(original) == expected
+        assert formula_cost(expected) < formula_cost(original)
+
+    def test_scale(self, keopscore_flags):
+        # constant factors are pulled out of sum reductions
+        with keopscore_flags(simplify_formulas=False):
+            expected = get_formula("((x-y)*(b|b))*Exp(-SqDist(x,y))").formula
+        with keopscore_flags(simplify_formulas=True):
+            reduction = get_formula("Grad(Exp(-SqDist(x,y))*b,x,b)")
+            assert reduction.scale == -2
+            assert reduction.formula == expected
+            reduction = get_formula("-(IntCst(2)/IntCst(3))*b")
+            assert reduction.scale == Fraction(-2, 3)
+            assert get_formula("Pow(x-y,0)").scale is None
+
+    @pytest.mark.parametrize(
+        "formula,tol",
+        [
+            ("Pow(SqDist(x,y),3)*b", 1e-10),
+            ("Pow(x-y,-2)*g", 1e-10),
+            # N.B. Powf is evaluated in single precision by the Cpu schemes, Sqrt is not
+            ("Powf(SqDist(x,y)+g,IntCst(1)/IntCst(2))*b", 1e-6),
+            ("Exp(-SqDist(x,y))/Exp(g)*b", 1e-10),
+            ("IntCst(3)*Sqrt(Square(x-y))/IntCst(4)", 1e-10),
+            ("Grad(Exp(-SqDist(x,y))*b,x,b)", 1e-10),
+        ],
+    )
+    @pytest.mark.parametrize("backend", ["CPU", "CPU_tiled"])
+    def test_sum(self, formula, tol, backend, keopscore_flags):
+        op = Genred(formula, aliases, reduction_op="Sum", axis=1)
+        with keopscore_flags(simplify_formulas=False):
+            res = op(x, y, b, g, backend=backend)
+        with keopscore_flags(simplify_formulas=True):
+            res_simplify = op(x, y, b, g, backend=backend)
+        assert np.allclose(res, res_simplify, rtol=tol, atol=tol)
+
+    def test_unfolded_constants(self, keopscore_flags):
+        # constants which would be rounded by the float literals of the C++ code are kept
+        for formula in ["Pow(IntCst(10),30)", "Pow(IntCst(5),11)", "Inv(IntCst(3))"]:
+            with keopscore_flags(simplify_formulas=False):
+                res = simplify(get_formula(f"{formula}*b").formula)
+            assert not isinstance(res.children[0], (IntCst_Impl, RatCst_Impl))
+
+    @pytest.mark.parametrize(
+        "formula,scale",
+        [
+            ("Inv(IntCst(3))", 1 / 3),
+            ("Pow(IntCst(3),-1)", 1 / 3),
+            ("-(IntCst(2)/IntCst(3))", -2 / 3),
+            ("Pow(IntCst(10),30)", 1e30),
+        ],
+    )
+    def test_constants(self, formula, scale, keopscore_flags):
+        # N.B. constants are evaluated in double precision for float64 outputs
+        op = Genred(f"(x|y)*{formula}*b", aliases[:3], axis=1)
+        with keopscore_flags(simplify_formulas=True):
+            res = op(x, y, b, backend="CPU")
+        expected = scale * ((x @ y.T) @ b)
+        assert np.allclose(res, expected, rtol=1e-12, atol=1e-12 * abs(scale))
+
+    def test_scale_reductions(self, keopscore_flags):
+        # constant factors of sums, with the split j scheme, ranges and float32
+        op = Genred("-IntCst(2)*Exp(-SqDist(x,y))*b", aliases[:3], axis=0)
+        xl = np.random.randn(5000, D)
+        for args, kwargs in [
+            ((x, y, b), {}),
+            ((xl, y[:2], b[:2]), {"num_threads": 4}),
+            ((x.astype("float32"), y.astype("float32"), b.astype("float32")), {}),
+            ((x[None, :140], y[None, :1000], b[None, :1000]), {}),
+        ]:
+            with keopscore_flags(simplify_formulas=False):
+                res = op(*args, backend="CPU", **kwargs)
+            with keopscore_flags(simplify_formulas=True):
+                res_simplify = op(*args, backend="CPU", **kwargs)
+            assert np.allclose(res, res_simplify, rtol=1e-5, atol=1e-5)
+
+    def test_grad(self, keopscore_flags):
+        import torch
+        from pykeops.torch import Genred as Genred_torch
+
+        op = Genred_torch("Pow(SqDist(x,y),3)*Exp(-g*SqDist(x,y))*b", aliases, axis=1)
+        x_t, y_t = torch.tensor(x, requires_grad=True), torch.tensor(y)
+        b_t, g_t = torch.tensor(b), torch.tensor(g, requires_grad=True)
+        grads = []
+        for simplify_formulas in [False, True]:
+            with keopscore_flags(simplify_formulas=simplify_formulas):
+                res = op(x_t, y_t, b_t, g_t, backend="CPU")
+                grads.append(torch.autograd.grad((res**2).sum(), [x_t, g_t]))
+        for g_0, g_1 in zip(*grads):
+            assert torch.allclose(g_0, g_1, rtol=1e-10, atol=1e-10)
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from pykeops.numpy import Genred
+
+M, N, D = 50, 1000, 3
+
+np.random.seed(0)
+x = np.random.randn(M, D)
+y_ = np.random.randn(N, D)
+b_ = np.random.randn(N, 2)
+
+aliases = [f"x=Vi({D})", f"y=Vj({D})"]
+
+
+@pytest.fixture(scope="module")
+def memmaps(tmp_path_factory):
+    # the j variables are stored on the disk, and read by chunks
+    folder = tmp_path_factory.mktemp("streaming")
+    y = np.memmap(folder / "y.dat", dtype="float64", mode="w+", shape=(N, D))
+    b = np.memmap(folder / "b.dat", dtype="float64", mode="w+", shape=(N, 2))
+    y[:], b[:] = y_, b_
+    y.flush(), b.flush()
+    return y, b
+
+
+class TestStreaming:
+    @pytest.mark.parametrize(
+        "formula, reduction_op, opt_arg",
+        [
+            ("-SqDist(x,y)", "LogSumExp", None),
+            ("SqDist(x,y)", "ArgMin", None),
+            ("SqDist(x,y)", "Min_ArgMin", None),
+            ("SqDist(x,y)*b", "Max", None),
+            ("SqDist(x,y)", "KMin", 4),
+            ("SqDist(x,y)", "ArgKMin", 4),
+            ("SqDist(x,y)*b", "KMin_ArgKMin", 4),
+        ],
+    )
+    def test_reductions(self, memmaps, formula, reduction_op, opt_arg):
+        y, b = memmaps
+        op = Genred(
+            formula, aliases + ["b=Vj(2)"], reduction_op, axis=1, opt_arg=opt_arg
+        )
+        res = op(x, y_, b_, backend="CPU")
+        res = res if isinstance(res, tuple) else (res,)
+        # N.B. with block_size, the output is also computed by blocks of i points
+        for chunk_size, prefetch, block_size in [
+            (128, True, None),
+            (300, False, 16),
+            (N, True, None),
+        ]:
+            res_s = op.stream(
+                x,
+                y,
+                b,
+                chunk_size=chunk_size,
+                prefetch=prefetch,
+                block_size=block_size,
+                backend="CPU",
+            )
+            res_s = res_s if isinstance(res_s, tuple) else (res_s,)
+            assert len(res) == len(res_s)
+            for r, r_s in zip(res, res_s):
+                assert r.shape == r_s.shape and r.dtype == r_s.dtype
+                assert np.allclose(r, r_s)
+
+    def test_sum_chunks(self, memmaps):
+        y, b = memmaps
+        op = Genred("Exp(-SqDist(x,y))*b", aliases + ["b=Vj(2)"], axis=1)
+        res = op(x, y_, b_, backend="CPU")
+        chunks = ((y[k : k + 100], b[k : k + 100]) for k in range(0, N, 100))
+        res_s = op.stream(x, None, None, chunks=chunks, backend="CPU")
+        assert np.allclose(res, res_s)
+        # reduction over the i variables
+        op = Genred("Exp(-SqDist(x,y))", ["x=Vj(3)", "y=Vi(3)"], axis=0)
+        res = op(x, y_, backend="CPU")
+        chunks = (y[k : k + 100] for k in range(0, N, 100))
+        assert np.allclose(res, op.stream(x, None, chunks=chunks, backend="CPU"))
+
+    def test_infinite_logsumexp(self):
+        # chunks where all the values are -inf do not produce NaNs
+        op = Genred("-SqDist(x,y)/a", aliases + ["a=Vj(1)"], "LogSumExp", axis=1)
+        a = np.ones((N, 1))
+        a[: N // 2] = 0
+        res_s = op.stream(x, y_, a, chunk_size=100, backend="CPU")
+        lse = np.log(np.exp(-((x[:, None] - y_[None, N // 2 :]) ** 2).sum(-1)).sum(1))
+        assert np.allclose(res_s.ravel(), lse)
+
+    def test_errors(self, memmaps):
+        y, b = memmaps
+        op = Genred("Exp(-SqDist(x,y))*b", aliases + ["b=Vj(2)"], axis=1)
+        with pytest.raises(ValueError):
+            op.stream(x, y, b[:10])
+        with pytest.raises(ValueError):
+            op.stream(x, None, None, chunks=iter([]))
+        op = Genred("SqDist(x,y)", aliases, "ArgMin", axis=1)
+        with pytest.raises(ValueError):
+            op.stream(x, None, chunks=[(y, b)])
+        with pytest.raises(ValueError):
+            op.stream(x, None, chunks=[y], block_size=16)
+
+    @pytest.mark.parametrize("chunk_size", [None, 300])
+    def test_output_blocks(self, memmaps, chunk_size):
+        y, b = memmaps
+        op = Genred("SqDist(x,y)", aliases, "ArgKMin", axis=1, opt_arg=3)
+        res = op(x, y_, backend="CPU")
+        starts, blocks = [], []
+        for start, block in op.iter_blocks(
+            x, y, block_size=16, chunk_size=chunk_size, backend="CPU"
+        ):
+            assert block.shape == (min(16, M - start), 3)
+            starts.append(start)
+            blocks.append(block)
+        assert starts == list(range(0, M, 16))
+        assert np.array_equal(np.concatenate(blocks), res)
+        # reduction over the i variables : blocks of j points
+        op = Genred("Exp(-SqDist(x,y))*b", ["x=Vi(3)", "y=Vj(3)", "b=Vi(2)"], axis=0)
+        res = op(y_, x, b_, backend="CPU")
+        blocks = [block for _, block in op.iter_blocks(y, x, b, block_size=20)]
+        assert np.allclose(np.concatenate(blocks), res)
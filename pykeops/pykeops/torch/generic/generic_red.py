@@ -1,15 +1,21 @@
+import asyncio
 import torch
 import copy
+import os
+
+import pykeops
 
 from pykeops.common.get_options import get_tag_backend
+from pykeops.common.asynchronous import call_async
 from pykeops.common.operations import preprocess, postprocess
+from pykeops.common.partials import compute_partial, partial_routine
 from pykeops.common.parse_type import (
     get_type,
     get_sizes,
     complete_aliases,
     get_optional_flags,
 )
-from pykeops.common.utils import axis2cat
+from pykeops.common.utils import axis2cat, openmp_settings
 from pykeops import default_device_id
 from pykeops.common.utils import pyKeOps_Warning
 
@@ -67,6 +73,80 @@ def set_device(tagCPUGPU, tagHostDevice, device_id_request, *args):
     return device_id, device_args
 
 
+def compile_grads_bundle(params, *args):
+    # On the Cpu, compiles the kernel of the formula together with the kernels of its gradients
+    # with respect to all arguments which require grad, in a single shared object (see compile_bundle).
+    # The binder arguments are the ones of GenredAutograd_base._forward and _backward.
+    tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(
+        params.backend, args, sizes=(params.nx, params.ny)
+    )
+    inds_grad = [k for k, arg in enumerate(args) if arg.requires_grad]
+    if tagCPUGPU == 1 or not inds_grad:
+        return
+    try:
+        check_AD_supported(params.formula)
+    except NotImplementedError:
+        return
+
+    from pykeops.common.keops_io.LoadKeOps_cpp import (
+        LoadKeOps_cpp_source,
+        compile_bundle,
+    )
+
+    nargs = len(args)
+    nbatchdims = max(len(arg.shape) for arg in args) - 2
+    use_ranges = nbatchdims > 0 or params.ranges is not None
+
+    def binder_args(formula, aliases, nargs, rec_multVar_highdim):
+        optional_flags = dict(params.optional_flags)
+        optional_flags["multVar_highdim"] = (
+            1 if isinstance(rec_multVar_highdim, int) or rec_multVar_highdim else 0
+        )
+        return (
+            tagCPUGPU,
+            tag1D2D,
+            tagHostDevice,
+            use_ranges,
+            -1,
+            formula,
+            aliases,
+            nargs,
+            params.dtype,
+            "torch",
+            optional_flags,
+        )
+
+    args_forward = binder_args(
+        params.formula, params.aliases, nargs, params.rec_multVar_highdim
+    )
+    forward = LoadKeOps_cpp_source(*args_forward)
+    if os.path.exists(forward.get_dllname()):
+        return
+
+    eta = f"Var({nargs},{forward.params.dim},{forward.params.tagI})"
+    resvar = f"Var({nargs+1},{forward.params.dim},{forward.params.tagI})"
+    calls = [args_forward]
+    for var_ind in inds_grad:
+        _, cat, dim, pos = get_type(params.aliases[var_ind], position_in_list=var_ind)
+        var = f"Var({pos},{dim},{cat})"
+        formula_g = f"Grad_WithSavedForward({params.formula},{var},{eta},{resvar})"
+        rec_multVar_highdim = (
+            nargs
+            if not isinstance(params.rec_multVar_highdim, bool)
+            and pos == params.rec_multVar_highdim
+            else None
+        )
+        calls.append(
+            binder_args(
+                formula_g,
+                params.aliases + [eta, resvar],
+                nargs + 2,
+                rec_multVar_highdim,
+            )
+        )
+    compile_bundle(calls)
+
+
 class GenredAutograd_base:
     @staticmethod
     def _forward(params, *args):
@@ -75,7 +155,9 @@ class GenredAutograd_base:
         else:
             params.optional_flags["multVar_highdim"] = 0
 
-        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(params.backend, args)
+        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(
+            params.backend, args, sizes=(params.nx, params.ny)
+        )
 
         # number of batch dimensions
         # N.B. we assume here that there is at least a cat=0 or cat=1 variable in the formula...
@@ -88,19 +170,37 @@ class GenredAutograd_base:
 
         from pykeops.common.keops_io import keops_binder
 
-        myconv = keops_binder["nvrtc" if tagCPUGPU else "cpp"](
-            tagCPUGPU,
-            tag1D2D,
-            tagHostDevice,
-            use_ranges,
-            device_id,
-            params.formula,
-            params.aliases,
-            len(args),
-            params.dtype,
-            "torch",
-            params.optional_flags,
-        ).import_module()
+        # N.B. for a call of a Genred object, the formula and aliases only depend on the object,
+        # which is used as key of a first lookup (see Cache_partial.call_from) ; derivatives
+        # and other callers set params.owner to None or leave it unset, and use the string key.
+        myconv = (
+            keops_binder["nvrtc" if tagCPUGPU else "cpp"]
+            .call_from(
+                getattr(params, "owner", None),
+                (
+                    tagCPUGPU,
+                    tag1D2D,
+                    tagHostDevice,
+                    use_ranges,
+                    device_id,
+                    len(args),
+                    params.dtype,
+                    params.optional_flags["multVar_highdim"],
+                ),
+                tagCPUGPU,
+                tag1D2D,
+                tagHostDevice,
+                use_ranges,
+                device_id,
+                params.formula,
+                params.aliases,
+                len(args),
+                params.dtype,
+                "torch",
+                params.optional_flags,
+            )
+            .import_module()
+        )
 
         # N.B.: KeOps C++ expects contiguous data arrays
         test_contig = all(arg.is_contiguous() for arg in args)
@@ -118,15 +218,19 @@ class GenredAutograd_base:
                 for r in params.ranges
             )
 
-        result = myconv.genred_pytorch(
-            device_args,
-            params.ranges,
-            params.nx,
-            params.ny,
-            nbatchdims,
-            params.out,
-            *args,
-        )
+        # N.B. the thread settings of a call also apply to the computation of its gradients
+        with openmp_settings(
+            getattr(params, "num_threads", None), getattr(params, "schedule", None)
+        ):
+            result = myconv.genred_pytorch(
+                device_args,
+                params.ranges,
+                params.nx,
+                params.ny,
+                nbatchdims,
+                params.out,
+                *args,
+            )
 
         return result, torch.tensor([myconv.dimout, myconv.tagIJ])
 
@@ -207,6 +311,7 @@ class GenredAutograd_base:
                     params.rec_multVar_highdim = None
 
                 params_g = copy.copy(params)
+                params_g.owner = None
                 params_g.formula = formula_g
                 params_g.aliases = aliases_g
                 params_g.out = None
@@ -356,6 +461,7 @@ else:
                     genconv = GenredAutograd_fun
 
                     params_d = copy.copy(params)
+                    params_d.owner = None
                     params_d.formula = formula_d
                     params_d.aliases = aliases_d
                     params_d.out = None
@@ -542,7 +648,17 @@ class Genred:
 
         self.rec_multVar_highdim = rec_multVar_highdim
 
-    def __call__(self, *args, backend="auto", device_id=-1, ranges=None, out=None):
+    def __call__(
+        self,
+        *args,
+        backend="auto",
+        device_id=-1,
+        ranges=None,
+        out=None,
+        num_threads=None,
+        schedule=None,
+        return_partial=False,
+    ):
         r"""
         To apply the routine on arbitrary torch Tensors.
 
@@ -569,6 +685,7 @@ class Genred:
 
                     - ``"auto"`` (default): let KeOps decide which backend is best suited to your data, based on the tensors' shapes. ``"GPU_1D"`` will be chosen in most cases.
                     - ``"CPU"``: use a simple C++ ``for`` loop on a single CPU core.
+                    - ``"CPU_tiled"``: use a cache-blocked C++ loop on the CPU, which processes blocks of ``i`` indices against tiles of ``j`` indices. In ``"auto"`` mode, it is chosen on the CPU for large problems.
                     - ``"GPU_1D"``: use a `simple multithreading scheme <https://github.com/getkeops/keops/blob/main/keops/core/GpuConv1D.cu>`_ on the GPU - basically, one thread per value of the output index.
                     - ``"GPU_2D"``: use a more sophisticated `2D parallelization scheme <https://github.com/getkeops/keops/blob/main/keops/core/GpuConv2D.cu>`_ on the GPU.
                     - ``"GPU"``: let KeOps decide which one of the ``"GPU_1D"`` or the ``"GPU_2D"`` scheme will run faster on the given input.
@@ -643,6 +760,19 @@ class Genred:
                 If provided, the output array should all have the same ``dtype``, be **contiguous** and be stored on
                 the **same device** as the arguments. Moreover it should have the correct shape for the output.
 
+            num_threads (int, None by default): Number of threads of the computation on the Cpu,
+                for this call and the computation of its gradients ; None means the value set by :func:`pykeops.set_num_threads`.
+
+            schedule (string or tuple, None by default): OpenMP schedule of the computation on the Cpu,
+                for this call only, as a kind ``"static"``, ``"dynamic"``, ``"guided"`` or ``"auto"``,
+                or a tuple (kind, chunk size) ; None means the value set by :func:`pykeops.set_schedule`.
+
+            return_partial (bool, False by default): If True, returns the partial result of the
+                reduction before its finalization, e.g. the pair (m, s) instead of m + log(s) for the
+                **LogSumExp** reduction. Partial results over disjoint sets of points of the reduction
+                axis are merged by :func:`pykeops.merge_partials`, and finalized by :func:`pykeops.finalize`.
+                The **out** argument is not supported in this case.
+
         Returns:
             (M,D) or (N,D) Tensor:
 
@@ -659,6 +789,24 @@ class Genred:
                 f"Invalid number of arguments in call to Genred (should be {self.nargs} and got {len(args)})."
             )
 
+        if return_partial:
+            if out is not None:
+                raise ValueError(
+                    "The out argument is not supported with return_partial=True."
+                )
+            # N.B. the partial result is computed by a copy of the routine, with the
+            # reduction of its accumulator (see pykeops.common.partials) ; it has no gradient
+            with torch.no_grad():
+                return compute_partial(
+                    partial_routine(self),
+                    args,
+                    backend=backend,
+                    device_id=device_id,
+                    ranges=ranges,
+                    num_threads=num_threads,
+                    schedule=schedule,
+                )
+
         dtype = args[0].dtype.__str__().split(".")[1]
 
         nx, ny = get_sizes(self.aliases, *args)
@@ -679,6 +827,7 @@ class Genred:
                 )
 
         params = Genred_parameters()
+        params.owner = self
         params.formula = self.formula
         params.aliases = self.aliases
         params.backend = backend
@@ -690,6 +839,54 @@ class Genred:
         params.nx = nx
         params.ny = ny
         params.out = out
+        params.num_threads = num_threads
+        params.schedule = schedule
+        if pykeops.bundle_grads:
+            compile_grads_bundle(params, *args)
         out = GenredAutograd_fun(params, *args)
 
         return postprocess(out, "torch", self.reduction_op, nout, self.opt_arg, dtype)
+
+    def call_async(self, *args, executor=None, **kwargs):
+        r"""
+        Apply the routine in a worker thread, without blocking the calling thread.
+
+        The Cpu kernel releases the GIL while it runs, so that the calling thread may prepare
+        other inputs or read files in the meantime, and several reductions may run in parallel.
+        The output supports automatic differentiation, as the output of :meth:`__call__`.
+
+        Example:
+            >>> future = op.call_async(x, y, backend="CPU")
+            >>> ...  # other work
+            >>> res = future.result()
+
+        Args:
+            *args (Tensors): The input tensors, as in :meth:`__call__`. They should not be modified
+                until the call is complete.
+
+        Keyword Args:
+            executor (concurrent.futures.Executor, None by default): The executor of the call ;
+                None means a pool of worker threads shared by all the asynchronous calls.
+
+            **kwargs: The keyword arguments of :meth:`__call__`.
+
+        Returns:
+            concurrent.futures.Future: The future output of the routine.
+        """
+        # N.B. the grad mode of torch is local to each thread : the call uses the mode of the caller
+        grad_enabled = torch.is_grad_enabled()
+
+        def call():
+            with torch.set_grad_enabled(grad_enabled):
+                return self(*args, **kwargs)
+
+        return call_async(call, executor=executor)
+
+    async def acall(self, *args, executor=None, **kwargs):
+        r"""
+        Awaitable variant of :meth:`call_async`, for asyncio coroutines :
+        ``res = await op.acall(x, y)``.
+        """
+        return await asyncio.wrap_future(
+            self.call_async(*args, executor=executor, **kwargs)
+        )
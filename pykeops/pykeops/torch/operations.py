@@ -3,14 +3,19 @@ import copy
 
 from pykeops.common.get_options import get_tag_backend
 from pykeops.common.keops_io import keops_binder
-from pykeops.common.operations import ConjugateGradientSolver
+from pykeops.common.operations import ConjugateGradientSolver, is_column_separable
 from pykeops.common.parse_type import (
     get_type,
     get_sizes,
     complete_aliases,
     get_optional_flags,
 )
-from pykeops.common.utils import axis2cat
+from pykeops.common.preconditioners import (
+    diagonal_ranges,
+    get_preconditioner,
+    reduction_args,
+)
+from pykeops.common.utils import axis2cat, get_tools
 from pykeops.torch.generic.generic_red import (
     GenredAutograd_fun,
     Genred_parameters,
@@ -31,7 +36,9 @@ class KernelSolveAutograd(torch.autograd.Function):
             1 if params.rec_multVar_highdim else 0
         )
 
-        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(params.backend, args)
+        tagCPUGPU, tag1D2D, tagHostDevice = get_tag_backend(
+            params.backend, args, sizes=(params.nx, params.ny)
+        )
 
         # number of batch dimensions
         # N.B. we assume here that there is at least a cat=0 or cat=1 variable in the formula...
@@ -78,7 +85,70 @@ class KernelSolveAutograd(torch.autograd.Function):
                 res += params.alpha * var
             return res
 
-        result = ConjugateGradientSolver("torch", linop, varinv.data, params.eps)
+        if isinstance(params.precond, str):
+            if use_ranges:
+                raise ValueError(
+                    "[KeOps] Preconditioners are not available with batch dimensions or ranges."
+                )
+
+            # N.B. the diagonal of the kernel matrix is computed by a block-sparse reduction,
+            # which requires a module compiled with ranges.
+            myconv_diag = keops_binder["nvrtc" if tagCPUGPU else "cpp"](
+                tagCPUGPU,
+                tag1D2D,
+                tagHostDevice,
+                True,
+                device_id,
+                params.formula,
+                params.aliases,
+                len(args),
+                params.dtype,
+                "torch",
+                params.optional_flags,
+            ).import_module()
+            ranges_diag = diagonal_ranges(
+                get_tools("torch"), varinv.shape[0], varinv.device
+            )
+            args_data = tuple(arg.data for arg in args)
+
+            def kernel_product(var, cols=None, diagonal=False):
+                newargs = reduction_args(
+                    args_data, params.aliases, params.axis, params.varinvpos, var, cols
+                )
+                nx, ny = get_sizes(params.aliases, *newargs)
+                if diagonal:
+                    return myconv_diag.genred_pytorch(
+                        device_args, ranges_diag, nx, ny, 0, None, *newargs
+                    )
+                return myconv.genred_pytorch(
+                    device_args, None, nx, ny, 0, None, *newargs
+                )
+
+            # N.B. the preconditioner is kept in params, to be reused by the backward solve
+            params.precond = get_preconditioner(
+                "torch",
+                params.precond,
+                kernel_product,
+                varinv.data,
+                params.alpha,
+                params.separable,
+                rank=params.precond_rank,
+                tol=params.precond_tol,
+            )
+
+        result, params.info = ConjugateGradientSolver(
+            "torch",
+            linop,
+            varinv.data,
+            params.eps,
+            x0=None if params.x0 is None else params.x0.data,
+            maxiter=params.maxiter,
+            rtol=params.rtol,
+            return_info=True,
+            separable=params.separable,
+            precond=params.precond,
+        )
+        params.info["precond"] = params.precond
 
         # relying on the 'ctx.saved_variables' attribute is necessary  if you want to be able to differentiate the output
         #  of the backward once again. It helps pytorch to keep track of 'who is who'.
@@ -105,7 +175,11 @@ class KernelSolveAutograd(torch.autograd.Function):
         resvar = f"Var({nargs+1},{myconv.dimout},{myconv.tagIJ})"
 
         newargs = args[: params.varinvpos] + (G,) + args[params.varinvpos + 1 :]
-        KinvG = KernelSolveAutograd.apply(params, *newargs)
+        # N.B. the initial guess of the forward solve does not apply to this new right-hand side,
+        # whereas its preconditioner does, since the kernel matrix is symmetric
+        params_G = copy.copy(params)
+        params_G.x0 = None
+        KinvG = KernelSolveAutograd.apply(params_G, *newargs)
 
         grads = []  # list of gradients wrt. args;
 
@@ -328,11 +402,25 @@ class KernelSolve:
                 tmp[i] = s[: s.find("=")].strip()
             varinvpos = tmp.index(varinvalias)
         self.varinvpos = varinvpos
+        self.separable = is_column_separable(self.formula, self.aliases, varinvpos)
         self.rec_multVar_highdim = rec_multVar_highdim
         self.axis = axis
 
     def __call__(
-        self, *args, backend="auto", device_id=-1, alpha=1e-10, eps=1e-6, ranges=None
+        self,
+        *args,
+        backend="auto",
+        device_id=-1,
+        alpha=1e-10,
+        eps=1e-6,
+        ranges=None,
+        x0=None,
+        maxiter=None,
+        rtol=None,
+        return_info=False,
+        precond=None,
+        precond_rank=None,
+        precond_tol=None,
     ):
         r"""
         Apply the routine on arbitrary torch Tensors.
@@ -373,6 +461,49 @@ class KernelSolve:
                 If **None** (default), we simply use a **dense Kernel matrix**
                 as we loop over all indices :math:`i\in[0,M)` and :math:`j\in[0,N)`.
 
+            x0 (Tensor, default None): Initial guess of the solution, with the same shape as
+                the variable with respect to which the system is solved, e.g. the solution of
+                a previous, similar problem (warm start).
+
+            maxiter (int, default None): Maximum number of iterations of the conjugate
+                gradient solver ; None means no limit.
+
+            rtol (float, default None): Relative tolerance : a column of the solution has also
+                converged when the norm of its residual is below **rtol** times the norm of
+                the corresponding column of the right-hand side.
+
+            eps (float, default 1e-6): Absolute tolerance : a column of the solution has converged
+                when the mean of its squared residuals is below the square of **eps**.
+                All columns are solved together, with one kernel product per iteration.
+                If the formula is of the form ``g * a``, where ``a`` is the variable with respect
+                to which the system is solved and ``g`` a scalar formula, columns are
+                independent systems, with their own step sizes and convergence tests ;
+                otherwise, the solution is handled as a single vector.
+
+            return_info (bool, default False): If True, also returns a dict of convergence
+                diagnostics, with keys ``"iterations"`` (number of iterations), ``"converged"``
+                (True if all columns have converged) and ``"residuals"`` (norms of the residuals
+                of the columns), and ``"precond"`` (the preconditioner, see below).
+
+            precond (string or function, default None): Preconditioner of the conjugate
+                gradient solver, built from a low-rank approximation :math:`LL^\top` of
+                :math:`K_{xx}`, which is computed with KeOps reductions for any formula:
+
+                    - ``"nystrom"``: Nystrom approximation, from the columns of :math:`K_{xx}` at randomly chosen landmark points.
+                    - ``"pivoted_cholesky"``: greedy pivoted Cholesky decomposition of :math:`K_{xx}`.
+                    - a preconditioner returned in the ``"precond"`` entry of the diagnostics of a previous solve with the same kernel matrix, e.g. with other right-hand sides, which avoids computing the approximation again.
+
+                The approximation is computed once per call, before the iterations of the solver,
+                and is reused by the solve of the backward pass.
+                Preconditioners are not available with batch dimensions or **ranges**.
+
+            precond_rank (int, default None): Maximal rank of the approximation of the
+                preconditioner ; None means the square root of the size of the system.
+
+            precond_tol (float, default None): For ``"pivoted_cholesky"``, the decomposition
+                stops when the trace of :math:`K_{xx} - LL^\top` is below
+                **precond_tol** ; None means **alpha**.
+
         Returns:
             (M,D) or (N,D) Tensor:
 
@@ -397,10 +528,19 @@ class KernelSolve:
         params.dtype = dtype
         params.device_id_request = device_id
         params.eps = eps
+        params.x0 = x0
+        params.maxiter = maxiter
+        params.rtol = rtol
+        params.separable = self.separable
+        params.precond = precond
+        params.precond_rank = precond_rank
+        params.precond_tol = precond_tol
+        params.axis = self.axis
         params.ranges = ranges
         params.optional_flags = self.optional_flags
         params.rec_multVar_highdim = self.rec_multVar_highdim
         params.nx = nx
         params.ny = ny
 
-        return KernelSolveAutograd.apply(params, *args)
+        result = KernelSolveAutograd.apply(params, *args)
+        return (result, params.info) if return_info else result
@@ -53,6 +53,16 @@ class torchtools:
     def solve(A, b):
         return torchsolve(A, b).contiguous()
 
+    @staticmethod
+    def cholesky(x):
+        return torch.linalg.cholesky(x)
+
+    @staticmethod
+    def svd(x):
+        # thin singular value decomposition, returns U and the singular values
+        U, S, _ = torch.linalg.svd(x, full_matrices=False)
+        return U, S
+
     @staticmethod
     def arraysum(x, axis=None):
         return x.sum() if axis is None else x.sum(dim=axis)
@@ -77,6 +87,35 @@ class torchtools:
     def view(x, s):
         return x.view(s)
 
+    @staticmethod
+    def cat(xs, axis):
+        return torch.cat(xs, dim=axis)
+
+    @staticmethod
+    def split(x, sizes, axis):
+        return list(torch.split(x, sizes, dim=axis))
+
+    @staticmethod
+    def maximum(x, y):
+        return torch.maximum(x, y)
+
+    @staticmethod
+    def minimum(x, y):
+        return torch.minimum(x, y)
+
+    @staticmethod
+    def where(cond, x, y):
+        return torch.where(cond, x, y)
+
+    @staticmethod
+    def argsort(x, axis):
+        # N.B. the sort is stable : equal values keep their order
+        return torch.sort(x, dim=axis, stable=True)[1]
+
+    @staticmethod
+    def take_along_axis(x, ind, axis):
+        return torch.take_along_dim(x, ind, dim=axis)
+
     @staticmethod
     def is_tensor(x):
         return isinstance(x, torch.Tensor)